@@ -0,0 +1,169 @@
+"""
+Per-message latency through a partial relay outage, with and without a relay group.
+
+    python benchmarks/bench_failover.py [--messages 600] [--outage slow|error|down] [--slow-ms 200] [--recheck-s 0.05]
+
+Two aiosmtpd relays run in this process: "primary" (the sender's own domain) and "backup"
+(added to the sender's relay group at priority 1). Messages go out one at a time through
+engine.deliver; during the middle third of the run the primary misbehaves:
+
+  * slow   every DATA is answered --slow-ms late
+  * error  every DATA gets "451 Temporary local problem"
+  * down   the primary stops listening (connections refused)
+
+The same run is made for the sender alone ("single relay") and with the group. Reports p50,
+p95, p99 and max latency, failed messages and how many messages each relay carried per third.
+Probing and the idle-relay recheck are shortened (--recheck-s) so the primary's recovery
+shows up within the last third. Each recheck of the slow primary costs one slow message, and
+with the short interval those show up in p99. Fails if any message failed with the group, if
+the group's p95 during a slow outage isn't lower than the single relay's, or if the primary
+never gets traffic back.
+Everything runs under a throwaway HOME, so ~/.r-mail is never touched.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_pipelining import free_port
+
+ROOT = Path(__file__).resolve().parent.parent
+
+class Relay:
+    """aiosmtpd sink whose behaviour can be switched mid-run."""
+
+    def __init__(self, name, slow_ms):
+        self.name = name
+        self.slow_ms = slow_ms
+        self.mode = "ok"
+        self.messages = 0
+        self.port = free_port()
+        self.controller = None
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.mode == "slow":
+            await asyncio.sleep(self.slow_ms / 1000)
+        elif self.mode == "error":
+            return "451 Temporary local problem"
+        self.messages += 1
+        return "250 OK"
+
+    def start(self):
+        from aiosmtpd.controller import Controller
+        self.controller = Controller(self, hostname="127.0.0.1", port=self.port)
+        self.controller.start()
+
+    def stop(self):
+        if self.controller:
+            self.controller.stop()
+            self.controller = None
+
+    def set_mode(self, mode):
+        if mode == "down":
+            self.stop()
+        elif self.controller is None:
+            self.start()
+        self.mode = "ok" if mode == "down" else mode
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def run(engine, sender_row, primary, backup, messages, outage):
+    """Sends `messages` messages; returns (latencies per third, failures, per-relay carried per third)."""
+    thirds = [[], [], []]
+    carried = []
+    failed = 0
+    data = b"Subject: bench\r\n\r\nhello\r\n"
+    for third in range(3):
+        primary.set_mode(outage if third == 1 else "ok")
+        before = (primary.messages, backup.messages)
+        for i in range(messages // 3):
+            t0 = time.perf_counter()
+            try:
+                engine.deliver(sender_row, sender_row['email'], [f"user{third}-{i}@bench.test"], data)
+            except Exception:
+                failed += 1
+            thirds[third].append((time.perf_counter() - t0) * 1000)
+        carried.append((primary.messages - before[0], backup.messages - before[1]))
+    engine.get_pool().close_all()
+    return thirds, failed, carried
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=600, help="Messages per run (split in thirds)")
+    parser.add_argument("--outage", choices=["slow", "error", "down"], default="slow", help="What goes wrong with the primary")
+    parser.add_argument("--slow-ms", type=float, default=200.0, help="DATA delay in the slow outage")
+    parser.add_argument("--recheck-s", type=float, default=0.05,
+                        help="Probe interval, its cap and the idle-relay recheck (relays.PROBE_INTERVAL/PROBE_MAX_INTERVAL/SAMPLE_MAX_AGE), shortened so recovery fits in the run")
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="rmail-bench-failover-")
+    os.environ["HOME"] = home
+    os.environ["RMAIL_SEND_LOG"] = "0"
+    (Path(home) / ".r-mail").mkdir()
+    sys.path.insert(0, str(ROOT))
+
+    primary, backup = Relay("primary", args.slow_ms), Relay("backup", args.slow_ms)
+    results = {}
+    try:
+        from rmail import database, engine, relays
+        relays.PROBE_INTERVAL = relays.PROBE_MAX_INTERVAL = relays.SAMPLE_MAX_AGE = args.recheck_s
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.init_app()
+        with database.transaction() as db:
+            for relay in (primary, backup):
+                db.execute("INSERT INTO domains (name, smtp_host, smtp_port, smtp_user, security) VALUES (?, '127.0.0.1', ?, '', 'NONE')",
+                           (relay.name, relay.port))
+            db.execute("INSERT INTO senders (alias, fullname, email, domain_id) SELECT 'solo', 'Bench', 'bench@bench.test', id FROM domains WHERE name = 'primary'")
+            db.execute("INSERT INTO senders (alias, fullname, email, domain_id) SELECT 'grouped', 'Bench', 'bench@bench.test', id FROM domains WHERE name = 'primary'")
+            db.execute("""
+                INSERT INTO sender_relays (sender_id, domain_id, priority)
+                SELECT s.id, d.id, 1 FROM senders s, domains d WHERE s.alias = 'grouped' AND d.name = 'backup'
+            """)
+
+        primary.start()
+        backup.start()
+        for label, alias in (("single relay", "solo"), ("relay group", "grouped")):
+            relays._router = relays.RelayRouter()  # Fresh health for each run
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[label] = run(engine, relays.resolve_sender(alias), primary, backup, args.messages, args.outage)
+    finally:
+        primary.stop()
+        backup.stop()
+        shutil.rmtree(home, ignore_errors=True)
+
+    print(f"outage: primary {args.outage} during the middle third ({args.messages // 3} of {args.messages} messages)\n")
+    print(f"{'':<14}{'third':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}   primary/backup")
+    for label, (thirds, failed, carried) in results.items():
+        for third, (latencies, (p, b)) in enumerate(zip(thirds, carried)):
+            print(f"{label if third == 0 else '':<14}{third + 1:>6}{statistics.median(latencies):>9.1f}"
+                  f"{percentile(latencies, 0.95):>9.1f}{percentile(latencies, 0.99):>9.1f}{max(latencies):>9.1f}   {p:>4} / {b:<4}")
+        print(f"{'':<14}failed messages: {failed}\n")
+
+    failures = []
+    single, group = results["single relay"], results["relay group"]
+    if group[1]:
+        failures.append(f"{group[1]} messages failed with the relay group")
+    if args.outage == "slow" and percentile(group[0][1], 0.95) >= percentile(single[0][1], 0.95):
+        failures.append("relay group p95 during the outage is not lower than the single relay's")
+    if group[2][2][0] == 0:
+        failures.append("the primary got no traffic back after it recovered")
+    if failures:
+        print("FAIL")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("OK: the relay group kept the outage out of the tail")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Peak-memory check for the streaming send-bulk pipeline (rmail.pipeline).
+
+    python benchmarks/bench_memory.py [--sizes 1000,20000] [--max-growth-mb 8] [--concurrency 1]
+
+For every list size a fresh process streams a generated CSV through
+recipient source -> context -> render (Markdown template) -> MIME -> SMTP delivery -> send log,
+against an aiosmtpd sink running in this (parent) process.
+
+Each child first sends a warm-up campaign (--warmup recipients: imports, compiled templates,
+open SMTP session), takes its RSS, then sends the whole list and reports its peak RSS.
+The run fails (exit 1) if any child grew by more than --max-growth-mb after warm-up, or if
+the largest list peaked more than --max-growth-mb above the smallest one, i.e. memory must
+not scale with the list.
+
+    python benchmarks/bench_memory.py --sizes 1000,1000000   # the real claim; takes a while
+
+Everything runs under a throwaway HOME, so ~/.r-mail is never touched.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+TEMPLATE = """---
+subject: "{{ headline }} for {{ name }}"
+variables:
+  headline: "Top Story Title"
+  link: "Main URL"
+---
+# {{ headline }}
+
+Hello **{{ name }}**, your account {{ account }} has a new statement [here]({{ link }}).
+
+- Point one
+- Point two
+
+> Sent by r-mail
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def rss_mb():
+    """Current resident set size (Linux /proc; elsewhere the peak so far)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+def write_recipients(path, count):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["email", "name", "account", "link"])
+        for i in range(count):
+            writer.writerow([f"user{i}@bench.test", f"User {i}", f"ACC-{i:08d}", f"https://example.com/s/{i}"])
+
+def child(args):
+    """Runs a warm-up campaign, then the measured one, and prints a JSON summary line."""
+    import asyncio
+    import itertools
+    from rmail import pipeline, database
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_app()  # Schema, including send_log
+    sender_row = {
+        "email": "bench@bench.test", "fullname": "Bench", "domain_name": "bench",
+        "smtp_host": "127.0.0.1", "smtp_port": args.port, "smtp_user": "", "security": "NONE",
+        "max_rate": None, "burst": None,
+    }
+    template = "statement.md"
+    subject = "{{ headline }} for {{ name }}"
+    shared_context = {"headline": "Your monthly statement"}
+    counts = {"sent": 0, "failed": 0}
+    sample = {"peak": 0.0}
+
+    def on_result(receiver_email, error):
+        counts["failed" if error else "sent"] += 1
+        if (counts["sent"] + counts["failed"]) % 1000 == 0:
+            sample["peak"] = max(sample["peak"], rss_mb())
+
+    def campaign(rows):
+        contexts = pipeline.merge_context(rows, shared_context)
+        rendered = pipeline.render_messages(contexts, template, subject, on_error=on_result)
+        built = pipeline.build_messages(rendered, sender_row["email"])
+        if args.concurrency > 1:
+            from rmail import async_engine
+            jobs = pipeline.delivery_jobs(built, sender_row)
+            asyncio.run(async_engine.deliver_all(jobs, concurrency=args.concurrency, on_result=on_result, template=template))
+        else:
+            for receiver_email, error in pipeline.deliver_messages(built, sender_row, template):
+                on_result(receiver_email, error)
+
+    # Engine chatter ("Connecting to ...") would interleave with the JSON line
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        # Warm-up: imports, compiled templates, SMTP session, SQLite page cache
+        campaign(itertools.islice(pipeline.recipient_source(args.csv), args.warmup))
+        warm = rss_mb()
+        counts.update(sent=0, failed=0)
+
+        started = time.perf_counter()
+        campaign(pipeline.recipient_source(args.csv))
+        elapsed = time.perf_counter() - started
+    finally:
+        sys.stdout = stdout
+
+    print(json.dumps({
+        "recipients": args.size, **counts, "elapsed_s": round(elapsed, 2),
+        "msgs_per_sec": round(counts["sent"] / elapsed, 1) if elapsed else 0.0,
+        "warm_rss_mb": round(warm, 2), "peak_rss_mb": round(max(sample["peak"], peak_rss_mb()), 2),
+    }))
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,20000", help="Comma separated list sizes")
+    parser.add_argument("--max-growth-mb", type=float, default=8.0, help="Allowed RSS growth")
+    parser.add_argument("--warmup", type=int, default=500, help="Recipients in the warm-up campaign")
+    parser.add_argument("--concurrency", type=int, default=1, help="> 1 uses the asyncio engine")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(ROOT))
+        return child(args)
+
+    from aiosmtpd.controller import Controller
+
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+
+    class Sink:
+        async def handle_DATA(self, server, session, envelope):
+            return "250 OK"
+
+    port = free_port()
+    controller = Controller(Sink(), hostname="127.0.0.1", port=port)
+    controller.start()
+
+    results = []
+    try:
+        for size in sizes:
+            # A fresh HOME (db, send log, template cache) and a fresh process per size
+            home = tempfile.mkdtemp(prefix="rmail-bench-mem-")
+            try:
+                templates_dir = Path(home) / ".r-mail" / "templates"
+                templates_dir.mkdir(parents=True)
+                (templates_dir / "statement.md").write_text(TEMPLATE)
+                csv_path = Path(home) / "recipients.csv"
+                write_recipients(csv_path, size)
+
+                proc = subprocess.run(
+                    [sys.executable, __file__, "--child", "--size", str(size), "--csv", str(csv_path),
+                     "--port", str(port), "--warmup", str(args.warmup), "--concurrency", str(args.concurrency)],
+                    env={**os.environ, "HOME": home, "RMAIL_POOL_MAX_MESSAGES": "100000"},
+                    capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    print(proc.stderr, file=sys.stderr)
+                    return 1
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+            finally:
+                shutil.rmtree(home, ignore_errors=True)
+
+            results.append(result)
+            growth = result["peak_rss_mb"] - result["warm_rss_mb"]
+            print(f"{size:>10} recipients  sent {result['sent']:>10}  {result['msgs_per_sec']:>8.1f} msgs/sec  "
+                  f"warm {result['warm_rss_mb']:>7.1f} MB  peak {result['peak_rss_mb']:>7.1f} MB  growth {growth:>+6.1f} MB")
+    finally:
+        controller.stop()
+
+    failures = []
+    for r in results:
+        growth = r["peak_rss_mb"] - r["warm_rss_mb"]
+        if growth > args.max_growth_mb:
+            failures.append(f"{r['recipients']} recipients: grew {growth:.1f} MB after warm-up")
+        if r["failed"]:
+            failures.append(f"{r['recipients']} recipients: {r['failed']} deliveries failed")
+    spread = results[-1]["peak_rss_mb"] - results[0]["peak_rss_mb"]
+    if spread > args.max_growth_mb:
+        failures.append(f"peak RSS rose {spread:.1f} MB from {results[0]['recipients']} to {results[-1]['recipients']} recipients")
+
+    if failures:
+        print("\nFAIL (bound: %.1f MB)" % args.max_growth_mb)
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print(f"\nOK: peak RSS within {args.max_growth_mb:.1f} MB across {sizes[0]}..{sizes[-1]} recipients")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+PIPELINING vs lock-step SMTP against a local aiosmtpd server behind a latency-injecting proxy.
+
+    python benchmarks/bench_pipelining.py [--rtt-ms 40] [--messages 20] [--recipients 1 10]
+
+Every byte crossing the proxy is delayed by rtt/2 in each direction, like a relay far away.
+For each recipient count the same messages are sent through the sync engine (smtplib) and the
+asyncio client, with engine.PIPELINING off and on; the server-side message count is verified.
+Fails if pipelining isn't faster.
+Everything runs under a throwaway HOME, so ~/.r-mail is never touched.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class Sink:
+    """Counts delivered messages and advertises PIPELINING (aiosmtpd handles it, but doesn't say so)."""
+
+    def __init__(self):
+        self.messages = 0
+        self.recipients = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        return responses[:-1] + ["250-PIPELINING", responses[-1]]
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        self.recipients += len(envelope.rcpt_tos)
+        return "250 OK"
+
+def start_latency_proxy(listen_port, target_port, delay):
+    """TCP proxy in a background thread that forwards each chunk `delay` seconds late, keeping order."""
+    async def pipe(reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while data := await reader.read(65536):
+                loop.call_later(delay, writer.write, data)
+        except ConnectionError:
+            pass
+        loop.call_later(delay, writer.close)
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection("127.0.0.1", target_port)
+        await asyncio.gather(pipe(client_reader, server_writer), pipe(server_reader, client_writer))
+
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(asyncio.start_server(handle, "127.0.0.1", listen_port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+def run(args):
+    from aiosmtpd.controller import Controller
+    from rmail import database, engine, async_engine
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_app()  # Schema, including send_log: sends are measured with history on, as in production
+
+    sink = Sink()
+    smtp_port, proxy_port = free_port(), free_port()
+    controller = Controller(sink, hostname="127.0.0.1", port=smtp_port)
+    controller.start()
+    start_latency_proxy(proxy_port, smtp_port, args.rtt_ms / 2000)
+
+    sender_row = {
+        "email": "from@example.com", "fullname": "Bench", "domain_name": "bench",
+        "smtp_host": "127.0.0.1", "smtp_port": proxy_port, "smtp_user": None, "security": "NONE",
+    }
+    msg = engine.create_message("from@example.com", engine.UNDISCLOSED_RECIPIENTS, "Bench", "<p>Hello</p>")
+    data = engine.message_bytes(msg)
+
+    def sync_send(rcpts):
+        engine.configure_pool(size=1, max_messages=10**9)
+        engine.deliver(sender_row, sender_row["email"], rcpts, data)  # Connect outside the timing
+        started = time.perf_counter()
+        for _ in range(args.messages):
+            engine.deliver(sender_row, sender_row["email"], rcpts, data)
+        elapsed = time.perf_counter() - started
+        engine.get_pool().close_all()
+        return elapsed
+
+    async def async_send(rcpts):
+        client = await async_engine.open_session(sender_row)
+        try:
+            await client.sendmail(sender_row["email"], rcpts, data)
+            started = time.perf_counter()
+            for _ in range(args.messages):
+                await client.sendmail(sender_row["email"], rcpts, data)
+            return time.perf_counter() - started
+        finally:
+            await client.quit()
+
+    ok = True
+    out = sys.stdout  # engine.connect() chatter is silenced below; the table still goes here
+    print(f"RTT {args.rtt_ms:.0f} ms, {args.messages} messages per run")
+    print(f"{'backend':<10}{'rcpts':>6}{'lock-step':>14}{'pipelined':>14}{'speedup':>10}")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for n in args.recipients:
+                rcpts = [f"user{i}@example.com" for i in range(n)]
+                for backend, fn in (("smtplib", sync_send), ("asyncio", lambda r: asyncio.run(async_send(r)))):
+                    timings = {}
+                    for pipelining in (False, True):
+                        engine.PIPELINING = pipelining
+                        before = sink.messages
+                        timings[pipelining] = fn(rcpts)
+                        if sink.messages - before != args.messages + 1:
+                            print(f"{backend}: server got {sink.messages - before} messages, expected {args.messages + 1}", file=sys.stderr)
+                            ok = False
+                    slow, fast = timings[False], timings[True]
+                    if fast >= slow:
+                        ok = False
+                    print(f"{backend:<10}{n:>6}{args.messages / slow:>10.1f} m/s{args.messages / fast:>10.1f} m/s{slow / fast:>9.2f}x", file=out)
+    finally:
+        controller.stop()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="Injected round-trip time")
+    parser.add_argument("--messages", type=int, default=20, help="Timed messages per run")
+    parser.add_argument("--recipients", type=int, nargs="+", default=[1, 10], help="Envelope recipients per message")
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="rmail-bench-pipelining-")
+    os.environ["HOME"] = home
+    sys.path.insert(0, str(ROOT))
+    try:
+        return 0 if run(args) else 1
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
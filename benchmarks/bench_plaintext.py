@@ -0,0 +1,60 @@
+"""
+Compares the streaming plaintext converter with the old BeautifulSoup fallback
+on the bundled sample templates.
+
+    python benchmarks/bench_plaintext.py [--iterations 500]
+
+Exits non-zero if the new output drops or reorders any word of the old output.
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import frontmatter
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rmail.engine import render_template_content
+from rmail.plaintext import html_to_text, CELL_SEPARATOR
+
+SAMPLES_DIR = Path(__file__).resolve().parent.parent / "sample-templates"
+
+def bs4_text(html):
+    """The fallback create_message used before the streaming converter."""
+    return BeautifulSoup(html, "html.parser").get_text(separator="\n").strip()
+
+def words(text):
+    # Ignore the cell separators we add; they are formatting, not content
+    return [w for w in text.replace(CELL_SEPARATOR.strip(), " ").split()]
+
+def is_subsequence(needle, haystack):
+    it = iter(haystack)
+    return all(w in it for w in needle)
+
+def render_sample(path):
+    post = frontmatter.load(str(path))
+    context = {name: str(desc) for name, desc in post.metadata.get('variables', {}).items()}
+    return render_template_content(post.content, path.suffix, context)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    ok = True
+    print(f"{'template':<16}{'bs4 (us)':>12}{'stream (us)':>14}{'speedup':>10}  words")
+    for path in sorted(SAMPLES_DIR.glob("*.html")):
+        html = render_sample(path)
+
+        old_t = min(timeit.repeat(lambda: bs4_text(html), number=args.iterations, repeat=3)) / args.iterations
+        new_t = min(timeit.repeat(lambda: html_to_text(html), number=args.iterations, repeat=3)) / args.iterations
+
+        equivalent = is_subsequence(words(bs4_text(html)), words(html_to_text(html)))
+        ok &= equivalent
+        print(f"{path.stem:<16}{old_t * 1e6:>12.1f}{new_t * 1e6:>14.1f}{old_t / new_t:>9.1f}x  {'same' if equivalent else 'DIFFERENT'}")
+
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
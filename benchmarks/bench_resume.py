@@ -0,0 +1,97 @@
+"""
+How long `r-mail campaign resume` takes to get back to sending on a big, mostly finished campaign.
+
+    python benchmarks/bench_resume.py [--recipients 1000000] [--done 900000] [--max-seconds 10]
+
+Generates a CSV, records a campaign for it and marks the first --done recipients as sent
+(one executemany, as the checkpoint writer would have over the original run). Then it times
+the resume path, without any SMTP:
+
+  * source hash check (campaign.source_hash)
+  * streaming the file through campaign.skip_completed until the first unsent recipient
+  * the full pass (all remaining recipients yielded)
+
+Fails (exit 1) if reaching the first unsent recipient takes longer than --max-seconds.
+Everything runs under a throwaway HOME, so ~/.r-mail is never touched.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=1_000_000, help="Rows in the recipients file")
+    parser.add_argument("--done", type=int, default=900_000, help="Recipients already sent before the resume")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Allowed time until sending resumes")
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="rmail-bench-resume-")
+    os.environ["HOME"] = home
+    (Path(home) / ".r-mail").mkdir()
+    sys.path.insert(0, str(ROOT))
+
+    try:
+        from rmail import campaign, database, pipeline
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.init_app()
+
+        csv_path = Path(home) / "recipients.csv"
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["email", "name"])
+            for i in range(args.recipients):
+                writer.writerow([f"user{i}@bench.test", f"User {i}"])
+
+        campaign_id = campaign.create("bench", "statement.md", "Hi", {}, str(csv_path))
+        t0 = time.perf_counter()
+        checkpoint = campaign.Checkpoint(campaign_id, flush_rows=10_000, flush_interval=3600)
+        for i in range(args.done):
+            checkpoint.record(f"user{i}@bench.test")
+        checkpoint.flush()
+        print(f"setup: {args.done:,} of {args.recipients:,} recipients marked sent in {time.perf_counter() - t0:.1f}s")
+
+        t0 = time.perf_counter()
+        unchanged = campaign.source_hash(str(csv_path)) == campaign.get(campaign_id)['source_hash']
+        hashed = time.perf_counter() - t0
+
+        skipped = 0
+        def on_skip(row):
+            nonlocal skipped
+            skipped += 1
+
+        t0 = time.perf_counter()
+        remaining = campaign.skip_completed(campaign_id, pipeline.recipient_source(str(csv_path)), on_skip=on_skip)
+        first = next(remaining)
+        first_at = time.perf_counter() - t0
+        left = 1 + sum(1 for _ in remaining)
+        total = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    resume_at = hashed + first_at
+    print(f"source hash:              {hashed:6.2f}s ({'unchanged' if unchanged else 'CHANGED'})")
+    print(f"first unsent recipient:   {first_at:6.2f}s ({first['email']}, {skipped:,} skipped)")
+    print(f"full pass:                {total:6.2f}s ({left:,} left to send)")
+    print(f"time to resume sending:   {resume_at:6.2f}s")
+
+    if left != args.recipients - args.done or not unchanged:
+        print("FAIL: wrong recipients selected")
+        return 1
+    if resume_at > args.max_seconds:
+        print(f"FAIL: resuming took longer than {args.max_seconds:.1f}s")
+        return 1
+    print(f"OK: within {args.max_seconds:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
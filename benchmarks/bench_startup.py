@@ -0,0 +1,105 @@
+"""
+Startup-time regression check for the r-mail CLI, based on `python -X importtime`.
+
+    python benchmarks/bench_startup.py [--budget-ms 150] [--runs 5]
+
+tests/test_startup.py runs the same checks in the test suite; this script prints the timings.
+
+Runs `r-mail --help` and `r-mail receiver list --help` in fresh interpreters and fails if
+  * a run exits with an error,
+  * the best total import time of a run (rmail.cli, the lazily loaded subcommand module and
+    anything else the command imports) exceeds the budget, or
+  * any heavy dependency (jinja2, markdown, bs4, frontmatter, yaml, cryptography, asyncio)
+    gets imported just to print help / list receivers.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+BUDGET_MS = 150.0
+
+HEAVY_MODULES = {"jinja2", "markdown", "bs4", "frontmatter", "yaml", "cryptography", "asyncio"}
+
+SCENARIOS = {
+    "r-mail --help": ["--help"],
+    "r-mail receiver list --help": ["receiver", "list", "--help"],
+}
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+def _parse(stderr):
+    """[(module, cumulative us, top level?)] from `-X importtime` output, in import order."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            entries.append((match.group(4), int(match.group(2)), len(match.group(3)) == 1))
+    return entries
+
+def _run(code):
+    # Ahead of the caller's PYTHONPATH, not instead of it: dependencies may be installed there
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"exit code {proc.returncode}: {errors[-1] if errors else 'no output'}")
+    return _parse(proc.stderr)
+
+def baseline_modules():
+    """Top-level modules a bare interpreter imports on its own."""
+    return {module for module, _, top in _run("pass") if top}
+
+def import_profile(argv, baseline):
+    """
+    Returns ({module: cumulative us}, total us) for one fresh `r-mail <argv>` run. The total adds up
+    every top-level import the interpreter doesn't make on its own (`baseline`).
+    """
+    # LazyGroup loads subcommands with importlib.import_module, which -X importtime doesn't
+    # report; importing the module with a plain import first makes it (and its cost) show up.
+    code = (
+        "from rmail.cli import cli, LAZY_COMMANDS\n"
+        f"lazy = LAZY_COMMANDS.get({argv[0]!r})\n"
+        "if lazy:\n"
+        "    __import__(lazy[0].split(':')[0])\n"
+        f"cli({argv!r}, standalone_mode=False)\n"
+    )
+    entries = _run(code)
+    total = sum(us for module, us, top in entries if top and module not in baseline)
+    return {module: us for module, us, _ in entries}, total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Max total import time of one run")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario (best one counts)")
+    args = parser.parse_args()
+
+    baseline = baseline_modules()
+    ok = True
+    for label, argv in SCENARIOS.items():
+        try:
+            runs = [import_profile(argv, baseline) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{label:<32}{'-':>8}     FAILED ({e})")
+            ok = False
+            continue
+        best_ms = min(total for _, total in runs) / 1000
+        heavy = sorted({m.split(".")[0] for modules, _ in runs for m in modules} & HEAVY_MODULES)
+
+        status = "ok"
+        if best_ms > args.budget_ms:
+            status = f"OVER BUDGET ({args.budget_ms:.0f} ms)"
+            ok = False
+        if heavy:
+            status = f"imports {', '.join(heavy)}"
+            ok = False
+        print(f"{label:<32}{best_ms:>8.1f} ms  {status}")
+
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
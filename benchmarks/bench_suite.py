@@ -0,0 +1,218 @@
+"""
+Throughput/latency benchmarks for the send path, run against the bundled sample templates.
+
+    python benchmarks/bench_suite.py [--iterations 300] [--save run.json] [--compare baseline.json]
+
+Measured separately:
+  * engine.get_template_meta
+  * engine.render_template_content (html and md)
+  * engine.create_message (with and without an attachment)
+  * engine.send_email end to end against an in-process aiosmtpd server
+    (pooled session, and a fresh connection per message)
+
+Each op reports p50/p95/p99 latency and ops/sec. --save writes the results as JSON;
+--compare prints the change against a previous --save file.
+
+Everything runs under a throwaway HOME, so ~/.r-mail is never touched.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLES_DIR = ROOT / "sample-templates"
+
+# Markdown path has no bundled sample; this mirrors the newsletter example in the README
+MARKDOWN_TEMPLATE = """---
+subject: "Weekly Update: {{ headline }}"
+variables:
+  headline: "Top Story Title"
+  link: "Main URL"
+---
+# {{ headline }}
+
+Hello **{{ name }}**, check out our new update [here]({{ link }}).
+
+- Point one
+- Point two
+
+> Sent by r-mail
+"""
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def measure(fn, iterations, warmup=10):
+    """Calls fn() repeatedly and returns latency stats in microseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - t0) / 1000)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "n": iterations,
+        "mean_us": sum(samples) / len(samples),
+        "p50_us": percentile(samples, 50),
+        "p95_us": percentile(samples, 95),
+        "p99_us": percentile(samples, 99),
+        "ops_per_sec": iterations / elapsed if elapsed else 0.0,
+    }
+
+def sample_context(metadata):
+    context = {name: str(desc) for name, desc in (metadata.get("variables") or {}).items()}
+    context.setdefault("name", "Benchmark User")
+    context.setdefault("email", "bench@example.com")
+    return context
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run(iterations):
+    from aiosmtpd.controller import Controller
+    from rmail import database, engine
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_app()  # Schema, including send_log: sends are measured with history on, as in production
+
+    templates = sorted(p.stem for p in SAMPLES_DIR.glob("*.html"))
+    results = {}
+    out = sys.stdout  # engine.connect() chatter is silenced below; the table still goes here
+
+    def bench(name, fn, n=iterations):
+        results[name] = measure(fn, n)
+        r = results[name]
+        print(f"{name:<42}{r['p50_us']:>10.1f}{r['p95_us']:>10.1f}{r['p99_us']:>10.1f}{r['ops_per_sec']:>12.1f}", file=out)
+
+    print(f"{'op':<42}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'ops/sec':>12}")
+
+    # 1. Template metadata
+    for t in templates + ["newsletter"]:
+        bench(f"get_template_meta[{t}]", lambda t=t: engine.get_template_meta(t))
+
+    # 2. Rendering
+    rendered = {}
+    for t in templates + ["newsletter"]:
+        meta, content, ext = engine.get_template_meta(t)
+        context = sample_context(meta)
+        label = "md" if ext == ".md" else "html"
+        bench(f"render_template_content[{label}:{t}]", lambda c=content, e=ext, ctx=context: engine.render_template_content(c, e, ctx))
+        rendered[t] = engine.render_template_content(content, ext, context)
+
+    # 3. MIME assembly
+    attachment = Path(os.environ["HOME"]) / "attachment.bin"
+    attachment.write_bytes(os.urandom(100 * 1024))
+    for t in templates:
+        bench(f"create_message[{t}]", lambda h=rendered[t]: engine.create_message("from@example.com", "to@example.com", "Subject", h))
+    for t in templates:
+        bench(f"create_message[{t}+100KB attachment]", lambda h=rendered[t]: engine.create_message("from@example.com", "to@example.com", "Subject", h, [str(attachment)]))
+
+    # 4. End to end against a local SMTP sink
+    class Sink:
+        async def handle_DATA(self, server, session, envelope):
+            return "250 OK"
+
+    port = free_port()
+    controller = Controller(Sink(), hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        sender_row = {
+            "email": "from@example.com", "fullname": "Bench", "domain_name": "bench",
+            "smtp_host": "127.0.0.1", "smtp_port": port,
+            "smtp_user": None, "security": "NONE",
+        }
+        quiet = contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            for t in templates:
+                html = rendered[t]
+                engine.configure_pool(size=1, max_messages=10**9)
+                bench(f"send_email[{t}, pooled]", lambda h=html: engine.send_email(sender_row, "to@example.com", "Subject", h))
+            engine.configure_pool(size=1, max_messages=1)
+            bench(f"send_email[{templates[0]}, new connection]", lambda: engine.send_email(sender_row, "to@example.com", "Subject", rendered[templates[0]]), n=max(iterations // 3, 20))
+            engine.get_pool().close_all()
+    finally:
+        controller.stop()
+
+    return results
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nvs {baseline_path}")
+    print(f"{'op':<42}{'p50':>10}{'ops/sec':>12}")
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        b = baseline[name]
+        p50 = (r["p50_us"] / b["p50_us"] - 1) * 100 if b["p50_us"] else 0.0
+        ops = (r["ops_per_sec"] / b["ops_per_sec"] - 1) * 100 if b["ops_per_sec"] else 0.0
+        print(f"{name:<42}{p50:>+9.1f}%{ops:>+11.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=300, help="Timed calls per op")
+    parser.add_argument("--save", metavar="PATH", help="Write results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="Show the change against a saved run")
+    args = parser.parse_args()
+
+    # Isolate all r-mail state (templates, cache, db) before rmail is imported
+    home = tempfile.mkdtemp(prefix="rmail-bench-")
+    os.environ["HOME"] = home
+    templates_dir = Path(home) / ".r-mail" / "templates"
+    templates_dir.mkdir(parents=True)
+    for sample in SAMPLES_DIR.glob("*.html"):
+        shutil.copy(sample, templates_dir / sample.name)
+    (templates_dir / "newsletter.md").write_text(MARKDOWN_TEMPLATE)
+    sys.path.insert(0, str(ROOT))
+
+    try:
+        results = run(args.iterations)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Connect cost of engine.connect() over TLS: cached SSLContext and session resumption vs a fresh
+context and a full handshake per connection.
+
+    python benchmarks/bench_tls.py [--rtt-ms 20] [--connects 30] [--security SSL STARTTLS]
+
+A self-signed certificate for 127.0.0.1 is generated (needs the `cryptography` package) and
+trusted through SSL_CERT_FILE; aiosmtpd serves implicit TLS and STARTTLS behind a proxy that
+delays every byte by rtt/2 in each direction. Each mode opens and closes --connects
+authenticated sessions (the vault is bypassed):
+
+  * fresh context     ssl.create_default_context() and a full handshake per connect (before)
+  * cached, no resume the shared per-domain context, previous session forgotten each time
+  * engine.connect    cached context and the relay's last TLS session offered again
+
+Fails if engine.connect doesn't resume (nearly) every session or is slower than a fresh context.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import ipaddress
+import os
+import smtplib
+import ssl
+import statistics
+import sys
+import tempfile
+import logging
+import time
+from pathlib import Path
+
+from bench_pipelining import free_port, start_latency_proxy
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def write_certificate(directory):
+    """Self-signed cert + key for localhost/127.0.0.1; returns (cert_path, key_path)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = Path(directory) / "cert.pem", Path(directory) / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    return cert_path, key_path
+
+def fresh_connect(sender_row):
+    """What engine.connect did before: a new default context (CA bundle load) and a full handshake."""
+    host, port = sender_row['smtp_host'], sender_row['smtp_port']
+    if sender_row['security'] == 'SSL':
+        server = smtplib.SMTP_SSL(host, port, context=ssl.create_default_context())
+    else:
+        server = smtplib.SMTP(host, port)
+        server.starttls(context=ssl.create_default_context())
+        server.ehlo()
+    server.login(sender_row['smtp_user'], "pw")
+    return server
+
+def measure(connect, sender_row, connects, before_each=None):
+    """(per-connect milliseconds, resumed sessions) over `connects` connect + quit cycles."""
+    times, resumed = [], 0
+    for _ in range(connects):
+        if before_each:
+            before_each()
+        t0 = time.perf_counter()
+        server = connect(sender_row)
+        times.append((time.perf_counter() - t0) * 1000)
+        resumed += bool(server.sock.session_reused)
+        server.quit()
+    return times, resumed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="Simulated round trip to the relay")
+    parser.add_argument("--connects", type=int, default=30, help="Connections per mode")
+    parser.add_argument("--security", nargs="+", default=["SSL", "STARTTLS"], choices=["SSL", "STARTTLS"])
+    args = parser.parse_args()
+
+    certs = tempfile.mkdtemp(prefix="rmail-bench-tls-")
+    cert_path, key_path = write_certificate(certs)
+    # Trusted by create_default_context(), along with the system bundle so a fresh context costs what it really does
+    bundle = Path(certs) / "bundle.pem"
+    system_cafile = ssl.get_default_verify_paths().cafile
+    bundle.write_bytes(cert_path.read_bytes() + (Path(system_cafile).read_bytes() if system_cafile else b""))
+    os.environ["SSL_CERT_FILE"] = str(bundle)
+    sys.path.insert(0, str(ROOT))
+
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+    from rmail import engine
+
+    engine.get_password = lambda domain, user: "pw"
+    logging.getLogger("mail.log").setLevel(logging.ERROR)  # aiosmtpd's login_data deprecation notice per AUTH
+
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert_path, key_path)
+
+    class Sink:
+        async def handle_DATA(self, server, session, envelope):
+            return "250 OK"
+
+    def authenticator(server, session, envelope, mechanism, auth_data):
+        return AuthResult(success=True)
+
+    controllers = []
+    failures = []
+    try:
+        for security in args.security:
+            port = free_port()
+            if security == 'SSL':
+                controller = Controller(Sink(), hostname="127.0.0.1", port=port, ssl_context=server_context,
+                                        authenticator=authenticator, auth_require_tls=False)
+            else:
+                controller = Controller(Sink(), hostname="127.0.0.1", port=port, tls_context=server_context,
+                                        authenticator=authenticator)
+            controller.start()
+            controllers.append(controller)
+            proxy_port = free_port()
+            start_latency_proxy(proxy_port, port, args.rtt_ms / 2000)
+
+            sender_row = {
+                "email": "bench@bench.test", "domain_name": f"bench-{security.lower()}",
+                "smtp_host": "127.0.0.1", "smtp_port": proxy_port, "smtp_user": "bench", "security": security,
+            }
+            session_key = engine.tls_session_key(sender_row)
+
+            print(f"\n{security} (rtt {args.rtt_ms:.0f} ms, {args.connects} connects)")
+            results = {}
+            with contextlib.redirect_stdout(io.StringIO()):
+                results["fresh context"] = measure(fresh_connect, sender_row, args.connects)
+                results["cached, no resume"] = measure(engine.connect, sender_row, args.connects,
+                                                       before_each=lambda: engine._tls_sessions.pop(session_key, None))
+                engine.connect(sender_row).quit()  # Seed the session, as the first connect of a run would
+                results["engine.connect"] = measure(engine.connect, sender_row, args.connects)
+
+            for mode, (times, resumed) in results.items():
+                print(f"  {mode:<18} p50 {statistics.median(times):7.1f} ms  mean {statistics.fmean(times):7.1f} ms  "
+                      f"resumed {resumed:>3}/{len(times)}")
+
+            times, resumed = results["engine.connect"]
+            if resumed < args.connects * 0.9:
+                failures.append(f"{security}: only {resumed}/{args.connects} sessions resumed")
+            if statistics.median(times) > statistics.median(results["fresh context"][0]):
+                failures.append(f"{security}: engine.connect is slower than a fresh context per connect")
+    finally:
+        for controller in controllers:
+            controller.stop()
+        for path in (cert_path, key_path, bundle):
+            path.unlink(missing_ok=True)
+        os.rmdir(certs)
+
+    if failures:
+        print("\nFAIL")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nOK: TLS sessions resumed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
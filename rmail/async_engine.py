@@ -0,0 +1,428 @@
+import asyncio
+import base64
+import smtplib
+import ssl
+import time
+from email.utils import getaddresses
+from rmail import engine, relays, sendlog
+
+QUIT_TIMEOUT = 5.0  # Seconds AsyncDeliveryEngine.close() waits for servers to answer QUIT
+
+def envelope(msg, to_addrs=None):
+    """(from_addr, to_addrs) for a message; to_addrs defaults to its To/Cc/Bcc headers."""
+    from_addr = getaddresses([msg['From']])[0][1]
+    if to_addrs is None:
+        to_addrs = [addr for _, addr in getaddresses(msg.get_all('To', []) + msg.get_all('Cc', []) + msg.get_all('Bcc', []))]
+    return from_addr, list(to_addrs)
+
+class AsyncSMTPClient:
+    """
+    Minimal SMTP client on top of asyncio streams.
+    Raises the same exception types as smtplib so callers can handle both engines alike.
+    """
+
+    def __init__(self, host, port, security='STARTTLS', timeout=None):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.timeout = engine.SMTP_TIMEOUT if timeout is None else timeout
+        self.reader = None
+        self.writer = None
+        self.esmtp_features = {}
+        self.messages_sent = 0
+        self.pipelining = engine.PIPELINING
+
+    # -- wire helpers --------------------------------------------------
+
+    async def _read_reply(self):
+        """Reads a (possibly multi-line) reply and returns (code, message)."""
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            except asyncio.TimeoutError:
+                raise smtplib.SMTPServerDisconnected("Timed out waiting for server reply")
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            try:
+                code = int(line[:3])
+            except ValueError:
+                raise smtplib.SMTPServerDisconnected(f"Malformed reply: {line!r}")
+            lines.append(line[4:].strip())
+            if line[3:4] != b'-':
+                return code, b"\n".join(lines)
+
+    async def command(self, cmd):
+        self.writer.write(cmd.encode('ascii') + b"\r\n")
+        await self.writer.drain()
+        return await self._read_reply()
+
+    # -- session -------------------------------------------------------
+
+    async def connect(self, ssl_context=None):
+        if self.security in ('SSL', 'STARTTLS') and ssl_context is None:
+            ssl_context = ssl.create_default_context()
+
+        open_coro = asyncio.open_connection(
+            self.host, self.port,
+            ssl=ssl_context if self.security == 'SSL' else None,
+            server_hostname=self.host if self.security == 'SSL' else None,
+        )
+        try:
+            self.reader, self.writer = await asyncio.wait_for(open_coro, self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise smtplib.SMTPConnectError(-1, f"Could not connect to {self.host}:{self.port}: {e}")
+
+        try:
+            code, msg = await self._read_reply()
+            if code != 220:
+                raise smtplib.SMTPConnectError(code, msg)
+
+            await self.ehlo()
+
+            if self.security == 'STARTTLS':
+                code, msg = await self.command("STARTTLS")
+                if code != 220:
+                    raise smtplib.SMTPResponseException(code, msg)
+                await self.writer.start_tls(ssl_context, server_hostname=self.host)
+                await self.ehlo()
+        except BaseException:
+            await self.close()
+            raise
+
+    async def ehlo(self):
+        code, msg = await self.command("EHLO localhost")
+        if code != 250:
+            code, msg = await self.command("HELO localhost")
+            if code != 250:
+                raise smtplib.SMTPHeloError(code, msg)
+            self.esmtp_features = {}
+            return
+        features = {}
+        for line in msg.decode('latin-1').splitlines()[1:]:
+            keyword, _, params = line.partition(' ')
+            features[keyword.upper()] = params
+        self.esmtp_features = features
+
+    async def login(self, user, password):
+        mechanisms = self.esmtp_features.get('AUTH', '').upper().split()
+        if 'PLAIN' in mechanisms or not mechanisms:
+            token = base64.b64encode(f"\0{user}\0{password}".encode()).decode('ascii')
+            code, msg = await self.command(f"AUTH PLAIN {token}")
+        elif 'LOGIN' in mechanisms:
+            code, msg = await self.command("AUTH LOGIN")
+            if code == 334:
+                code, msg = await self.command(base64.b64encode(user.encode()).decode('ascii'))
+            if code == 334:
+                code, msg = await self.command(base64.b64encode(password.encode()).decode('ascii'))
+        else:
+            raise smtplib.SMTPException(f"No supported AUTH mechanism (server offers: {' '.join(mechanisms)})")
+        if code not in (235, 503):
+            raise smtplib.SMTPAuthenticationError(code, msg)
+
+    async def sendmail(self, from_addr, to_addrs, data):
+        """
+        Runs one MAIL/RCPT/DATA transaction. Returns the refused recipients like smtplib.
+        With PIPELINING the envelope goes out in a single write and replies are read in order.
+        """
+        if self.pipelining and 'PIPELINING' in self.esmtp_features:
+            self.writer.write("".join(
+                [f"MAIL FROM:<{from_addr}>\r\n"] + [f"RCPT TO:<{rcpt}>\r\n" for rcpt in to_addrs] + ["DATA\r\n"]
+            ).encode('ascii'))
+            await self.writer.drain()
+            mail_reply = await self._read_reply()
+            rcpt_replies = [await self._read_reply() for _ in to_addrs]
+            code, msg = await self._read_reply()
+        else:
+            mail_reply = await self.command(f"MAIL FROM:<{from_addr}>")
+            if mail_reply[0] != 250:
+                await self.rset()
+                raise smtplib.SMTPSenderRefused(*mail_reply, from_addr)
+            rcpt_replies = [await self.command(f"RCPT TO:<{rcpt}>") for rcpt in to_addrs]
+            code, msg = None, None
+
+        refused = {rcpt: reply for rcpt, reply in zip(to_addrs, rcpt_replies) if reply[0] not in (250, 251)}
+        if code == 354 and (mail_reply[0] != 250 or len(refused) == len(to_addrs)):
+            # Pipelined DATA was accepted despite the failure; send an empty message and drop it
+            self.writer.write(b".\r\n")
+            await self.writer.drain()
+            await self._read_reply()
+            code = 0
+        if mail_reply[0] != 250:
+            await self.rset()
+            raise smtplib.SMTPSenderRefused(*mail_reply, from_addr)
+        if len(refused) == len(to_addrs):
+            await self.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        if code is None:
+            code, msg = await self.command("DATA")
+        if code != 354:
+            await self.rset()
+            raise smtplib.SMTPDataError(code, msg)
+
+        payload = engine._DOT_LINE.sub(b'..', data)
+        if not payload.endswith(b"\r\n"):
+            payload += b"\r\n"
+        self.writer.write(payload + b".\r\n")
+        await self.writer.drain()
+        code, msg = await self._read_reply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, msg)
+
+        self.messages_sent += 1
+        return refused
+
+    async def send_message(self, msg, to_addrs=None):
+        from_addr, to_addrs = envelope(msg, to_addrs)
+        return await self.sendmail(from_addr, to_addrs, engine.message_bytes(msg))
+
+    async def rset(self):
+        try:
+            await self.command("RSET")
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    async def noop(self):
+        return await self.command("NOOP")
+
+    async def quit(self):
+        try:
+            await self.command("QUIT")
+        except (smtplib.SMTPException, OSError):
+            pass
+        finally:
+            await self.close()
+
+    def abort(self):
+        """Drops the connection at once, without waiting for the server."""
+        if self.writer is not None:
+            self.writer.transport.abort()
+
+    async def close(self):
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+async def open_session(sender_row, timeout=None):
+    """Async counterpart of engine.connect(): a connected and authenticated AsyncSMTPClient."""
+    client = AsyncSMTPClient(sender_row['smtp_host'], sender_row['smtp_port'], sender_row['security'], timeout)
+    await client.connect(engine.get_ssl_context(sender_row) if sender_row['security'] != 'NONE' else None)
+    if sender_row['security'] != 'NONE':
+        domain, user = sender_row['domain_name'], sender_row['smtp_user']
+        password = engine.get_password(domain, user)
+        if not password:
+            await client.quit()
+            raise ValueError(f"No password found in Vault for domain '{domain}' user '{user}'")
+        await client.login(user, password)
+    return client
+
+class AsyncDeliveryEngine:
+    """
+    Keeps up to `concurrency` SMTP sessions in flight per domain and reuses them
+    across messages. Sessions are recycled after max_messages like engine.SMTPPool.
+    """
+
+    def __init__(self, concurrency=4, max_messages=100):
+        self.concurrency = concurrency
+        self.max_messages = max_messages
+        self._limits = {}   # key -> asyncio.Semaphore
+        self._idle = {}     # key -> [AsyncSMTPClient]
+        self._quitting = {}  # QUIT task -> recycled AsyncSMTPClient, awaited by close()
+
+    async def _checkout(self, key, sender_row):
+        idle = self._idle.setdefault(key, [])
+        if idle:
+            return idle.pop()
+        return await open_session(sender_row)
+
+    def _checkin(self, key, client):
+        if client.messages_sent >= self.max_messages:
+            task = asyncio.ensure_future(client.quit())
+            self._quitting[task] = client
+            task.add_done_callback(lambda t: self._quitting.pop(t, None))
+        else:
+            self._idle[key].append(client)
+
+    async def send_message(self, sender_row, msg, to_addrs=None, template=None):
+        """Delivers msg (to its headers' recipients, or to_addrs) and records the outcome in the send log."""
+        t0 = time.perf_counter()
+        from_addr, to_addrs = envelope(msg, to_addrs)
+        data = engine.message_bytes(msg)
+        mime_ms = (time.perf_counter() - t0) * 1000
+        return await self.send_data(sender_row, from_addr, to_addrs, data, template=template, mime_ms=mime_ms)
+
+    async def send_data(self, sender_row, from_addr, to_addrs, data, template=None, render_ms=None, mime_ms=None):
+        """Delivers an already flattened message; the async counterpart of engine.deliver()."""
+        router = relays.get_router()
+        for relay in router.route(relays.get_relays(sender_row)):
+            try:
+                return await self._send_via(relay, from_addr, to_addrs, data, template, render_ms, mime_ms)
+            except Exception as e:
+                if not relays.is_relay_error(e):
+                    raise
+                error = e
+        raise error
+
+    async def _send_via(self, relay, from_addr, to_addrs, data, template=None, render_ms=None, mime_ms=None):
+        sender_row = relay.row
+        key = engine.SMTPPool.key_for(sender_row)
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.concurrency))
+        limiter = engine.get_rate_limiter(sender_row)
+
+        async with limit:
+            started = time.perf_counter()
+            waited = connect_s = 0.0
+
+            def log(refused=None, error=None):
+                smtp_s = time.perf_counter() - started - waited - connect_s
+                relays.get_router().record(relay, connect_s * 1000, smtp_s * 1000, error)
+                sendlog.get_writer().record_delivery(
+                    sender_row, from_addr, to_addrs, data, refused, error, template=template,
+                    render_ms=render_ms, mime_ms=mime_ms, connect_ms=connect_s * 1000, smtp_ms=smtp_s * 1000
+                )
+
+            reconnected = False
+            throttled = 0
+            while True:
+                if limiter:
+                    delay = limiter.reserve(len(to_addrs))
+                    if delay:
+                        await asyncio.sleep(delay)
+                        waited += delay
+                t0 = time.perf_counter()
+                try:
+                    client = await self._checkout(key, sender_row)
+                except Exception as e:
+                    log(error=e)
+                    raise
+                connect_s += time.perf_counter() - t0
+                try:
+                    refused = await client.sendmail(from_addr, to_addrs, data)
+                except smtplib.SMTPServerDisconnected as e:
+                    # Stale idle session; replace it once with a fresh one
+                    await client.close()
+                    if reconnected:
+                        log(error=e)
+                        raise
+                    reconnected = True
+                    continue
+                except smtplib.SMTPException as e:
+                    # The server rejected this message; the session stays usable unless the relay is
+                    # at fault (a 4xx to the session, or a 421 among the refused recipients' replies)
+                    if relays.is_relay_error(e):
+                        await client.close()
+                    else:
+                        self._checkin(key, client)
+                    if limiter and engine.throttle_code(e) and throttled < engine.THROTTLE_RETRIES:
+                        limiter.throttle()
+                        throttled += 1
+                        await asyncio.sleep(engine.THROTTLE_PAUSE * throttled)
+                        waited += engine.THROTTLE_PAUSE * throttled
+                        continue
+                    log(error=e)
+                    raise
+                except BaseException as e:
+                    await client.close()
+                    if isinstance(e, Exception):
+                        log(error=e)
+                    raise
+                self._checkin(key, client)
+                if limiter:
+                    limiter.success()
+                log(refused)
+                return refused
+
+    async def close(self):
+        """QUITs every idle and recycled session, giving the servers QUIT_TIMEOUT to answer."""
+        clients = [c for idle in self._idle.values() for c in idle]
+        self._idle.clear()
+        quits = {asyncio.ensure_future(c.quit()): c for c in clients}
+        quits.update(self._quitting)
+        if not quits:
+            return
+        _, pending = await asyncio.wait(quits, timeout=QUIT_TIMEOUT)
+        for task in pending:
+            quits[task].abort()  # The QUIT then fails fast and the session closes
+        await asyncio.gather(*quits, return_exceptions=True)
+
+_DONE = object()
+
+async def deliver_all(jobs, concurrency=4, on_result=None, template=None):
+    """
+    Delivers an iterable (or async iterable) of (sender_row, receiver_email, msg) jobs with
+    bounded concurrency. A plain iterable is advanced on a worker thread, off the event loop. receiver_email may also be a list: the message then goes out once with
+    all of them as envelope recipients (see engine.send_batch).
+    msg may also be already flattened bytes, with an optional fourth job item holding its
+    send-log timings ({"render_ms": ..., "mime_ms": ...}), as rmail.pipeline produces.
+    on_result(receiver_email, error) is called for every recipient (error is None on success).
+    template only annotates the send log.
+    Returns (sent, failed) counted per recipient.
+    """
+    delivery = AsyncDeliveryEngine(concurrency=concurrency)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {'sent': 0, 'failed': 0}
+
+    def result(receiver_email, error):
+        counts['failed' if error else 'sent'] += 1
+        if on_result:
+            on_result(receiver_email, error)
+
+    async def worker():
+        while True:
+            job = await queue.get()
+            if job is None:
+                return
+            sender_row, receiver_email, msg, *timings = job
+            batch = receiver_email if isinstance(receiver_email, (list, tuple)) else None
+            try:
+                if isinstance(msg, bytes):
+                    refused = await delivery.send_data(
+                        sender_row, sender_row['email'], batch or [receiver_email], msg, template=template, **(timings[0] if timings else {})
+                    )
+                else:
+                    refused = await delivery.send_message(sender_row, msg, batch, template=template)
+            except Exception as e:
+                for rcpt in batch or [receiver_email]:
+                    result(rcpt, e)
+            else:
+                for rcpt in batch or [receiver_email]:
+                    if rcpt in refused:
+                        code, reply = refused[rcpt]
+                        result(rcpt, smtplib.SMTPResponseException(code, reply))
+                    else:
+                        result(rcpt, None)
+
+    async def feed():
+        if hasattr(jobs, '__aiter__'):
+            async for job in jobs:
+                await queue.put(job)
+        else:
+            # Advancing a plain iterator may render and build the next message (send-bulk -c N without
+            # --render-workers): do it on a thread, so the sessions in flight keep going meanwhile
+            loop = asyncio.get_running_loop()
+            it = iter(jobs)
+            while (job := await loop.run_in_executor(None, next, it, _DONE)) is not _DONE:
+                await queue.put(job)
+        for _ in workers:
+            await queue.put(None)
+
+    # Workers share the per-domain limits, so one slow domain can't hold more than its share
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    # A worker only ends early when it fails (on_result raised, say): gather() raises at once then,
+    # and the feeder is cancelled rather than left waiting on a full queue that nobody drains
+    feeder = asyncio.create_task(feed())
+    try:
+        await asyncio.gather(feeder, *workers)
+    finally:
+        feeder.cancel()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(feeder, *workers, return_exceptions=True)
+        await delivery.close()
+
+    return counts['sent'], counts['failed']
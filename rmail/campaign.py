@@ -0,0 +1,147 @@
+import hashlib
+import itertools
+import json
+import threading
+import time
+from rmail import engine
+from rmail.database import query_db, transaction
+from rmail.recipients import iter_members, resolve_group
+
+# Campaign checkpoints for send-bulk.
+# Every recipient's outcome is stored under an idempotency key derived from the campaign id
+# and the normalized address, so `r-mail campaign resume` can skip whoever already got the
+# message, or whose address was refused for good (a 5xx bounce). Outcomes are written in
+# batches: after a hard crash (kill -9, power loss) the recipients of the last unwritten batch
+# (at most CHECKPOINT_ROWS, or CHECKPOINT_INTERVAL worth of sending) get the message again;
+# nobody is ever skipped who wasn't sent it.
+
+CHECKPOINT_ROWS = 100
+CHECKPOINT_INTERVAL = 0.25  # Seconds
+LOOKUP_CHUNK = 500           # Keys per indexed IN (...) lookup when skipping completed recipients
+
+UPSERT_SQL = """
+    INSERT INTO campaign_recipients (campaign_id, idempotency_key, email, status, last_error, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (campaign_id, idempotency_key) DO UPDATE SET
+        -- A duplicate row in the list must not turn a delivered recipient back into a failed one
+        status = CASE WHEN status = 'sent' THEN 'sent' ELSE excluded.status END,
+        attempts = attempts + 1,
+        last_error = excluded.last_error,
+        updated_at = excluded.updated_at
+"""
+
+def idempotency_key(campaign_id, email):
+    """Stable per (campaign, recipient): case and surrounding whitespace of the address don't matter."""
+    return hashlib.sha256(f"{campaign_id}:{email.strip().lower()}".encode()).hexdigest()[:32]
+
+def source_hash(spec):
+    """
+    Fingerprint of a recipients source: the file's SHA-256, or for @group the SHA-256 of its
+    members' (receiver id, email) in id order, read in keyset-paged chunks.
+    """
+    if spec.startswith("@"):
+        group = resolve_group(spec[1:])
+        if not group:
+            raise ValueError(f"Group '{spec[1:]}' not found.")
+        digest = hashlib.sha256()
+        for member in iter_members(group['id']):
+            digest.update(f"{member['id']}:{member['email']}\n".encode())
+        return "group:" + digest.hexdigest()
+
+    digest = hashlib.sha256()
+    with open(spec, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return "file:" + digest.hexdigest()
+
+def create(sender_alias, template, subject, context, source, attachments=(), batch_size=1):
+    """Records a new campaign and returns its id."""
+    with transaction() as db:
+        cur = db.execute("""
+            INSERT INTO campaigns (sender_alias, template, subject, context, source, source_hash, attachments, batch_size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (sender_alias, template, subject, json.dumps(context), source, source_hash(source),
+              json.dumps(list(attachments)), batch_size))
+        return cur.lastrowid
+
+def get(campaign_id):
+    return query_db("SELECT * FROM campaigns WHERE id = ?", (campaign_id,), one=True)
+
+def update(campaign_id, **columns):
+    assignments = ", ".join(f"{name} = ?" for name in columns)
+    with transaction() as db:
+        db.execute(
+            f"UPDATE campaigns SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (*columns.values(), campaign_id)
+        )
+
+def progress(campaign_id):
+    """(sent, failed, bounced) recipients recorded so far; only failed ones are left to retry."""
+    row = query_db("""
+        SELECT COALESCE(SUM(status = 'sent'), 0) AS sent, COALESCE(SUM(status = 'failed'), 0) AS failed,
+               COALESCE(SUM(status = 'bounced'), 0) AS bounced
+        FROM campaign_recipients WHERE campaign_id = ?
+    """, (campaign_id,), one=True)
+    return row['sent'], row['failed'], row['bounced']
+
+def skip_completed(campaign_id, rows, on_skip=None, chunk_size=LOOKUP_CHUNK):
+    """
+    Yields the rows whose recipient hasn't been sent (or bounced) this campaign yet, in order.
+    Rows are looked up a chunk at a time against the primary key, so a resume after 900k of
+    1M recipients costs ~2k indexed queries and memory stays at one chunk.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        keys = [idempotency_key(campaign_id, row['email']) for row in chunk]
+        placeholders = ", ".join("?" * len(keys))
+        done = {r['idempotency_key'] for r in query_db(
+            f"SELECT idempotency_key FROM campaign_recipients WHERE campaign_id = ? AND status IN ('sent', 'bounced') AND idempotency_key IN ({placeholders})",
+            (campaign_id, *keys)
+        )}
+        for row, key in zip(chunk, keys):
+            if key in done:
+                if on_skip:
+                    on_skip(row)
+            else:
+                yield row
+
+class Checkpoint:
+    """
+    Buffers per-recipient outcomes and upserts them in one transaction per batch. Thread-safe:
+    with the asyncio engine, render failures are recorded from the thread that renders.
+    """
+
+    def __init__(self, campaign_id, flush_rows=CHECKPOINT_ROWS, flush_interval=CHECKPOINT_INTERVAL):
+        self.campaign_id = campaign_id
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, email, error=None):
+        if error is None:
+            status = 'sent'
+        else:
+            # A permanent refusal won't go differently next time: resume skips it
+            status = 'bounced' if engine.is_permanent_error(error) else 'failed'
+        row = (
+            self.campaign_id, idempotency_key(self.campaign_id, email), email, status,
+            None if error is None else str(error), time.time()
+        )
+        with self._lock:
+            self._rows.append(row)
+            due = len(self._rows) >= self.flush_rows or time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._flushed_at = time.monotonic()
+        if rows:
+            with transaction() as db:
+                db.executemany(UPSERT_SQL, rows)
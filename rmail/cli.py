@@ -1,13 +1,58 @@
 import click
+import importlib
 import os
-from rich.console import Console
-from rich.panel import Panel
-from rmail import database
 
-# Initialize Rich console for pretty output
-console = Console()
+# Subcommands are imported only when invoked, so `r-mail receiver list` doesn't pay for
+# jinja2/markdown/cryptography/asyncio. Help text lives here so `r-mail --help` imports nothing.
+# name -> ("module:attribute", short help)
+LAZY_COMMANDS = {
+    'config': ("rmail.commands.config:config_bp", "Configuration utilities."),
+    'domain': ("rmail.commands.domain:domain_bp", "Manage SMTP Server configurations."),
+    'sender': ("rmail.commands.sender:sender_bp", "Manage Sender Identities (From addresses)."),
+    'receiver': ("rmail.commands.receiver:receiver_bp", "Manage Receiver Address Book."),
+    'group': ("rmail.commands.group:group_bp", "Manage Recipient Groups (mailing lists)."),
+    'send': ("rmail.commands.send:send_cmd", "Send an email with smart template prompting."),
+    'send-bulk': ("rmail.commands.bulk:send_bulk_cmd", "Send a personalized template to every row of a recipients file (or member of a group) over pooled SMTP sessions."),
+    'campaign': ("rmail.commands.campaign:campaign_bp", "Inspect and resume send-bulk campaigns."),
+    'log': ("rmail.commands.log:log_bp", "Inspect the send history."),
+    'worker': ("rmail.commands.worker:worker_cmd", "Deliver queued messages from the outbox with retry/backoff."),
+    'template': ("rmail.commands.template:template_bp", "Manage Email Templates."),
+    'context': ("rmail.commands.context:context_bp", "Manage Context Profiles (Database backed)."),
+}
 
-@click.group()
+class LazyGroup(click.Group):
+    """click.Group that imports a subcommand's module the first time the command is needed."""
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            import_path, _ = self.lazy_commands[cmd_name]
+            module_name, attr = import_path.split(":")
+            self.add_command(getattr(importlib.import_module(module_name), attr), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        """Like click's, but lazy commands use their registered help instead of being imported."""
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                cmd = self.commands[name]
+                if cmd.hidden:
+                    continue
+                rows.append((name, cmd.get_short_help_str(formatter.width - 6 - len(name))))
+            else:
+                rows.append((name, self.lazy_commands[name][1]))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
 def cli():
     """r-mail: The headless professional email CLI."""
     pass
@@ -15,6 +60,12 @@ def cli():
 @cli.command()
 def init():
     """Initialize the database and secure vault permissions."""
+    from rich.console import Console
+    from rich.panel import Panel
+    from rmail import database
+
+    # Initialize Rich console for pretty output
+    console = Console()
     try:
         database.init_app()
         console.print("[green]✔ Database initialized successfully.[/green]")
@@ -33,20 +84,3 @@ def init():
             ))
     except Exception as e:
         console.print(f"[bold red]Error initializing:[/bold red] {e}")
-
-# Lazy import commands to avoid circular dependencies
-from rmail.commands.domain import domain_bp
-from rmail.commands.sender import sender_bp
-from rmail.commands.receiver  import receiver_bp
-from rmail.commands.send import send_cmd
-from rmail.commands.template import template_bp
-from rmail.commands.config import config_bp
-from rmail.commands.context import context_bp
-
-cli.add_command(config_bp)
-cli.add_command(domain_bp)
-cli.add_command(sender_bp)
-cli.add_command(receiver_bp)
-cli.add_command(send_cmd)
-cli.add_command(template_bp)
-cli.add_command(context_bp)
@@ -0,0 +1,233 @@
+import click
+import json
+import threading
+import time
+from pathlib import Path
+from rich.console import Console
+from rich.panel import Panel
+from rmail.database import query_db
+from rmail import campaign, engine, pipeline, relays
+
+console = Console()
+
+def recipient_columns(spec):
+    """Returns the variable names provided by a recipients file (CSV header or first JSONL row) or @group."""
+    for row in pipeline.recipient_source(spec):
+        return set(row.keys())
+    return set()
+
+@click.command(name='send-bulk')
+@click.option('-f', '--from', 'sender_alias', required=True, help='Sender alias')
+@click.option('-r', '--recipients', 'recipients_spec', required=True, help='CSV or JSONL file (one recipient per row, needs an "email" column), or @group')
+@click.option('-p', '--template', required=True, help='Template filename')
+@click.option('-s', '--subject', help='Email Subject (Optional if in template)')
+@click.option('-S', '--set', 'context_vars', multiple=True, help='Context variable shared by all rows (key=value)')
+@click.option('-C', '--context', 'context_profile', help='Load variables from a saved context profile')
+@click.option('-a', '--attach', multiple=True, help='Attachment path')
+@click.option('-c', '--concurrency', default=1, show_default=True, type=click.IntRange(min=1), help='Concurrent SMTP sessions per domain (asyncio engine when > 1)')
+@click.option('--batch-size', default=1, show_default=True, type=click.IntRange(min=1), help='Send identical consecutive messages as one transaction with up to N envelope recipients (To: undisclosed-recipients)')
+@click.option('--render-workers', default=0, show_default=True, type=click.IntRange(min=0), help='Render and build messages in N worker processes while sending (0 = in this process)')
+@click.option('--render-chunk', default=pipeline.CHUNK_SIZE, show_default=True, type=click.IntRange(min=1), help='Rows per render task (with --render-workers)')
+def send_bulk_cmd(sender_alias, recipients_spec, template, subject, context_vars, context_profile, attach, concurrency, batch_size, render_workers, render_chunk):
+    """
+    Send a personalized template to every row of a recipients file (or member of a group) over pooled SMTP sessions.
+    Rows stream through render, MIME and delivery one at a time, so memory stays flat for any list size.
+    Every run is recorded as a campaign; `r-mail campaign resume ID` finishes an interrupted one.
+    """
+    # -------------------------------------------------------------
+    # 1. Resolve Sender
+    # -------------------------------------------------------------
+    sender_row = relays.resolve_sender(sender_alias)
+    if not sender_row:
+        console.print(f"[bold red]Error:[/bold red] Sender alias '{sender_alias}' not found.")
+        return
+
+    # -------------------------------------------------------------
+    # 2. Shared Context (Profile -> CLI Flags), rows are layered on top
+    # -------------------------------------------------------------
+    shared_context = {}
+
+    if context_profile:
+        ctx_row = query_db("SELECT data FROM contexts WHERE name = ?", (context_profile,), one=True)
+        if not ctx_row:
+            console.print(f"[bold red]Error:[/bold red] Context profile '{context_profile}' not found.")
+            return
+        try:
+            shared_context.update(json.loads(ctx_row['data']))
+            console.print(f"[dim]Loaded context '{context_profile}' from DB[/dim]")
+        except Exception as e:
+            console.print(f"[red]Error parsing context data:[/red] {e}")
+            return
+
+    for item in context_vars:
+        try:
+            key, val = item.split('=', 1)
+            shared_context[key] = val
+        except ValueError:
+            pass
+
+    # -------------------------------------------------------------
+    # 3. Load Template (once) and prompt for anything no row provides
+    # -------------------------------------------------------------
+    if not recipients_spec.startswith("@") and not Path(recipients_spec).is_file():
+        console.print(f"[bold red]Error:[/bold red] Recipients file '{recipients_spec}' not found.")
+        return
+
+    try:
+        meta, _, _ = engine.get_template_meta(template)
+    except Exception as e:
+        console.print(f"[bold red]Template Error:[/bold red] {e}")
+        return
+
+    try:
+        columns = recipient_columns(recipients_spec)
+    except Exception as e:
+        console.print(f"[bold red]Recipients Error:[/bold red] {e}")
+        return
+
+    if 'email' not in columns:
+        console.print("[bold red]Error:[/bold red] Recipients file must have an 'email' column.")
+        return
+
+    if 'variables' in meta:
+        missing_vars = [k for k in meta['variables'].keys() if k not in shared_context and k not in columns]
+        if missing_vars:
+            console.print(Panel(f"Not provided by the recipients file: {', '.join(missing_vars)}", title="Template Parameters", style="cyan"))
+            for var_name in missing_vars:
+                shared_context[var_name] = click.prompt(f"{var_name} ({meta['variables'][var_name]})")
+
+    raw_subject = subject or meta.get('subject')
+    if not raw_subject:
+        console.print("[red]Error: Subject is required.[/red]")
+        return
+
+    # -------------------------------------------------------------
+    # 4. Record the campaign, then send
+    # -------------------------------------------------------------
+    try:
+        # Absolute paths, so `campaign resume` works from any directory
+        source = recipients_spec if recipients_spec.startswith("@") else str(Path(recipients_spec).resolve())
+        attach = [str(Path(a).resolve()) for a in attach]
+        campaign_id = campaign.create(sender_alias, template, raw_subject, shared_context, source, attach, batch_size)
+    except Exception as e:
+        console.print(f"[bold red]Campaign Error:[/bold red] could not record the campaign: {e}")
+        return
+    console.print(f"[dim]Campaign #{campaign_id} (if interrupted: r-mail campaign resume {campaign_id})[/dim]")
+
+    run_campaign(campaign.get(campaign_id), sender_row, concurrency, render_workers, render_chunk)
+
+def run_campaign(campaign_row, sender_row, concurrency=1, render_workers=0, render_chunk=pipeline.CHUNK_SIZE, resume=False):
+    """
+    Streams a campaign's recipients through the pipeline stages (rmail.pipeline): context -> render -> MIME
+    (in worker processes with render_workers) -> delivery, serially over the engine's pool or through the
+    asyncio engine when concurrency > 1. Every outcome is checkpointed; with resume=True recipients the
+    campaign already delivered to are skipped.
+    """
+    campaign_id = campaign_row['id']
+    template = campaign_row['template']
+    raw_subject = campaign_row['subject']
+    shared_context = json.loads(campaign_row['context'])
+    attach = json.loads(campaign_row['attachments'])
+    batch_size = campaign_row['batch_size']
+
+    counts = {'sent': 0, 'failed': 0, 'bounced': 0, 'skipped': 0, 'rows': 0}
+    checkpoint = campaign.Checkpoint(campaign_id)
+
+    # With -c, render failures are reported from the rendering thread, deliveries from the event loop
+    report_lock = threading.Lock()
+
+    def report(receiver_email, error):
+        checkpoint.record(receiver_email, error)
+        outcome = 'sent' if error is None else 'bounced' if engine.is_permanent_error(error) else 'failed'
+        with report_lock:
+            counts[outcome] += 1
+        if error is None:
+            console.print(f"[green]✔[/green] {receiver_email}")
+        else:
+            console.print(f"[red]✘ {receiver_email}:[/red] {error}")
+
+    def skipped(row):
+        counts['skipped'] += 1
+
+    def recipient_rows():
+        def rows():
+            for row in pipeline.recipient_source(campaign_row['source']):
+                receiver_email = (row.get('email') or '').strip()
+                if not receiver_email:
+                    with report_lock:
+                        counts['failed'] += 1
+                    console.print(f"[yellow]Skipping row without email:[/yellow] {row}")
+                    continue
+                counts['rows'] += 1
+                yield {**row, "email": receiver_email}
+        if resume:
+            return campaign.skip_completed(campaign_id, rows(), on_skip=skipped)
+        return rows()
+
+    render = None
+    if render_workers:
+        render = pipeline.RenderPipeline(
+            sender_row['email'], template, raw_subject, shared_context, attach, batch_size,
+            workers=render_workers, chunk_size=render_chunk
+        )
+
+    def built_messages():
+        contexts = pipeline.merge_context(recipient_rows(), shared_context)
+        rendered = pipeline.render_messages(contexts, template, raw_subject, on_error=report)
+        return pipeline.build_messages(rendered, sender_row['email'], attach, batch_size)
+
+    started = time.perf_counter()
+    finished = False
+
+    try:
+        if concurrency > 1:
+            import asyncio
+            from rmail import async_engine
+            if render:
+                jobs = pipeline.async_delivery_jobs(render.arun(recipient_rows(), on_error=report), sender_row)
+            else:
+                jobs = pipeline.delivery_jobs(built_messages(), sender_row)
+            asyncio.run(async_engine.deliver_all(jobs, concurrency=concurrency, on_result=report, template=template))
+        else:
+            built = render.run(recipient_rows(), on_error=report) if render else built_messages()
+            for receiver_email, error in pipeline.deliver_messages(built, sender_row, template):
+                report(receiver_email, error)
+        finished = True
+    except KeyboardInterrupt:
+        console.print("[yellow]Interrupted.[/yellow]")
+    except Exception as e:
+        console.print(f"[bold red]Campaign #{campaign_id} stopped:[/bold red] {type(e).__name__}: {e}")
+    finally:
+        engine.get_pool().close_all()
+        checkpoint.flush()
+
+    if finished:
+        _, failed, _ = campaign.progress(campaign_id)
+        campaign.update(campaign_id, status='partial' if failed else 'done', total=counts['rows'])
+    else:
+        # Not 'running' any more: whoever is left gets it with `campaign resume`
+        campaign.update(campaign_id, status='partial')
+
+    elapsed = time.perf_counter() - started
+    rate = counts['sent'] / elapsed if elapsed > 0 else 0.0
+    if counts['skipped']:
+        console.print(f"[dim]Skipped {counts['skipped']} recipients already sent (or bounced) in campaign #{campaign_id}[/dim]")
+    console.print(f"[bold green]✔ Sent {counts['sent']}[/bold green], [red]failed {counts['failed']}, bounced {counts['bounced']}[/red] in {elapsed:.2f}s ({rate:.1f} msgs/sec)")
+    if render:
+        stats = render.stats
+        usage = stats.utilisation()
+        console.print(
+            f"[dim]Render pipeline: {stats.workers} workers {usage['render']:.0%} busy, delivery {usage['delivery']:.0%} busy "
+            f"(waited {stats.delivery_wait:.2f}s for renders), queue {usage['queue']:.0%} full on average "
+            f"({stats.chunks} chunks of {stats.chunk_size}, up to {stats.depth} in flight)[/dim]"
+        )
+    group = relays.get_relays(sender_row)
+    if len(group) > 1:
+        for relay, health in relays.get_router().snapshot(group):
+            latency = "-" if health['smtp_ms'] is None else f"{health['smtp_ms']:.0f}ms/msg, connect {health['connect_ms']:.0f}ms"
+            console.print(
+                f"[dim]Relay {relay.name} (priority {relay.priority}): {health['sent']} messages, {health['errors']} relay errors, "
+                f"{latency}, {'ejected' if health['state'] == 'open' else 'up'}[/dim]"
+            )
+    if not finished or counts['failed']:
+        console.print(f"[dim]Retry the rest with: r-mail campaign resume {campaign_id}[/dim]")
@@ -0,0 +1,95 @@
+import click
+from rich.console import Console
+from rich.table import Table
+from rmail import campaign, pipeline
+from rmail.database import query_db
+
+console = Console()
+
+@click.group(name='campaign')
+def campaign_bp():
+    """Inspect and resume send-bulk campaigns."""
+    pass
+
+@campaign_bp.command(name='list')
+@click.option('--limit', default=10, show_default=True, help='Most recent campaigns to show')
+def list_campaigns(limit):
+    """Recent campaigns with their delivery progress."""
+    rows = query_db("""
+        SELECT c.id, c.sender_alias, c.template, c.source, c.status, c.total, c.updated_at,
+               (SELECT COUNT(*) FROM campaign_recipients r WHERE r.campaign_id = c.id AND r.status = 'sent') AS sent,
+               (SELECT COUNT(*) FROM campaign_recipients r WHERE r.campaign_id = c.id AND r.status = 'failed') AS failed,
+               (SELECT COUNT(*) FROM campaign_recipients r WHERE r.campaign_id = c.id AND r.status = 'bounced') AS bounced
+        FROM campaigns c
+        ORDER BY c.id DESC
+        LIMIT ?
+    """, (limit,))
+
+    if not rows:
+        console.print("[yellow]No campaigns yet. Every 'r-mail send-bulk' run records one.[/yellow]")
+        return
+
+    table = Table(title="Campaigns")
+    table.add_column("ID", justify="right", style="cyan")
+    table.add_column("From")
+    table.add_column("Template")
+    table.add_column("Recipients")
+    table.add_column("Sent", justify="right", style="green")
+    table.add_column("Failed", justify="right", style="red")
+    table.add_column("Bounced", justify="right", style="red")
+    table.add_column("Status")
+    table.add_column("Updated", style="dim")
+
+    styles = {'done': 'green', 'partial': 'yellow', 'running': 'magenta'}
+    for r in rows:
+        sent = f"{r['sent']}/{r['total']}" if r['total'] is not None else str(r['sent'])
+        table.add_row(
+            str(r['id']), r['sender_alias'], r['template'], r['source'], sent, str(r['failed']), str(r['bounced']),
+            f"[{styles.get(r['status'], 'white')}]{r['status']}[/]", r['updated_at']
+        )
+    console.print(table)
+
+@campaign_bp.command(name='resume')
+@click.argument('campaign_id', type=int)
+@click.option('-c', '--concurrency', default=1, show_default=True, type=click.IntRange(min=1), help='Concurrent SMTP sessions per domain (asyncio engine when > 1)')
+@click.option('--render-workers', default=0, show_default=True, type=click.IntRange(min=0), help='Render and build messages in N worker processes while sending (0 = in this process)')
+@click.option('--render-chunk', default=pipeline.CHUNK_SIZE, show_default=True, type=click.IntRange(min=1), help='Rows per render task (with --render-workers)')
+@click.option('--force', is_flag=True, help='Resume even though the recipients list changed since the campaign started')
+def resume_campaign(campaign_id, concurrency, render_workers, render_chunk, force):
+    """
+    Send a campaign to every recipient that hasn't received it yet.
+    Recipients already delivered, or refused for good (bounced), are skipped by idempotency key;
+    failed ones are retried.
+    """
+    from rmail.commands.bulk import run_campaign
+    from rmail.relays import resolve_sender
+
+    campaign_row = campaign.get(campaign_id)
+    if not campaign_row:
+        console.print(f"[red]Campaign #{campaign_id} not found.[/red]")
+        return
+    if campaign_row['status'] == 'done':
+        console.print(f"[green]Campaign #{campaign_id} is already complete.[/green]")
+        return
+
+    sender_row = resolve_sender(campaign_row['sender_alias'])
+    if not sender_row:
+        console.print(f"[bold red]Error:[/bold red] Sender alias '{campaign_row['sender_alias']}' no longer exists.")
+        return
+
+    try:
+        source_hash = campaign.source_hash(campaign_row['source'])
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Recipients Error:[/bold red] {e}")
+        return
+    if source_hash != campaign_row['source_hash']:
+        if not force:
+            console.print(f"[bold red]Error:[/bold red] {campaign_row['source']} changed since campaign #{campaign_id} started. "
+                          "Use --force to resume anyway (recipients already sent are still skipped).")
+            return
+        campaign.update(campaign_id, source_hash=source_hash)
+
+    sent, failed, bounced = campaign.progress(campaign_id)
+    console.print(f"[dim]Resuming campaign #{campaign_id}: {sent} sent, {failed} failed, {bounced} bounced so far[/dim]")
+    campaign.update(campaign_id, status='running')
+    run_campaign(campaign_row, sender_row, concurrency, render_workers, render_chunk, resume=True)
@@ -2,7 +2,7 @@ import click
 import json
 from rich.console import Console
 from rich.table import Table
-from rmail.database import get_db, query_db
+from rmail.database import get_db, query_db, keyset_query, stream_rows, encode_cursor
 
 console = Console()
 
@@ -116,27 +116,41 @@ def edit_context(name):
 
 @context_bp.command(name='list')
 @click.argument('query', required=False)
-@click.option('--limit', default=10, help='Limit results')
-@click.option('--offset', default=0, help='Pagination offset')
-def list_contexts(query, limit, offset):
+@click.option('--limit', type=int, help='Limit results (default 10; jsonl streams everything)')
+@click.option('--after', help='Continue after this name or continuation token')
+@click.option('--offset', default=0, help='Pagination offset (prefer --after for deep pages)')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'jsonl']), default='table', help='Output format')
+def list_contexts(query, limit, after, offset, fmt):
     """List contexts with pagination and search."""
-    sql = "SELECT name, description, template_name, data FROM contexts"
-    params = []
+    if limit is None and fmt == 'table':
+        limit = 10
 
-    if query:
-        sql += " WHERE name LIKE ? OR template_name LIKE ?  OR description LIKE ?"
-        wildcard = f"%{query}%"
-        params.extend([wildcard, wildcard,wildcard])
+    # The table reads one row past the page to tell whether another one follows; jsonl stops at --limit
+    fetch = limit + 1 if fmt == 'table' else limit
+    try:
+        # Keyset pagination on the unique name; FTS5 match ranked by bm25 when searching
+        sql, params = keyset_query(
+            "c.name, c.description, c.template_name, c.data", "contexts c", "c.name",
+            table="contexts", query=query, like_columns=["c.name", "c.template_name", "c.description"], row_ref="c",
+            after=after, limit=fetch, offset=offset
+        )
+    except ValueError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        return
 
-    sql += " LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+    if fmt == 'jsonl':
+        for row in stream_rows(sql, params):
+            click.echo(json.dumps(row))
+        return
 
     rows = query_db(sql, params)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
     if not rows:
         if query:
             console.print(f"[yellow]No contexts found matching '{query}'.[/yellow]")
-        elif offset > 0:
+        elif offset > 0 or after:
             console.print("[yellow]No more contexts (end of list).[/yellow]")
         else:
             console.print("[yellow]No contexts found. Use 'r-mail context add' to create one.[/yellow]")
@@ -154,6 +168,8 @@ def list_contexts(query, limit, offset):
         table.add_row(r['name'], r['template_name'] or "Any", r['description'] or "", keys)
 
     console.print(table)
+    if has_more:
+        console.print(f"[dim]More results: --after {encode_cursor(rows[-1])}[/dim]")
 
 @context_bp.command(name='delete')
 @click.argument('name')
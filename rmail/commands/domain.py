@@ -1,10 +1,12 @@
+import sqlite3
 from sqlite3 import paramstyle
 import click
+import json
 import getpass
 from rich.console import Console
 from rich.table import Table
-from rmail.database import get_db, query_db
-from rmail.vault import Vault
+from rmail.database import get_db, query_db, keyset_query, stream_rows, encode_cursor
+from rmail.vault import get_vault
 
 console = Console()
 
@@ -19,7 +21,9 @@ def domain_bp():
 @click.option('--port', prompt=True, type=int, default=587, help='SMTP Port')
 @click.option('--user', prompt=True, help='SMTP Username/Email')
 @click.option('--security', type=click.Choice(['STARTTLS', 'SSL', 'NONE']), default='STARTTLS', prompt=True)
-def add_domain(name, host, port, user, security):
+@click.option('--max-rate', type=click.FloatRange(min=0), help='Max messages/sec the relay accepts (0 or unset = unlimited)')
+@click.option('--burst', type=click.IntRange(min=1), help='Messages allowed back to back (default: max-rate rounded up)')
+def add_domain(name, host, port, user, security, max_rate, burst):
     """Add a new SMTP server configuration."""
 
     # 1. Capture Password Securely
@@ -29,43 +33,103 @@ def add_domain(name, host, port, user, security):
         # 2. Save Metadata to SQLite
         db = get_db()
         db.execute(
-            "INSERT INTO domains (name, smtp_host, smtp_port, smtp_user, security) VALUES (?, ?, ?, ?, ?)",
-            (name, host, port, user, security)
+            "INSERT INTO domains (name, smtp_host, smtp_port, smtp_user, security, max_rate, burst) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, host, port, user, security, max_rate or None, burst)
         )
         db.commit()
 
         # 3. Save Password to Encrypted Vault
-        vault = Vault()
-        vault.set_password("rmail", name, password)
+        get_vault().set_password("rmail", name, password)
 
         console.print(f"[green]✔ Domain '{name}' added successfully![/green]")
 
     except Exception as e:
         console.print(f"[bold red]Failed to add domain:[/bold red] {e}")
 
+@domain_bp.command(name='update')
+@click.argument('name')
+@click.option('--host', help='New SMTP Host')
+@click.option('--port', type=int, help='New SMTP Port')
+@click.option('--user', help='New SMTP Username')
+@click.option('--security', type=click.Choice(['STARTTLS', 'SSL', 'NONE']), help='New security mode')
+@click.option('--max-rate', type=click.FloatRange(min=0), help='Max messages/sec (0 = unlimited)')
+@click.option('--burst', type=click.IntRange(min=0), help='Messages allowed back to back (0 = default)')
+@click.option('--password', is_flag=True, help='Prompt for a new SMTP password')
+def update_domain(name, host, port, user, security, max_rate, burst, password):
+    """Update a domain's SMTP settings or rate limit."""
+    db = get_db()
+    updates = []
+    params = []
+
+    for column, value in (("smtp_host", host), ("smtp_port", port), ("smtp_user", user), ("security", security)):
+        if value is not None:
+            updates.append(f"{column} = ?")
+            params.append(value)
+    # 0 clears the limit / falls back to the default burst
+    if max_rate is not None:
+        updates.append("max_rate = ?")
+        params.append(max_rate or None)
+    if burst is not None:
+        updates.append("burst = ?")
+        params.append(burst or None)
+
+    if not updates and not password:
+        console.print("[yellow]No changes provided.[/yellow]")
+        return
+
+    if not query_db("SELECT id FROM domains WHERE name = ?", (name,), one=True):
+        console.print(f"[red]Domain '{name}' not found.[/red]")
+        return
+
+    try:
+        if updates:
+            params.append(name)
+            db.execute(f"UPDATE domains SET {', '.join(updates)} WHERE name = ?", params)
+            db.commit()
+        if password:
+            get_vault().set_password("rmail", name, getpass.getpass(prompt=f"Enter new SMTP Password for '{name}': "))
+        console.print(f"[green]✔ Domain '{name}' updated.[/green]")
+    except Exception as e:
+        console.print(f"[red]Error:[/red] {e}")
+
 
 @domain_bp.command(name='list')
 @click.argument('query', required=False)
-@click.option('--limit', default=10, help='Limit results')
-@click.option('--offset', default=0, help='Pagination offset')
-def list_domains(query, limit, offset):
+@click.option('--limit', type=int, help='Limit results (default 10; jsonl streams everything)')
+@click.option('--after', help='Continue after this name or continuation token')
+@click.option('--offset', default=0, help='Pagination offset (prefer --after for deep pages)')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'jsonl']), default='table', help='Output format')
+def list_domains(query, limit, after, offset, fmt):
     """List domains with pagination and search."""
-    sql = "SELECT name, smtp_host, smtp_port, smtp_user, security FROM domains"
-    params = []
+    if limit is None and fmt == 'table':
+        limit = 10
 
-    if query:
-        sql += " WHERE name LIKE ? OR smtp_host LIKE ?"
-        params.extend([f"%{query}%", f"%{query}%"])
+    # The table reads one row past the page to tell whether another one follows; jsonl stops at --limit
+    fetch = limit + 1 if fmt == 'table' else limit
+    try:
+        # Keyset pagination on the unique name; FTS5 match ranked by bm25 when searching
+        sql, params = keyset_query(
+            "d.name, d.smtp_host, d.smtp_port, d.smtp_user, d.security, d.max_rate, d.burst", "domains d", "d.name",
+            table="domains", query=query, like_columns=["d.name", "d.smtp_host"], row_ref="d",
+            after=after, limit=fetch, offset=offset
+        )
+    except ValueError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        return
 
-    sql += " LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+    if fmt == 'jsonl':
+        for row in stream_rows(sql, params):
+            click.echo(json.dumps(row))
+        return
 
     domains = query_db(sql, params)
+    has_more = len(domains) > limit
+    domains = domains[:limit]
 
     if not domains:
         if query:
             console.print(f"[yellow]No domains found matching '{query}'.[/yellow]")
-        elif offset > 0:
+        elif offset > 0 or after:
             console.print("[yellow]No more domains (end of list).[/yellow]")
         else:
             console.print("[yellow]No domains configured. Use 'r-mail domain add' to create one.[/yellow]")
@@ -76,11 +140,17 @@ def list_domains(query, limit, offset):
     table.add_column("Host", style="magenta")
     table.add_column("User", style="green")
     table.add_column("Security")
+    table.add_column("Rate limit")
 
     for domain in domains:
-        table.add_row(domain['name'], f"{domain['smtp_host']}:{domain['smtp_port']}", domain['smtp_user'], domain['security'])
+        rate = "-"
+        if domain['max_rate']:
+            rate = f"{domain['max_rate']:g}/s" + (f" (burst {domain['burst']})" if domain['burst'] else "")
+        table.add_row(domain['name'], f"{domain['smtp_host']}:{domain['smtp_port']}", domain['smtp_user'], domain['security'], rate)
 
     console.print(table)
+    if has_more:
+        console.print(f"[dim]More results: --after {encode_cursor(domains[-1])}[/dim]")
 
 
 @domain_bp.command(name='delete')
@@ -102,12 +172,15 @@ def delete_domain(name):
         db.commit()
 
         # Delete from Vault (ignore if missing)
-        from rmail.vault import Vault
         try:
-            Vault().set_password("rmail", name, None) # Or implement a delete method in Vault
-        except:
+            get_vault().delete_password("rmail", name)
+        except Exception:
             pass
 
         console.print(f"[green]✔ Domain '{name}' deleted.[/green]")
+    except sqlite3.IntegrityError:
+        # A sender was added since the check above (senders.domain_id is ON DELETE RESTRICT)
+        db.rollback()
+        console.print(f"[bold red]Cannot delete:[/bold red] Domain is used by senders. Delete them first.")
     except Exception as e:
         console.print(f"[red]Error:[/red] {e}")
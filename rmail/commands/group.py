@@ -0,0 +1,161 @@
+import click
+import json
+from rich.console import Console
+from rich.table import Table
+from rmail.database import get_db, query_db, transaction, keyset_query, stream_rows, encode_cursor
+from rmail.recipients import MEMBER_CHUNK_SIZE, iter_members, resolve_group
+
+console = Console()
+
+@click.group(name='group')
+def group_bp():
+    """Manage Recipient Groups (mailing lists)."""
+    pass
+
+@group_bp.command(name='add')
+@click.argument('name')
+@click.option('--description', help='Short description')
+def add_group(name, description):
+    """Create a group. Send to it with `r-mail send -t @NAME`."""
+    db = get_db()
+    try:
+        db.execute("INSERT INTO groups (name, description) VALUES (?, ?)", (name, description))
+        db.commit()
+        console.print(f"[green]✔ Group '{name}' created.[/green]")
+    except Exception as e:
+        console.print(f"[bold red]Failed to create group:[/bold red] {e}")
+
+@group_bp.command(name='add-member')
+@click.argument('name')
+@click.argument('aliases', nargs=-1, required=True)
+def add_member(name, aliases):
+    """Add receivers (by alias) to a group."""
+    group = resolve_group(name)
+    if not group:
+        console.print(f"[red]Group '{name}' not found.[/red]")
+        return
+
+    aliases = list(dict.fromkeys(aliases))
+    found = {}
+    for i in range(0, len(aliases), MEMBER_CHUNK_SIZE):
+        chunk = aliases[i:i + MEMBER_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        for row in query_db(f"SELECT id, alias FROM receivers WHERE alias IN ({placeholders})", chunk):
+            found[row['alias']] = row['id']
+
+    try:
+        with transaction() as conn:
+            cur = conn.executemany(
+                "INSERT OR IGNORE INTO group_members (group_id, receiver_id) VALUES (?, ?)",
+                [(group['id'], receiver_id) for receiver_id in found.values()]
+            )
+            added = cur.rowcount
+    except Exception as e:
+        console.print(f"[red]Error:[/red] {e}")
+        return
+
+    console.print(f"[green]✔ Added {added} members to '{name}'.[/green]")
+    if len(found) > added:
+        console.print(f"[dim]{len(found) - added} already in the group.[/dim]")
+    missing = [a for a in aliases if a not in found]
+    if missing:
+        console.print(f"[yellow]Unknown aliases:[/yellow] {', '.join(missing)}")
+
+@group_bp.command(name='remove-member')
+@click.argument('name')
+@click.argument('aliases', nargs=-1, required=True)
+def remove_member(name, aliases):
+    """Remove receivers (by alias) from a group."""
+    group = resolve_group(name)
+    if not group:
+        console.print(f"[red]Group '{name}' not found.[/red]")
+        return
+
+    with transaction() as conn:
+        cur = conn.executemany(
+            "DELETE FROM group_members WHERE group_id = ? AND receiver_id = (SELECT id FROM receivers WHERE alias = ?)",
+            [(group['id'], alias) for alias in aliases]
+        )
+    console.print(f"[green]✔ Removed {cur.rowcount} members from '{name}'.[/green]")
+
+@group_bp.command(name='list')
+@click.argument('query', required=False)
+@click.option('--limit', type=int, help='Limit results (default 10; jsonl streams everything)')
+@click.option('--after', help='Continue after this name or continuation token')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'jsonl']), default='table', help='Output format')
+def list_groups(query, limit, after, fmt):
+    """List groups and their member counts."""
+    if limit is None and fmt == 'table':
+        limit = 10
+
+    # The table reads one row past the page to tell whether another one follows; jsonl stops at --limit
+    fetch = limit + 1 if fmt == 'table' else limit
+    sql, params = keyset_query(
+        "g.name, g.description, (SELECT COUNT(*) FROM group_members m WHERE m.group_id = g.id) AS members",
+        "groups g", "g.name", table="groups", query=query, like_columns=["g.name", "g.description"], row_ref="g",
+        after=after, limit=fetch
+    )
+
+    if fmt == 'jsonl':
+        for row in stream_rows(sql, params):
+            click.echo(json.dumps(row))
+        return
+
+    rows = query_db(sql, params)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if not rows:
+        if query or after:
+            console.print("[yellow]No more groups.[/yellow]")
+        else:
+            console.print("[yellow]No groups yet. Use 'r-mail group add' to create one.[/yellow]")
+        return
+
+    table = Table(title=f"Groups {'(Filtered)' if query else ''}")
+    table.add_column("Name", style="cyan")
+    table.add_column("Members", style="green", justify="right")
+    table.add_column("Description")
+
+    for r in rows:
+        table.add_row(r['name'], str(r['members']), r['description'] or "")
+
+    console.print(table)
+    if has_more:
+        console.print(f"[dim]More results: --after {encode_cursor(rows[-1])}[/dim]")
+
+@group_bp.command(name='members')
+@click.argument('name')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'jsonl']), default='table', help='Output format')
+def list_members(name, fmt):
+    """Show the members of a group."""
+    group = resolve_group(name)
+    if not group:
+        console.print(f"[red]Group '{name}' not found.[/red]")
+        return
+
+    if fmt == 'jsonl':
+        for r in iter_members(group['id']):
+            click.echo(json.dumps({"alias": r['alias'], "name": r['name'], "email": r['email']}))
+        return
+
+    table = Table(title=f"@{name} ({group['members']} members)")
+    table.add_column("Alias", style="cyan")
+    table.add_column("Name", style="green")
+    table.add_column("Email", style="magenta")
+    for r in iter_members(group['id']):
+        table.add_row(r['alias'], r['name'], r['email'])
+    console.print(table)
+
+@group_bp.command(name='delete')
+@click.argument('name')
+@click.confirmation_option(prompt='Delete this group? (Receivers are kept)')
+def delete_group(name):
+    """Delete a group (its receivers stay in the address book)."""
+    db = get_db()
+    cur = db.execute("DELETE FROM groups WHERE name = ?", (name,))
+    db.commit()
+    if cur.rowcount > 0:
+        console.print(f"[green]✔ Deleted group '{name}'[/green]")
+    else:
+        console.print(f"[red]Group '{name}' not found.[/red]")
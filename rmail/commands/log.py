@@ -0,0 +1,126 @@
+import click
+import json
+import re
+import time
+from rich.console import Console
+from rich.table import Table
+from rmail.database import query_db
+
+console = Console()
+
+_WINDOW = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_window(value):
+    """'90s', '15m', '24h', '7d' (or plain seconds) -> seconds."""
+    match = _WINDOW.match(value or "")
+    if not match:
+        raise click.BadParameter(f"'{value}' is not a duration like 15m, 24h or 7d.")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+# Percentiles by nearest rank over the delivered rows of each domain, all in SQLite:
+# the window scan uses idx_send_log_ts (or idx_send_log_domain_ts with --domain).
+STATS_SQL = """
+    WITH w AS (
+        SELECT domain, status, ts, size_bytes, COALESCE(connect_ms, 0) + COALESCE(smtp_ms, 0) AS latency
+        FROM send_log
+        WHERE ts >= ? {domain_filter}
+    ),
+    ranked AS (
+        SELECT domain, latency,
+               ROW_NUMBER() OVER (PARTITION BY domain ORDER BY latency) AS rn,
+               COUNT(*) OVER (PARTITION BY domain) AS n
+        FROM w WHERE status = 'sent'
+    ),
+    pct AS (
+        SELECT domain,
+               MIN(CASE WHEN rn >= 0.50 * n THEN latency END) AS p50,
+               MIN(CASE WHEN rn >= 0.95 * n THEN latency END) AS p95,
+               MIN(CASE WHEN rn >= 0.99 * n THEN latency END) AS p99,
+               MAX(latency) AS max_latency
+        FROM ranked GROUP BY domain
+    ),
+    totals AS (
+        SELECT domain,
+               SUM(status = 'sent') AS sent,
+               SUM(status = 'refused') AS refused,
+               SUM(status = 'failed') AS failed,
+               MIN(ts) AS first_ts, MAX(ts) AS last_ts,
+               AVG(size_bytes) AS avg_size
+        FROM w GROUP BY domain
+    )
+    SELECT t.domain, t.sent, t.refused, t.failed, t.first_ts, t.last_ts, t.avg_size,
+           p.p50, p.p95, p.p99, p.max_latency
+    FROM totals t LEFT JOIN pct p ON p.domain = t.domain
+    ORDER BY t.domain
+"""
+
+@click.group(name='log')
+def log_bp():
+    """Inspect the send history."""
+    pass
+
+@log_bp.command(name='stats')
+@click.option('--since', default='24h', show_default=True, help='Time window (e.g. 15m, 24h, 7d)')
+@click.option('--domain', help='Only this domain')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'jsonl']), default='table', help='Output format')
+def log_stats(since, domain, fmt):
+    """Throughput and p50/p95/p99 delivery latency per domain."""
+    window = parse_window(since)
+    params = [time.time() - window]
+    domain_filter = ""
+    if domain:
+        domain_filter = "AND domain = ?"
+        params.append(domain)
+
+    rows = query_db(STATS_SQL.format(domain_filter=domain_filter), params)
+
+    stats = []
+    for r in rows:
+        # Throughput over the span the domain was actually active (at least one second)
+        span = max(1.0, (r['last_ts'] or 0) - (r['first_ts'] or 0))
+        attempts = r['sent'] + r['refused'] + r['failed']
+        stats.append({
+            "domain": r['domain'],
+            "sent": r['sent'],
+            "refused": r['refused'],
+            "failed": r['failed'],
+            "error_rate": (r['refused'] + r['failed']) / attempts if attempts else 0.0,
+            "msgs_per_sec": r['sent'] / span,
+            "p50_ms": r['p50'],
+            "p95_ms": r['p95'],
+            "p99_ms": r['p99'],
+            "max_ms": r['max_latency'],
+            "avg_bytes": r['avg_size'],
+        })
+
+    if fmt == 'jsonl':
+        for s in stats:
+            click.echo(json.dumps(s))
+        return
+
+    if not stats:
+        console.print(f"[yellow]Nothing sent in the last {since}.[/yellow]")
+        return
+
+    def ms(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    table = Table(title=f"Deliveries, last {since}")
+    table.add_column("Domain", style="cyan")
+    table.add_column("Sent", justify="right", style="green")
+    table.add_column("Refused", justify="right")
+    table.add_column("Failed", justify="right", style="red")
+    table.add_column("msg/s", justify="right")
+    table.add_column("p50", justify="right")
+    table.add_column("p95", justify="right")
+    table.add_column("p99", justify="right", style="magenta")
+
+    for s in stats:
+        table.add_row(
+            s['domain'], str(s['sent']), str(s['refused']), str(s['failed']), f"{s['msgs_per_sec']:.1f}",
+            ms(s['p50_ms']), ms(s['p95_ms']), ms(s['p99_ms'])
+        )
+
+    console.print(table)
+    console.print("[dim]Latency in ms: connect (when a new session was needed) + SMTP transaction.[/dim]")
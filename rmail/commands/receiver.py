@@ -1,10 +1,34 @@
 import click
+import csv
+import json
+import sqlite3
+import sys
+import time
+from itertools import islice
 from rich.console import Console
 from rich.table import Table
-from rmail.database import get_db, query_db
+from rmail.database import get_db, query_db, transaction, keyset_query, stream_rows, encode_cursor
 
 console = Console()
 
+RECEIVER_COLUMNS = ("alias", "name", "email", "notes")
+
+# Upsert on alias. ?1..?4 follow RECEIVER_COLUMNS.
+UPSERT_SQL = """
+    INSERT INTO receivers (alias, name, email, notes) VALUES (?1, ?2, ?3, ?4)
+    ON CONFLICT(alias) DO UPDATE SET
+        name = excluded.name, email = excluded.email, notes = COALESCE(excluded.notes, receivers.notes)
+"""
+
+# Same, but a row is skipped when another alias already owns the email (idx_receivers_email)
+UPSERT_DEDUPE_SQL = """
+    INSERT INTO receivers (alias, name, email, notes)
+    SELECT ?1, ?2, ?3, ?4
+    WHERE NOT EXISTS (SELECT 1 FROM receivers WHERE email = ?3 COLLATE NOCASE AND alias <> ?1)
+    ON CONFLICT(alias) DO UPDATE SET
+        name = excluded.name, email = excluded.email, notes = COALESCE(excluded.notes, receivers.notes)
+"""
+
 @click.group(name='receiver')
 def receiver_bp():
     """Manage Receiver Address Book."""
@@ -79,27 +103,41 @@ def delete_receiver(alias):
 
 @receiver_bp.command(name='list')
 @click.argument('query', required=False)
-@click.option('--limit', default=10, help='Limit results')
-@click.option('--offset', default=0, help='Pagination offset')
-def list_receivers(query, limit, offset):
+@click.option('--limit', type=int, help='Limit results (default 10; jsonl streams everything)')
+@click.option('--after', help='Continue after this alias or continuation token')
+@click.option('--offset', default=0, help='Pagination offset (prefer --after for deep pages)')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'jsonl']), default='table', help='Output format')
+def list_receivers(query, limit, after, offset, fmt):
     """List contacts with pagination and search."""
-    sql = "SELECT alias, name, email FROM receivers"
-    params = []
+    if limit is None and fmt == 'table':
+        limit = 10
 
-    if query:
-        sql += " WHERE alias LIKE ? OR name LIKE ? OR email LIKE ?"
-        wildcard = f"%{query}%"
-        params.extend([wildcard, wildcard, wildcard])
+    # The table reads one row past the page to tell whether another one follows; jsonl stops at --limit
+    fetch = limit + 1 if fmt == 'table' else limit
+    try:
+        # Keyset pagination on the unique alias; FTS5 match ranked by bm25 when searching
+        sql, params = keyset_query(
+            "r.alias, r.name, r.email", "receivers r", "r.alias",
+            table="receivers", query=query, like_columns=["r.alias", "r.name", "r.email"], row_ref="r",
+            after=after, limit=fetch, offset=offset
+        )
+    except ValueError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        return
 
-    sql += " LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+    if fmt == 'jsonl':
+        for row in stream_rows(sql, params):
+            click.echo(json.dumps(row))
+        return
 
     receivers = query_db(sql, params)
+    has_more = len(receivers) > limit
+    receivers = receivers[:limit]
 
     if not receivers:
         if query:
             console.print(f"[yellow]No contacts found matching '{query}'.[/yellow]")
-        elif offset > 0:
+        elif offset > 0 or after:
             console.print("[yellow]No more contacts (end of list).[/yellow]")
         else:
             console.print("[yellow]Address book is empty. Use 'r-mail receiver add' to create one.[/yellow]")
@@ -114,3 +152,84 @@ def list_receivers(query, limit, offset):
         table.add_row(r['alias'], r['name'], r['email'])
 
     console.print(table)
+    if has_more:
+        console.print(f"[dim]More results: --after {encode_cursor(receivers[-1])}[/dim]")
+
+@receiver_bp.command(name='import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=10000, show_default=True, type=click.IntRange(min=1), help='Rows per transaction')
+@click.option('--dedupe-email', is_flag=True, help='Skip rows whose email already belongs to another alias')
+def import_receivers(path, batch_size, dedupe_email):
+    """
+    Import contacts from a CSV (with header) or JSONL file.
+    Needs an 'email' column; 'alias' defaults to the email. Existing aliases are updated.
+    """
+    from rmail.recipients import iter_recipients
+
+    invalid = 0
+
+    def rows():
+        nonlocal invalid
+        for row in iter_recipients(path):
+            email = (row.get('email') or '').strip()
+            if not email:
+                invalid += 1
+                continue
+            alias = (row.get('alias') or '').strip() or email
+            yield (alias, row.get('name') or None, email, row.get('notes') or None)
+
+    sql = UPSERT_DEDUPE_SQL if dedupe_email else UPSERT_SQL
+    source = rows()
+    total = written = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            batch = list(islice(source, batch_size))
+            if not batch:
+                break
+            with transaction() as conn:
+                written += conn.executemany(sql, batch).rowcount
+            total += len(batch)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        console.print(f"[bold red]Import stopped after {total} rows:[/bold red] {e}")
+        return
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed else 0.0
+    console.print(f"[green]✔ Imported {written} contacts[/green] in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    if total - written:
+        console.print(f"[yellow]Skipped {total - written} duplicate emails.[/yellow]")
+    if invalid:
+        console.print(f"[yellow]Skipped {invalid} rows without an email.[/yellow]")
+
+@receiver_bp.command(name='export')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='Write to a file instead of stdout')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', help='Output format')
+def export_receivers(output, fmt):
+    """Export the address book (streamed, so memory stays flat for any size)."""
+    # Progress goes to stderr so stdout can be piped
+    err = Console(stderr=True)
+    out = open(output, 'w', newline='') if output else sys.stdout
+    count = 0
+    start = time.perf_counter()
+    try:
+        rows = stream_rows(f"SELECT {', '.join(RECEIVER_COLUMNS)} FROM receivers ORDER BY alias")
+        if fmt == 'jsonl':
+            for row in rows:
+                out.write(json.dumps(row) + "\n")
+                count += 1
+        else:
+            writer = csv.DictWriter(out, fieldnames=RECEIVER_COLUMNS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    except BrokenPipeError:
+        pass # e.g. `| head`
+    finally:
+        if output:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0.0
+    err.print(f"[green]✔ Exported {count} contacts[/green] in {elapsed:.2f}s ({rate:.0f} rows/sec)")
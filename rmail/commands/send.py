@@ -1,19 +1,22 @@
 import click
+import contextlib
+import itertools
 import sys
-import markdown
+import time
+import smtplib
 import json
-from jinja2 import Environment
 from typing import Any
 from rich.console import Console
 from rich.panel import Panel
 from rmail.database import get_db, query_db, APP_DIR
-from rmail import engine
+from rmail import engine, outbox, profiling, relays
+from rmail.profiling import phase
 
 console = Console()
 
 @click.command(name='send')
 @click.option('-f', '--from', 'sender_alias', required=True, help='Sender alias')
-@click.option('-t', '--to', 'receiver_input', required=True, help='Receiver alias OR email')
+@click.option('-t', '--to', 'receiver_input', required=True, help='Receiver alias, email, or @group')
 @click.option('-s', '--subject', help='Email Subject (Optional if in template)')
 @click.option('-b', '--body', help='HTML Body (overrides template)')
 @click.option('-p', '--template', help='Template filename')
@@ -22,27 +25,54 @@ console = Console()
 @click.option('-C', '--context', 'context_profile', help='Load variables from a saved context profile')
 @click.option('-a', '--attach', multiple=True, help='Attachment path')
 @click.option('--editor/--no-editor', default=True, help='Open editor if no body provided')
-def send_cmd(sender_alias, receiver_input, subject, body, template, message_file, context_vars, attach, editor, context_profile):
+@click.option('-q', '--queue', is_flag=True, help="Queue in the outbox and return immediately (delivered by 'r-mail worker')")
+@click.option('--batch-size', default=1, show_default=True, type=click.IntRange(min=1), help='@group: send identical messages as one transaction with up to N envelope recipients')
+@click.option('--profile', is_flag=True, help='Print where the time went (DB, vault, templates, MIME, SMTP phases)')
+@click.option('--profile-json', type=click.File('w'), help="Write the phase timings as JSON ('-' for stdout)")
+def send_cmd(sender_alias, receiver_input, subject, body, template, message_file, context_vars, attach, editor, context_profile, queue, batch_size, profile, profile_json):
     """Send an email with smart template prompting."""
+    if profile or profile_json:
+        ctx = click.get_current_context()
+        if profile_json is not None and profile_json.name == '<stdout>':
+            # stdout carries the JSON alone: status lines (ours, engine's, prompts) go to stderr
+            ctx.with_resource(contextlib.redirect_stdout(sys.stderr))
+        profiling.start()
+        # Runs however the command exits (including the early returns below), before stdout is restored
+        ctx.call_on_close(lambda: report_profile(profiling.stop(), profile, profile_json))
+
     # -------------------------------------------------------------
     # 1. Resolve Sender
     # -------------------------------------------------------------
-    sql = """
-        SELECT s.email, s.fullname, d.name as domain_name, d.smtp_host, d.smtp_port, d.smtp_user, d.security
-        FROM senders s
-        JOIN domains d ON s.domain_id = d.id
-        WHERE s.alias = ?
-    """
-    sender_row = query_db(sql, (sender_alias,), one=True)
+    with phase("db.sender"):
+        sender_row = relays.resolve_sender(sender_alias)
     if not sender_row:
         console.print(f"[bold red]Error:[/bold red] Sender alias '{sender_alias}' not found.")
         return
 
     # -------------------------------------------------------------
-    # 2. Resolve Receiver
+    # 2. Resolve Receiver(s)
     # -------------------------------------------------------------
-    if "@" not in receiver_input:
-        receiver_row = query_db("SELECT email, name FROM receivers WHERE alias = ?", (receiver_input,), one=True)
+    group = None
+    if receiver_input.startswith("@"):
+        # Group: members are streamed in chunks while sending (one indexed join per chunk)
+        from rmail.recipients import resolve_group, iter_members
+        with phase("db.receiver"):
+            group = resolve_group(receiver_input[1:])
+        if not group:
+            console.print(f"[bold red]Error:[/bold red] Group '{receiver_input[1:]}' not found.")
+            return
+        recipients = iter_members(group['id'])
+        # The count may be stale (members removed since): the first member row decides
+        first = next(recipients, None) if group['members'] else None
+        if first is None:
+            console.print(f"[yellow]Group '{group['name']}' has no members.[/yellow]")
+            return
+        recipients = itertools.chain([first], recipients)
+        receiver_email = first['email']
+        receiver_name = first['name']
+    elif "@" not in receiver_input:
+        with phase("db.receiver"):
+            receiver_row = query_db("SELECT email, name FROM receivers WHERE alias = ?", (receiver_input,), one=True)
         if not receiver_row:
             console.print(f"[bold red]Error:[/bold red] Receiver alias '{receiver_input}' not found.")
             return
@@ -56,12 +86,14 @@ def send_cmd(sender_alias, receiver_input, subject, body, template, message_file
     # 3. Prepare Content
     # -------------------------------------------------------------
 
-    final_context = {"name": receiver_name, "email": receiver_email}
+    # Everything except the recipient's own name/email, layered on top of them per recipient
+    shared_context = {}
 
     # A. Layer 1: Load Saved Profile (Database)
     if context_profile:
         # NEW LOGIC: Query DB
-        ctx_row = query_db("SELECT data FROM contexts WHERE name = ?", (context_profile,), one=True)
+        with phase("db.context"):
+            ctx_row = query_db("SELECT data FROM contexts WHERE name = ?", (context_profile,), one=True)
 
         if not ctx_row:
              console.print(f"[bold red]Error:[/bold red] Context profile '{context_profile}' not found.")
@@ -69,7 +101,7 @@ def send_cmd(sender_alias, receiver_input, subject, body, template, message_file
 
         try:
             saved_data = json.loads(ctx_row['data'])
-            final_context.update(saved_data)
+            shared_context.update(saved_data)
             console.print(f"[dim]Loaded context '{context_profile}' from DB[/dim]")
         except Exception as e:
             console.print(f"[red]Error parsing context data:[/red] {e}")
@@ -79,27 +111,35 @@ def send_cmd(sender_alias, receiver_input, subject, body, template, message_file
         raw_content = message_file.read()
         if message_file.name.endswith('.md'):
             try:
-                # Convert MD -> HTML so it's ready for ANY template
-                html_content = markdown.markdown(raw_content)
-                final_context['message_body'] = html_content
+                with phase("markdown"):
+                    import markdown
+                    # Convert MD -> HTML so it's ready for ANY template
+                    html_content = markdown.markdown(raw_content)
+                shared_context['message_body'] = html_content
                 console.print(f"[dim]Converted Markdown message from '{message_file.name}'[/dim]")
             except Exception as e:
                 console.print(f"[bold red]Markdown Error:[/bold red] {e}")
                 return
         else:
             # It's a plain text/html file, just pass it through
-            final_context['message_body'] = raw_content
+            shared_context['message_body'] = raw_content
             console.print(f"[dim]Loaded message from '{message_file.name}'[/dim]")
 
     # B. Layer 2: Parse CLI Flags (Overwrites Profile)
     for item in context_vars:
         try:
             key, val = item.split('=', 1)
-            final_context[key] = val
+            shared_context[key] = val
         except ValueError:
             pass
 
+    def context_for(name, email):
+        return {"name": name or "", "email": email, **shared_context}
+
+    final_context = context_for(receiver_name, receiver_email)
     final_body = ""
+    render_ms = None
+    subject_template = None  # Set when the subject comes from template metadata
 
     # Logic: Template vs Body vs Interactive
     if body:
@@ -107,7 +147,8 @@ def send_cmd(sender_alias, receiver_input, subject, body, template, message_file
 
     elif template:
         try:
-            meta, raw_content, ext = engine.get_template_meta(template)
+            with phase("template.meta"):
+                meta, _, _ = engine.get_template_meta(template)
 
             if 'variables' in meta:
                 missing_vars = [k for k in meta['variables'].keys() if k not in final_context]
@@ -119,19 +160,21 @@ def send_cmd(sender_alias, receiver_input, subject, body, template, message_file
                         # Layer 3: Interactive Prompt (Only if missing)
                         if var_name not in final_context:
                             user_val = click.prompt(f"{var_name} ({description})")
+                            shared_context[var_name] = user_val
                             final_context[var_name] = user_val
 
             if not subject and 'subject' in meta:
-                raw_subject = meta['subject']
+                subject_template = meta['subject']
 
                 # Manually render the subject string
-                env = Environment()
-                subject_tmpl = env.from_string(raw_subject)
-                subject = subject_tmpl.render(**final_context)
+                with phase("template.subject"):
+                    subject = engine.render_string(subject_template, final_context)
 
                 console.print(f"[dim]Using subject: {subject}[/dim]")
 
-            final_body = engine.render_template_content(raw_content, ext, final_context)
+            render_started = time.perf_counter()
+            final_body = engine.render_template(template, final_context)
+            render_ms = (time.perf_counter() - render_started) * 1000
 
         except Exception as e:
             console.print(f"[bold red]Template Error:[/bold red] {e}")
@@ -141,7 +184,7 @@ def send_cmd(sender_alias, receiver_input, subject, body, template, message_file
         # Interactive Vim Mode fallback
         if sys.stdin.isatty() and editor:
             console.print("[yellow]Opening Vim for Markdown composition...[/yellow]")
-            marker = f"# Message to {receiver_email}\n\n"
+            marker = f"# Message to {receiver_input if group else receiver_email}\n\n"
             input_text = click.edit(marker, extension=".md")
 
             if input_text is None:
@@ -149,6 +192,7 @@ def send_cmd(sender_alias, receiver_input, subject, body, template, message_file
                 return
 
             # Convert the interactive input to HTML
+            import markdown
             final_body = markdown.markdown(input_text)
 
             if not subject:
@@ -163,9 +207,121 @@ def send_cmd(sender_alias, receiver_input, subject, body, template, message_file
         console.print("[red]Error: Subject is required.[/red]")
         return
 
+    if group:
+        send_to_group(sender_row, group, recipients, subject, subject_template, final_body, template, context_for, attach, queue, batch_size)
+        return
+
+    if queue:
+        try:
+            msg = engine.create_message(sender_row['email'], receiver_email, subject, final_body, attach)
+            outbox_id = outbox.enqueue(sender_row['sender_id'], sender_row['email'], receiver_email, subject, engine.message_bytes(msg))
+            console.print(f"[bold green]✔ Queued as #{outbox_id}.[/bold green] [dim]Run 'r-mail worker' to deliver.[/dim]")
+        except Exception as e:
+            console.print(f"[bold red]Failed to queue:[/bold red] {e}")
+        return
+
     try:
         console.print(f"[dim]Sending from {sender_row['email']} to {receiver_email}...[/dim]")
-        engine.send_email(sender_row, receiver_email, subject, final_body, attach)
+        engine.send_email(sender_row, receiver_email, subject, final_body, attach, template=template, render_ms=render_ms)
         console.print(f"[bold green]✔ Email sent successfully![/bold green]")
     except Exception as e:
         console.print(f"[bold red]Failed to send:[/bold red] {e}")
+        if engine.is_permanent_error(e):
+            return  # Permanent rejection, retrying won't help
+
+        # Keep the message instead of losing it; the worker retries with backoff
+        try:
+            msg = engine.create_message(sender_row['email'], receiver_email, subject, final_body, attach)
+            outbox_id = outbox.enqueue(sender_row['sender_id'], sender_row['email'], receiver_email, subject, engine.message_bytes(msg), delay=outbox.backoff_delay(1))
+            console.print(f"[yellow]Saved to outbox as #{outbox_id}; 'r-mail worker' will retry it.[/yellow]")
+        except Exception as qe:
+            console.print(f"[red]Could not queue for retry:[/red] {qe}")
+
+def send_to_group(sender_row, group, recipients, subject, subject_template, body, template, context_for, attach, queue, batch_size=1):
+    """
+    Sends (or queues) one personalized message per group member.
+    Members whose rendered message is identical go out together as multi-RCPT batches of up to batch_size.
+    Transient failures go to the outbox for the worker; permanent (5xx) rejections are counted as failed.
+    """
+    counts = {'sent': 0, 'queued': 0, 'failed': 0}
+    start = time.perf_counter()
+    console.print(f"[dim]Sending from {sender_row['email']} to @{group['name']} ({group['members']} members)...[/dim]")
+
+    def rendered():
+        for r in recipients:
+            ctx = context_for(r['name'], r['email'])
+            try:
+                rcpt_subject = engine.render_string(subject_template, ctx) if subject_template else subject
+                rcpt_body = engine.render_template(template, ctx) if template else body
+            except Exception as e:
+                console.print(f"[red]✘ {r['email']}: template error: {e}[/red]")
+                counts['failed'] += 1
+                continue
+            yield r['email'], rcpt_subject, rcpt_body
+
+    def enqueue(receiver_email, rcpt_subject, rcpt_body):
+        try:
+            msg = engine.create_message(sender_row['email'], receiver_email, rcpt_subject, rcpt_body, attach)
+            outbox.enqueue(sender_row['sender_id'], sender_row['email'], receiver_email, rcpt_subject, engine.message_bytes(msg), delay=0 if queue else outbox.backoff_delay(1))
+            counts['queued'] += 1
+        except Exception as e:
+            console.print(f"[red]✘ {receiver_email}: could not queue: {e}[/red]")
+            counts['failed'] += 1
+
+    for emails, rcpt_subject, rcpt_body in engine.batch_identical(rendered(), 1 if queue else batch_size):
+        if queue:
+            enqueue(emails[0], rcpt_subject, rcpt_body)
+            continue
+
+        try:
+            if len(emails) == 1:
+                engine.send_email(sender_row, emails[0], rcpt_subject, rcpt_body, attach, template=template)
+                refused = {}
+            else:
+                refused = engine.send_batch(sender_row, emails, rcpt_subject, rcpt_body, attach, template=template)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except Exception as e:
+            console.print(f"[red]✘ {', '.join(emails)}: {e}[/red]")
+            if engine.is_permanent_error(e):
+                counts['failed'] += len(emails)
+            else:
+                for receiver_email in emails:
+                    enqueue(receiver_email, rcpt_subject, rcpt_body)
+            continue
+
+        counts['sent'] += len(emails) - len(refused)
+        for receiver_email, (code, reply) in refused.items():
+            console.print(f"[red]✘ {receiver_email}: {code} {reply}[/red]")
+            if code >= 500:
+                counts['failed'] += 1
+            else:
+                enqueue(receiver_email, rcpt_subject, rcpt_body)
+
+    elapsed = time.perf_counter() - start
+    console.print(f"[bold green]✔ @{group['name']}: sent {counts['sent']}, queued {counts['queued']}, failed {counts['failed']}[/bold green] [dim]in {elapsed:.2f}s[/dim]")
+    if counts['queued']:
+        console.print("[dim]Run 'r-mail worker' to deliver queued messages.[/dim]")
+
+def report_profile(profile, show_table, json_file):
+    """Prints the phase breakdown of a --profile run and/or writes it as JSON."""
+    if profile is None:
+        return
+    data = profile.to_dict()
+    if json_file:
+        json_file.write(json.dumps(data, indent=2) + "\n")
+    if not show_table:
+        return
+
+    from rich.table import Table
+    total = data['total_ms'] or 1.0
+    table = Table(title="Send Profile")
+    table.add_column("Phase", style="cyan")
+    table.add_column("Calls", justify="right")
+    table.add_column("ms", justify="right", style="green")
+    table.add_column("%", justify="right")
+    for p in sorted(data['phases'], key=lambda p: p['ms'], reverse=True):
+        table.add_row(p['name'], str(p['calls']), f"{p['ms']:.2f}", f"{p['ms'] / total * 100:.1f}")
+    table.add_row("(other)", "", f"{data['unaccounted_ms']:.2f}", f"{data['unaccounted_ms'] / total * 100:.1f}", style="dim")
+    table.add_row("total", "", f"{data['total_ms']:.2f}", "100.0", style="bold")
+    console.print(table)
@@ -1,7 +1,8 @@
 import click
+import json
 from rich.console import Console
 from rich.table import Table
-from rmail.database import get_db, query_db
+from rmail.database import get_db, query_db, keyset_query, stream_rows, encode_cursor
 
 console = Console()
 
@@ -88,10 +89,17 @@ def delete_sender(alias):
     """Delete a sender identity."""
     db = get_db()
     try:
+        # Its relay group and its unsent outbox messages go with it (ON DELETE CASCADE)
+        unsent = query_db("""
+            SELECT COUNT(*) AS c FROM outbox
+            WHERE sender_id = (SELECT id FROM senders WHERE alias = ?) AND status IN ('queued', 'sending')
+        """, (alias,), one=True)['c']
         cur = db.execute("DELETE FROM senders WHERE alias = ?", (alias,))
         db.commit()
         if cur.rowcount > 0:
             console.print(f"[green]✔ Sender '{alias}' deleted.[/green]")
+            if unsent:
+                console.print(f"[yellow]{unsent} unsent outbox message(s) from it were dropped.[/yellow]")
         else:
             console.print(f"[red]Sender '{alias}' not found.[/red]")
     except Exception as e:
@@ -99,31 +107,41 @@ def delete_sender(alias):
 
 @sender_bp.command(name='list')
 @click.argument('query', required=False)
-@click.option('--limit', default=10, help='Limit results')
-@click.option('--offset', default=0, help='Pagination offset')
-def list_senders(query, limit, offset):
+@click.option('--limit', type=int, help='Limit results (default 10; jsonl streams everything)')
+@click.option('--after', help='Continue after this alias or continuation token')
+@click.option('--offset', default=0, help='Pagination offset (prefer --after for deep pages)')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'jsonl']), default='table', help='Output format')
+def list_senders(query, limit, after, offset, fmt):
     """List senders with pagination and search."""
-    sql = """
-        SELECT s.alias, s.fullname, s.email, d.name as domain_name
-        FROM senders s
-        JOIN domains d ON s.domain_id = d.id
-    """
-    params = []
+    if limit is None and fmt == 'table':
+        limit = 10
 
-    if query:
-        sql += " WHERE s.alias LIKE ? OR s.fullname LIKE ? OR s.email LIKE ?"
-        wildcard = f"%{query}%"
-        params.extend([wildcard, wildcard, wildcard])
+    # The table reads one row past the page to tell whether another one follows; jsonl stops at --limit
+    fetch = limit + 1 if fmt == 'table' else limit
+    try:
+        # Keyset pagination on the unique alias; FTS5 match ranked by bm25 when searching
+        sql, params = keyset_query(
+            "s.alias, s.fullname, s.email, d.name as domain_name", "senders s JOIN domains d ON s.domain_id = d.id", "s.alias",
+            table="senders", query=query, like_columns=["s.alias", "s.fullname", "s.email"], row_ref="s",
+            after=after, limit=fetch, offset=offset
+        )
+    except ValueError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        return
 
-    sql += " LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+    if fmt == 'jsonl':
+        for row in stream_rows(sql, params):
+            click.echo(json.dumps(row))
+        return
 
     senders = query_db(sql, params)
+    has_more = len(senders) > limit
+    senders = senders[:limit]
 
     if not senders:
         if query:
             console.print(f"[yellow]No senders found matching '{query}'.[/yellow]")
-        elif offset > 0:
+        elif offset > 0 or after:
             console.print("[yellow]No more senders (end of list).[/yellow]")
         else:
             console.print("[yellow]No senders configured. Use 'r-mail sender add' to create one.[/yellow]")
@@ -139,3 +157,79 @@ def list_senders(query, limit, offset):
         table.add_row(s['alias'], full_header, s['domain_name'])
 
     console.print(table)
+    if has_more:
+        console.print(f"[dim]More results: --after {encode_cursor(senders[-1])}[/dim]")
+
+@sender_bp.group(name='relay')
+def relay_bp():
+    """Relay groups: extra domains a sender fails over to (or shares traffic with)."""
+    pass
+
+def _sender_and_domain(alias, domain):
+    sender = query_db("SELECT s.id, s.domain_id FROM senders s WHERE s.alias = ?", (alias,), one=True)
+    if not sender:
+        console.print(f"[red]Sender alias '{alias}' not found.[/red]")
+        return None, None
+    domain_record = query_db("SELECT id FROM domains WHERE name = ?", (domain,), one=True)
+    if not domain_record:
+        console.print(f"[bold red]Error:[/bold red] Domain '{domain}' not found.")
+        return sender, None
+    return sender, domain_record
+
+@relay_bp.command(name='add')
+@click.argument('alias')
+@click.argument('domain')
+@click.option('--priority', default=1, show_default=True, type=click.IntRange(min=0), help="Lower is preferred; the sender's own domain is 0")
+@click.option('--weight', default=1.0, show_default=True, type=click.FloatRange(min=0, min_open=True), help='Share of traffic among relays of the same priority')
+def add_relay(alias, domain, priority, weight):
+    """
+    Let a sender also send through DOMAIN (or change its priority/weight).
+    The relay must accept the sender's From address.
+    """
+    sender, domain_record = _sender_and_domain(alias, domain)
+    if not domain_record:
+        return
+    db = get_db()
+    db.execute("""
+        INSERT INTO sender_relays (sender_id, domain_id, priority, weight) VALUES (?, ?, ?, ?)
+        ON CONFLICT (sender_id, domain_id) DO UPDATE SET priority = excluded.priority, weight = excluded.weight
+    """, (sender['id'], domain_record['id'], priority, weight))
+    db.commit()
+    console.print(f"[green]✔ '{alias}' relays through '{domain}' (priority {priority}, weight {weight:g}).[/green]")
+
+@relay_bp.command(name='remove')
+@click.argument('alias')
+@click.argument('domain')
+def remove_relay(alias, domain):
+    """Stop sending through DOMAIN (the sender's own domain stays, at priority 0)."""
+    sender, domain_record = _sender_and_domain(alias, domain)
+    if not domain_record:
+        return
+    db = get_db()
+    cur = db.execute("DELETE FROM sender_relays WHERE sender_id = ? AND domain_id = ?", (sender['id'], domain_record['id']))
+    db.commit()
+    if cur.rowcount:
+        console.print(f"[green]✔ '{domain}' removed from '{alias}' relays.[/green]")
+    else:
+        console.print(f"[yellow]'{domain}' is not a relay of '{alias}'.[/yellow]")
+
+@relay_bp.command(name='list')
+@click.argument('alias')
+def list_relays(alias):
+    """A sender's relay group, in preference order."""
+    from rmail.relays import get_relays, resolve_sender
+
+    sender_row = resolve_sender(alias)
+    if not sender_row:
+        console.print(f"[red]Sender alias '{alias}' not found.[/red]")
+        return
+
+    table = Table(title=f"Relays for '{alias}'")
+    table.add_column("Priority", justify="right", style="cyan")
+    table.add_column("Weight", justify="right")
+    table.add_column("Domain", style="magenta")
+    table.add_column("Server")
+    for relay in get_relays(sender_row):
+        row = relay.row
+        table.add_row(str(relay.priority), f"{relay.weight:g}", row['domain_name'], f"{row['smtp_host']}:{row['smtp_port']} ({row['security']})")
+    console.print(table)
@@ -1,9 +1,12 @@
 import click
 import os
+import json
+import heapq
 from pathlib import Path
 from rich.console import Console
 from rich.table import Table
 from rmail import database
+from rmail.database import encode_cursor, decode_cursor
 
 console = Console()
 TEMPLATE_DIR = database.APP_DIR / "templates"
@@ -68,45 +71,60 @@ def delete_template(name):
     else:
         console.print(f"[red]Template '{name}' not found.[/red]")
 
+def _iter_templates(query=None, after=None):
+    """Streams template DirEntries (.html/.md) from the directory without building a full list."""
+    with os.scandir(TEMPLATE_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(('.html', '.md')) or not entry.is_file():
+                continue
+            if after is not None and entry.name <= after:
+                continue
+            # Case-insensitive filename matching
+            if query and query.lower() not in entry.name.lower():
+                continue
+            yield entry
+
 @template_bp.command(name='list')
 @click.argument('query', required=False)
-@click.option('--limit', default=10, help='Limit results')
-@click.option('--offset', default=0, help='Pagination offset')
-def list_templates(query, limit, offset):
+@click.option('--limit', type=int, help='Limit results (default 10; jsonl streams everything)')
+@click.option('--after', help='Continue after this filename or continuation token')
+@click.option('--offset', default=0, help='Pagination offset (prefer --after for deep pages)')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'jsonl']), default='table', help='Output format')
+def list_templates(query, limit, after, offset, fmt):
     """List available templates (.html and .md)."""
-    # 1. Fetch all valid files
-    all_files = sorted(
-        list(TEMPLATE_DIR.glob("*.html")) +
-        list(TEMPLATE_DIR.glob("*.md"))
-    )
-
-    # 2. Filter (Search)
-    if query:
-        # Case-insensitive filename matching
-        filtered_files = [f for f in all_files if query.lower() in f.name.lower()]
-    else:
-        filtered_files = all_files
+    if limit is None and fmt == 'table':
+        limit = 10
+    after_name = decode_cursor(after)[-1] if after else None
+
+    # 1. jsonl streams matches in directory order, so nothing has to be held in memory. Paging
+    #    (--after/--offset/--limit) needs a stable order, so a page is taken in name order as in the table.
+    if fmt == 'jsonl':
+        entries = _iter_templates(query, after_name)
+        if limit is not None:
+            entries = heapq.nsmallest(offset + limit, entries, key=lambda e: e.name)[offset:]
+        elif offset or after_name is not None:
+            entries = sorted(entries, key=lambda e: e.name)[offset:]
+        for entry in entries:
+            ftype = "HTML" if entry.name.endswith('.html') else "Markdown"
+            click.echo(json.dumps({"filename": entry.name, "type": ftype, "size": entry.stat().st_size}))
+        return
 
-    # 3. Paginate (Slice)
-    # This mimics SQL "LIMIT ? OFFSET ?"
-    start = offset
-    end = offset + limit
-    paged_files = filtered_files[start:end]
+    # 2. Keep only the first offset+limit+1 names in sort order (heap, no full sort)
+    window = heapq.nsmallest(offset + limit + 1, _iter_templates(query, after_name), key=lambda e: e.name)
+    paged_files = window[offset:offset + limit]
+    has_more = len(window) > offset + limit
 
-    # 4. Display Logic (The 3-State Feedback)
+    # 3. Display Logic (The 3-State Feedback)
     if not paged_files:
         if query:
              # Scenario A: User searched, found nothing
             console.print(f"[yellow]No templates found matching '{query}'.[/yellow]")
-        elif offset > 0 and filtered_files:
+        elif offset > 0 or after:
              # Scenario B: User paged too far
             console.print("[yellow]No more templates (end of list).[/yellow]")
-        elif not all_files:
+        else:
              # Scenario C: Folder is actually empty
             console.print("[yellow]No templates found. Create one with 'r-mail template edit <name>'[/yellow]")
-        else:
-            # Scenario D: Offset > 0 but no matches (edge case)
-            console.print("[yellow]No more templates.[/yellow]")
         return
 
     table = Table(title=f"Email Templates {'(Filtered)' if query else ''}")
@@ -115,7 +133,9 @@ def list_templates(query, limit, offset):
     table.add_column("Size", style="green")
 
     for f in paged_files:
-        ftype = "HTML" if f.suffix == '.html' else "Markdown"
+        ftype = "HTML" if f.name.endswith('.html') else "Markdown"
         table.add_row(f.name, ftype, f"{f.stat().st_size} bytes")
 
     console.print(table)
+    if has_more:
+        console.print(f"[dim]More results: --after {encode_cursor({'_key': paged_files[-1].name})}[/dim]")
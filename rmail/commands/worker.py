@@ -0,0 +1,70 @@
+import click
+import time
+from rich.console import Console
+from rmail import engine, outbox, sendlog
+
+console = Console()
+
+@click.command(name='worker')
+@click.option('--batch-size', default=100, show_default=True, type=click.IntRange(min=1), help='Messages claimed per batch')
+@click.option('--interval', default=5.0, show_default=True, help='Seconds to sleep when the queue is empty')
+@click.option('--max-attempts', default=outbox.MAX_ATTEMPTS, show_default=True, help='Give up on a message after this many attempts')
+@click.option('--once', is_flag=True, help='Drain everything currently due, then exit')
+def worker_cmd(batch_size, interval, max_attempts, once):
+    """Deliver queued messages from the outbox with retry/backoff."""
+    def requeue_stale():
+        stale = outbox.requeue_stale()
+        if stale:
+            console.print(f"[yellow]Requeued {stale} message(s) left in 'sending' by a previous worker.[/yellow]")
+        return time.monotonic()
+
+    checked_at = requeue_stale()
+    console.print(f"[dim]Worker started (batch {batch_size}, poll {interval}s). Ctrl+C to stop.[/dim]")
+    try:
+        while True:
+            # Another worker may have died since; don't leave its rows until the next restart
+            if time.monotonic() - checked_at >= outbox.REQUEUE_INTERVAL:
+                checked_at = requeue_stale()
+
+            batch = outbox.claim_batch(batch_size)
+            if not batch:
+                # No delivery will record() while idle to flush the send log: write out what it holds
+                sendlog.get_writer().flush()
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            sent_ids, failures = [], []
+            started = renewed_at = time.perf_counter()
+            try:
+                for row in batch:
+                    if time.perf_counter() - renewed_at >= outbox.LEASE_RENEW:
+                        # Still working: the whole batch stays 'sending' until record_results, so none
+                        # of it may be re-claimed by another worker meanwhile
+                        outbox.renew_lease([r['id'] for r in batch])
+                        renewed_at = time.perf_counter()
+                    try:
+                        engine.deliver(row, row['from_addr'], [row['to_addr']], row['message'])
+                        sent_ids.append(row['id'])
+                    except Exception as e:
+                        failures.append((row, e))
+                        console.print(f"[red]✘ #{row['id']} {row['to_addr']}:[/red] {e}")
+            finally:
+                # Also on Ctrl+C mid-batch: rows already sent must not stay 'sending' (requeue_stale would send them again)
+                retried, dead = outbox.record_results(sent_ids, failures, max_attempts)
+                done = set(sent_ids) | {row['id'] for row, _ in failures}
+                outbox.release([row['id'] for row in batch if row['id'] not in done])
+
+            elapsed = time.perf_counter() - started
+            console.print(
+                f"[green]✔ {len(sent_ids)} sent[/green], {retried} rescheduled, [red]{dead} failed[/red] "
+                f"[dim]({len(batch) / elapsed:.1f} msgs/sec)[/dim]"
+            )
+    except KeyboardInterrupt:
+        console.print("[yellow]Worker stopped.[/yellow]")
+    finally:
+        engine.get_pool().close_all()
+
+    counts = outbox.stats()
+    console.print(f"[dim]Outbox: {', '.join(f'{k}={v}' for k, v in sorted(counts.items())) or 'empty'}[/dim]")
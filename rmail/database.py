@@ -1,6 +1,13 @@
 import sqlite3
 import os
+import re
+import json
+import base64
 import stat
+import sys
+import atexit
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 # Define paths
@@ -8,12 +15,122 @@ APP_DIR = Path.home() / ".r-mail"
 DB_PATH = APP_DIR / "data.db"
 VAULT_PATH = APP_DIR / "secrets.enc"
 
-def get_db():
-    """Connects to the database and returns the connection."""
-    conn = sqlite3.connect(DB_PATH)
+# Applied to every connection. WAL lets a worker write while the CLI reads,
+# busy_timeout makes writers wait for each other instead of failing with "database is locked".
+# foreign_keys makes schema.sql's ON DELETE clauses apply: deleting a receiver, group or sender
+# cascades to its memberships, outbox rows and relays, and a domain in use can't be deleted.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+)
+STATEMENT_CACHE_SIZE = 256
+
+# Columns added after a table first shipped: schema.sql has them for new databases,
+# migrate() adds them to existing ones (and re-runs schema.sql for new tables/indexes).
+# Bump SCHEMA_VERSION whenever schema.sql or search.sql changes.
+SCHEMA_VERSION = 6
+COLUMN_MIGRATIONS = (
+    # (version, table, column, declaration)
+    (1, "domains", "max_rate", "REAL"),
+    (1, "domains", "burst", "INTEGER"),
+)
+
+_local = threading.local()
+_open_connections = []
+_open_lock = threading.Lock()
+
+def connect():
+    """Opens a new, tuned connection. Most code should use get_db() instead."""
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row # Allows accessing columns by name
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def get_db():
+    """
+    Returns this thread's shared connection, opening it on first use.
+    The connection stays open for the life of the process; don't close it.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        # First use in this thread, or we are a forked child that must not share the parent's handle
+        conn = connect()
+        migrate(conn)
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.tx_depth = 0
+        with _open_lock:
+            _open_connections.append(conn)
+    return conn
+
+@atexit.register
+def close_all():
+    """Closes every managed connection (checkpoints the WAL)."""
+    with _open_lock:
+        conns = [c for c in _open_connections]
+        _open_connections.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.__dict__.clear()
+
+@contextmanager
+def transaction(immediate=False):
+    """
+    Groups writes into one commit. Nested blocks join the outermost transaction.
+    immediate=True takes the write lock up front (use it for read-then-update sequences).
+    """
+    conn = get_db()
+    if _local.tx_depth:
+        _local.tx_depth += 1
+        try:
+            yield conn
+        finally:
+            _local.tx_depth -= 1
+        return
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    _local.tx_depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        _local.tx_depth = 0
+
+def migrate(conn):
+    """Brings an existing database up to SCHEMA_VERSION (a single PRAGMA read when it already is)."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if not tables:
+        return  # Not initialized yet; schema.sql creates the current layout
+    for since, table, column, declaration in COLUMN_MIGRATIONS:
+        if since <= version or table not in tables:
+            continue
+        columns = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    # Everything in schema.sql and search.sql is IF NOT EXISTS, so this only adds what's new
+    with open(Path(__file__).parent / "schema.sql") as f:
+        conn.executescript(f.read())
+    init_search(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
 def init_app():
     """Initializes the application directory and database with strict permissions."""
     # 1. Create Directory with 700 permissions (rwx------)
@@ -26,7 +143,7 @@ def init_app():
     conn = get_db()
     with open(Path(__file__).parent / "schema.sql") as f:
         conn.executescript(f.read())
-    conn.close()
+    migrate(conn)  # Also creates the full-text search indexes (skipped when SQLite lacks FTS5)
 
     # 3. Secure the Database File (rw-------)
     if DB_PATH.exists():
@@ -38,11 +155,124 @@ def init_app():
 
     print(f"Initialized r-mail at {APP_DIR}")
 
+SEARCH_TABLES = ("receivers", "senders", "domains", "contexts")
+
+def init_search(conn):
+    """Creates the FTS5 indexes and triggers, back-filling any index that didn't exist yet."""
+    existing = {r['name'] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    try:
+        with open(Path(__file__).parent / "search.sql") as f:
+            conn.executescript(f.read())
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+        # stderr: this can run on the first command after an upgrade, whose stdout may be jsonl
+        print("SQLite was built without FTS5; list searches will use LIKE.", file=sys.stderr)
+        return False
+
+    for table in SEARCH_TABLES:
+        if f"{table}_fts" not in existing:
+            conn.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+    conn.commit()
+    _search_index.clear()
+    return True
+
+_search_index = {}
+
+def has_search_index(table):
+    """True if the table's FTS5 index exists and this SQLite build can query it."""
+    if table not in _search_index:
+        try:
+            get_db().execute(f"SELECT rowid FROM {table}_fts LIMIT 0")
+            _search_index[table] = True
+        except sqlite3.OperationalError:
+            _search_index[table] = False
+    return _search_index[table]
+
+def fts_match_expression(query):
+    """Turns free text into an FTS5 query: every word must match as a prefix ("bo smi" -> "bo"* "smi"*)."""
+    tokens = re.findall(r"\w+", query)
+    return " ".join(f'"{t}"*' for t in tokens) or None
+
+def search_filter(table, query, like_columns, row_ref=None):
+    """
+    Builds the filtering part of a list query for `table`.
+    Returns (join_sql, condition_sql, params, score_sql): an FTS5 match scored by bm25 when the
+    index is available (score_sql is None otherwise), or the LIKE '%q%' scan over like_columns.
+    """
+    match = fts_match_expression(query)
+    if match and has_search_index(table):
+        fts = f"{table}_fts"
+        return f" JOIN {fts} ON {fts}.rowid = {row_ref or table}.id", f"{fts} MATCH ?", [match], f"bm25({fts})"
+
+    wildcard = f"%{query}%"
+    condition = "(" + " OR ".join(f"{column} LIKE ?" for column in like_columns) + ")"
+    return "", condition, [wildcard] * len(like_columns), None
+
+def encode_cursor(row):
+    """Opaque continuation token for the row a page ended on (see keyset_query)."""
+    key = [row['_score'], row['_key']] if '_score' in row.keys() else [row['_key']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def decode_cursor(token):
+    """Returns [key] or [score, key]. Anything that isn't a token is taken as a plain key (e.g. an alias)."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if isinstance(key, list) and len(key) in (1, 2):
+            return key
+    except ValueError:
+        pass
+    return [token]
+
+def keyset_query(columns, from_sql, key, table=None, query=None, like_columns=(), row_ref=None, after=None, limit=None, offset=0):
+    """
+    Builds a list query paged by key instead of OFFSET, so every page is an index range scan.
+    Rows are ordered by `key` (a unique column), or by (bm25 score, key) when searching with FTS5.
+    Selected rows carry `_key` (and `_score`) so encode_cursor() can continue after the last one.
+    Returns (sql, params).
+    """
+    join = condition = ""
+    score = None
+    params = []
+    if query:
+        join, condition, params, score = search_filter(table, query, like_columns, row_ref)
+
+    inner = f"SELECT {columns}, {key} AS _key" + (f", {score} AS _score" if score else "")
+    inner += f" FROM {from_sql}{join}" + (f" WHERE {condition}" if condition else "")
+    sql = f"SELECT * FROM ({inner})"
+
+    if after:
+        cursor = decode_cursor(after)
+        if score:
+            if len(cursor) != 2:
+                raise ValueError("That continuation token doesn't belong to a search; rerun the search without --after.")
+            sql += " WHERE (_score, _key) > (?, ?)"
+            params.extend(cursor)
+        else:
+            sql += " WHERE _key > ?"
+            params.append(cursor[-1])
+
+    sql += " ORDER BY _score, _key" if score else " ORDER BY _key"
+    if limit is not None or offset:
+        sql += " LIMIT ?"
+        params.append(-1 if limit is None else limit)
+        if offset:
+            sql += " OFFSET ?"
+            params.append(offset)
+    return sql, params
+
+def stream_rows(sql, params=()):
+    """Yields rows as dicts straight from the cursor (no fetchall), minus the paging columns."""
+    cur = get_db().execute(sql, params)
+    names = [d[0] for d in cur.description]
+    for row in cur:
+        yield {k: v for k, v in zip(names, row) if not k.startswith('_')}
+
 def query_db(query, args=(), one=False):
-    """Helper function to run queries."""
+    """Helper function to run queries (commits unless inside transaction())."""
     conn = get_db()
     cur = conn.execute(query, args)
     rv = cur.fetchall()
-    conn.commit()
-    conn.close()
+    if not _local.tx_depth and conn.in_transaction:
+        conn.commit()
     return (rv[0] if rv else None) if one else rv
@@ -1,130 +1,803 @@
 import smtplib
 import ssl
 import os
-import markdown
-import frontmatter
+import copy
+import time
+import atexit
+import threading
+import functools
+import json
+import re
+from io import BytesIO
+from contextlib import contextmanager
+from email.generator import BytesGenerator
+from email.utils import make_msgid
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
-from bs4 import BeautifulSoup
-from jinja2 import Environment, FileSystemLoader
-from rmail import database
-from rmail.vault import Vault
+from rmail import database, relays, sendlog
+from rmail.plaintext import html_to_text
+from rmail.profiling import phase
 
 def get_password(domain_name, username):
-    """Fetch SMTP password from the encrypted Vault."""
-    vault = Vault()
-    return vault.get_password("rmail", domain_name)
+    """Fetch SMTP password from the encrypted Vault (cached for the life of the process)."""
+    with phase("vault"):
+        from rmail.vault import get_vault
+        return get_vault().get_password("rmail", domain_name)
 
 def create_message(sender_email, receiver_email, subject, html_content, attachments=None):
     """Builds a multipart MIME message (HTML + Plaintext fallback + Attachments)."""
-    msg = MIMEMultipart("mixed")
-    msg["Subject"] = subject
-    msg["From"] = sender_email
-    msg["To"] = receiver_email
+    with phase("mime.build"):
+        msg = MIMEMultipart("mixed")
+        msg["Subject"] = subject
+        msg["From"] = sender_email
+        msg["To"] = receiver_email
+        # Explicit domain: make_msgid() would otherwise resolve the local FQDN on every call
+        msg["Message-ID"] = make_msgid(domain=sender_email.rpartition("@")[2] or None)
 
-    # 1. Create the Body (Alternative: Text or HTML)
-    msg_body = MIMEMultipart("alternative")
+        # 1. Create the Body (Alternative: Text or HTML)
+        msg_body = MIMEMultipart("alternative")
 
-    # Generate Plain Text from HTML for better deliverability
-    soup = BeautifulSoup(html_content, "html.parser")
-    text_content = soup.get_text(separator="\n").strip()
+        # Generate Plain Text from HTML for better deliverability
+        with phase("mime.plaintext"):
+            text_content = html_to_text(html_content)
 
-    part_text = MIMEText(text_content, "plain")
-    part_html = MIMEText(html_content, "html")
+        part_text = MIMEText(text_content, "plain")
+        part_html = MIMEText(html_content, "html")
 
-    msg_body.attach(part_text)
-    msg_body.attach(part_html)
-    msg.attach(msg_body)
+        msg_body.attach(part_text)
+        msg_body.attach(part_html)
+        msg.attach(msg_body)
 
-    # 2. Process Attachments
-    if attachments:
-        for filepath in attachments:
-            filename = os.path.basename(filepath)
-            with open(filepath, "rb") as f:
-                part = MIMEApplication(f.read(), Name=filename)
-            part['Content-Disposition'] = f'attachment; filename="{filename}"'
-            msg.attach(part)
+        # 2. Process Attachments
+        if attachments:
+            with phase("mime.attachments"):
+                for filepath in attachments:
+                    filename = os.path.basename(filepath)
+                    with open(filepath, "rb") as f:
+                        part = MIMEApplication(f.read(), Name=filename)
+                    part['Content-Disposition'] = f'attachment; filename="{filename}"'
+                    msg.attach(part)
 
-    return msg
+        return msg
 
-def send_email(sender_row, receiver_email, subject, html_body, attachments=None):
+def message_bytes(msg):
+    """Flattens a message to wire format (CRLF line endings, Bcc stripped), as smtplib would send it."""
+    if msg.get_all('Bcc'):
+        msg = copy.copy(msg)
+        del msg['Bcc']
+    with phase("mime.serialize"):
+        buf = BytesIO()
+        BytesGenerator(buf).flatten(msg, linesep='\r\n')
+        return buf.getvalue()
+
+# RFC 2920 PIPELINING: when the server offers it, MAIL/RCPT/DATA go out in one write.
+# RMAIL_PIPELINING=0 forces the classic one-command-per-round-trip dialogue.
+PIPELINING = os.getenv("RMAIL_PIPELINING", "1") != "0"
+# Seconds to wait on a relay's socket; without one a hung relay stalls the send instead of failing over
+SMTP_TIMEOUT = float(os.getenv("RMAIL_SMTP_TIMEOUT", 30))
+
+# Lines starting with "." must be doubled inside DATA (RFC 5321 4.5.2)
+_DOT_LINE = re.compile(rb'(?m)^\.')
+
+class _PipeliningMixin:
     """
-    Orchestrates the sending process.
-    sender_row: Dictionary containing domain and sender info from DB.
+    smtplib sendmail() that batches the envelope commands when the server supports PIPELINING,
+    turning MAIL + N*RCPT + DATA from N+2 round trips into one. Same return value and exceptions
+    as smtplib.SMTP.sendmail, which it falls back to otherwise.
+    """
+
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):
+        self.ehlo_or_helo_if_needed()
+        if not (PIPELINING and self.has_extn('pipelining')):
+            return super().sendmail(from_addr, to_addrs, msg, mail_options, rcpt_options)
+
+        if isinstance(msg, str):
+            msg = smtplib._fix_eols(msg).encode('ascii')
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        mail_opts = list(mail_options)
+        if self.has_extn('size'):
+            mail_opts.append(f"size={len(msg)}")
+        rcpt_opts = "".join(" " + o for o in rcpt_options)
+
+        commands = [f"mail FROM:{smtplib.quoteaddr(from_addr)}" + "".join(" " + o for o in mail_opts)]
+        commands += [f"rcpt TO:{smtplib.quoteaddr(rcpt)}{rcpt_opts}" for rcpt in to_addrs]
+        commands.append("data")
+        self.send("".join(c + "\r\n" for c in commands))
+
+        # Every pipelined command gets a reply; read them all so the session stays in sync
+        mail_code, mail_resp = self.getreply()
+        refused = {}
+        for rcpt in to_addrs:
+            code, resp = self.getreply()
+            if code not in (250, 251):
+                refused[rcpt] = (code, resp)
+        data_code, data_resp = self.getreply()
+
+        if data_code == 354 and (mail_code != 250 or len(refused) == len(to_addrs)):
+            # Server accepted DATA anyway; end it with an empty message and discard the transaction
+            self.send(b".\r\n")
+            self.getreply()
+            data_code = 0
+
+        if mail_code != 250:
+            if mail_code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr)
+        if len(refused) == len(to_addrs):
+            self._rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        if data_code != 354:
+            self._rset()
+            raise smtplib.SMTPDataError(data_code, data_resp)
+
+        payload = _DOT_LINE.sub(b'..', msg)
+        if not payload.endswith(b"\r\n"):
+            payload += b"\r\n"
+        self.send(payload + b".\r\n")
+        code, resp = self.getreply()
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPDataError(code, resp)
+        return refused
+
+class PipeliningSMTP(_PipeliningMixin, smtplib.SMTP):
+    pass
+
+class PipeliningSMTP_SSL(_PipeliningMixin, smtplib.SMTP_SSL):
+    pass
+
+# One SSLContext per domain for the life of the process: building one loads the CA bundle,
+# which costs more than the handshake it is used for
+_ssl_contexts = {}
+# Last TLS session per (domain, host, port), offered again on reconnect (abbreviated handshake).
+# Keyed like the contexts: a session only resumes under the SSLContext that created it, and
+# several domain rows (accounts, relay groups) may point at one relay.
+_tls_sessions = {}
+_tls_lock = threading.Lock()
+
+def get_ssl_context(sender_row):
+    """The shared client SSLContext for the sender's domain."""
+    key = sender_row['domain_name']
+    with _tls_lock:
+        context = _ssl_contexts.get(key)
+        if context is None:
+            context = _ssl_contexts[key] = ssl.create_default_context()
+        return context
+
+def tls_session_key(sender_row):
+    return (sender_row['domain_name'], sender_row['smtp_host'], sender_row['smtp_port'])
+
+class _ResumingContext:
+    """
+    Stands in for an SSLContext in smtplib (SMTP_SSL and starttls() only call wrap_socket):
+    offers the previous TLS session of this domain on this relay so the handshake can resume it.
+    """
+
+    def __init__(self, context, key):
+        self.context = context
+        self.key = key
+
+    def wrap_socket(self, sock, server_hostname=None, **kwargs):
+        with _tls_lock:
+            context, session = _tls_sessions.get(self.key, (None, None))
+        if context is not self.context:
+            session = None  # Created under another context (ssl raises ValueError for it)
+        return self.context.wrap_socket(sock, server_hostname=server_hostname, session=session, **kwargs)
+
+def _remember_tls_session(server, context):
+    """Keeps the session for the next connect. Call after the first reply over TLS (TLS 1.3 tickets arrive late)."""
+    sock = getattr(server, 'sock', None)
+    if isinstance(sock, ssl.SSLSocket) and sock.session is not None:
+        with _tls_lock:
+            _tls_sessions[context.key] = (context.context, sock.session)
+        return sock.session_reused
+    return None
+
+def connect(sender_row, quiet=False):
+    """
+    Opens an authenticated SMTP session for the sender's domain, with the transport its
+    security mode calls for: implicit TLS for SSL, an upgrade for STARTTLS, plain for NONE.
+    TLS sessions are resumed across reconnects of the same domain to the same relay.
+    Used by SMTPPool; the caller owns the returned server and must quit() it.
+    quiet=True skips the console line, for background threads (relay probes).
     """
     domain = sender_row['domain_name']
     host = sender_row['smtp_host']
     port = sender_row['smtp_port']
     user = sender_row['smtp_user']
     security = sender_row['security']
+    context = None
+    if security in ('SSL', 'STARTTLS'):
+        context = _ResumingContext(get_ssl_context(sender_row), tls_session_key(sender_row))
 
-    # 1. Build the email
-    msg = create_message(sender_row['email'], receiver_email, subject, html_body, attachments)
-
-    # 2. Connect to SMTP
-    try:
+    if not quiet:
         print(f"Connecting to {host}:{port} ({security})...")
-        server = smtplib.SMTP(host, port)
-
+    if security == 'SSL':
+        with phase("smtp.tls"):  # TCP connect and handshake in one step
+            server = PipeliningSMTP_SSL(host, port, context=context, timeout=SMTP_TIMEOUT)
+    else:
+        with phase("smtp.connect"):
+            server = PipeliningSMTP(host, port, timeout=SMTP_TIMEOUT)
         if security == 'STARTTLS':
-            server.starttls(context=ssl.create_default_context())
-        elif security == 'SSL':
-            server = smtplib.SMTP_SSL(host, port, context=ssl.create_default_context())
-
-        # 3. Login (Skip if NONE)
-        if security != 'NONE':
-            password = get_password(domain, user)
-            if not password:
-                raise ValueError(f"No password found in Vault for domain '{domain}' user '{user}'")
+            with phase("smtp.tls"):
+                server.starttls(context=context)
+                server.ehlo()
+
+    if context is not None:
+        _remember_tls_session(server, context)
+
+    # Login (Skip if NONE)
+    if security != 'NONE':
+        password = get_password(domain, user)
+        if not password:
+            raise ValueError(f"No password found in Vault for domain '{domain}' user '{user}'")
+        with phase("smtp.auth"):
             server.login(user, password)
 
-        # 4. Send
-        server.send_message(msg)
-        server.quit()
-        return True
+    return server
+
+class PooledConnection:
+    """An open SMTP session plus the bookkeeping the pool needs to recycle it."""
 
+    def __init__(self, key, server):
+        self.key = key
+        self.server = server
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+    def close(self):
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                self.server.close()
+            except OSError:
+                pass
+
+class SMTPPool:
+    """
+    Keeps logged-in SMTP sessions alive between sends.
+    Sessions are keyed by (host, port, security, user), so every sender on the same
+    domain row shares them. Idle sessions are probed with NOOP before reuse, closed
+    after idle_timeout, and recycled after max_messages.
+    """
+
+    def __init__(self, size=2, idle_timeout=60.0, probe_after=5.0, max_messages=100):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.probe_after = probe_after
+        self.max_messages = max_messages
+        self._idle = {}     # key -> [PooledConnection]
+        self._in_use = {}   # key -> int
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def key_for(sender_row):
+        return (sender_row['smtp_host'], sender_row['smtp_port'], sender_row['security'], sender_row['smtp_user'])
+
+    def _is_alive(self, conn):
+        """NOOP liveness probe; skipped for sessions that were used a moment ago."""
+        if time.monotonic() - conn.last_used < self.probe_after:
+            return True
+        try:
+            code, _ = conn.server.noop()
+            return code == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def acquire(self, sender_row):
+        """Returns a live PooledConnection, reusing an idle one when possible."""
+        key = self.key_for(sender_row)
+        with self._cond:
+            while True:
+                idle = self._idle.get(key)
+                if idle or self._in_use.get(key, 0) < self.size:
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    conn = idle.pop() if idle else None
+                    break
+                self._cond.wait()
+
+        # Probe (NOOP) and close (QUIT) outside the lock: both are round trips to the relay.
+        # A dead session's slot goes to the next idle one, or to a fresh connection.
+        while conn is not None:
+            if time.monotonic() - conn.last_used <= self.idle_timeout and self._is_alive(conn):
+                return conn
+            conn.close()
+            with self._cond:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+
+        # Connect outside the lock so a slow handshake doesn't block other domains
+        try:
+            return PooledConnection(key, connect(sender_row))
+        except Exception:
+            with self._cond:
+                self._in_use[key] -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Returns a session to the pool, or closes it if broken or past its message cap."""
+        conn.last_used = time.monotonic()
+        recycle = discard or conn.messages_sent >= self.max_messages
+        with self._cond:
+            self._in_use[conn.key] -= 1
+            if not recycle:
+                self._idle.setdefault(conn.key, []).append(conn)
+            self._cond.notify()
+        if recycle:
+            conn.close()
+
+    @contextmanager
+    def connection(self, sender_row):
+        conn = self.acquire(sender_row)
+        try:
+            yield conn
+        except smtplib.SMTPResponseException as e:
+            # A rejected command leaves the session usable (smtplib already sent RSET), except 421
+            self.release(conn, discard=e.smtp_code == 421)
+            raise
+        except smtplib.SMTPRecipientsRefused as e:
+            # Every RCPT refused: smtplib sent RSET too, unless one of the refusals was a 421
+            self.release(conn, discard=any(code == 421 for code, _ in e.recipients.values()))
+            raise
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle = [c for conns in self._idle.values() for c in conns]
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Process-wide SMTP pool. Tunable through RMAIL_POOL_SIZE, RMAIL_POOL_IDLE_TIMEOUT
+    and RMAIL_POOL_MAX_MESSAGES, or replaced entirely with configure_pool().
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPPool(
+                size=int(os.getenv("RMAIL_POOL_SIZE", 2)),
+                idle_timeout=float(os.getenv("RMAIL_POOL_IDLE_TIMEOUT", 60)),
+                max_messages=int(os.getenv("RMAIL_POOL_MAX_MESSAGES", 100)),
+            )
+        return _pool
+
+def configure_pool(**options):
+    """Replaces the process-wide pool (closing idle sessions of the old one)."""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, SMTPPool(**options)
+    if old is not None:
+        old.close_all()
+    return _pool
+
+@atexit.register
+def _close_pool():
+    if _pool is not None:
+        _pool.close_all()
+
+# Temporary replies relays use for "slow down" (421 also closes the session)
+THROTTLE_CODES = frozenset({421, 450, 451, 452, 454})
+THROTTLE_RETRIES = 3
+THROTTLE_PAUSE = 0.5  # Seconds; grows linearly with each retry of the same message
+
+class RateLimiter:
+    """
+    Token bucket for one domain: `rate` messages/sec on average, up to `burst` back to back.
+    The rate adapts: throttle() lowers it by one step (a tenth of max_rate) after a 4xx
+    slow-down reply, and every success() wins back a tenth of a step, up to max_rate.
+    """
+
+    def __init__(self, max_rate, burst=None):
+        self.max_rate = float(max_rate)
+        self.burst = max(1, int(burst or 0) or int(self.max_rate + 0.999))
+        self.step = self.max_rate / 10
+        self.min_rate = self.max_rate / 20
+        self.rate = self.max_rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, count=1):
+        """
+        Takes `count` tokens (relays meter recipients, so a batch costs one per RCPT)
+        and returns how many seconds the caller must wait before sending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= count
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def wait(self, count=1):
+        delay = self.reserve(count)
+        if delay:
+            time.sleep(delay)
+
+    def throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate - self.step)
+            # Spend the burst allowance too, so the slower rate applies immediately
+            self._tokens = min(self._tokens, 0.0)
+
+    def success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.step / 10)
+
+_limiters = {}   # domain_name -> ((max_rate, burst) as configured, RateLimiter)
+_limiters_lock = threading.Lock()
+
+def _row_value(row, key):
+    """Column value from a sqlite3.Row or dict, None when the column wasn't selected."""
+    try:
+        return row[key]
+    except (KeyError, IndexError):
+        return None
+
+def get_rate_limiter(sender_row):
+    """Shared RateLimiter for the sender's domain, or None when the domain has no max_rate."""
+    max_rate = _row_value(sender_row, 'max_rate')
+    if not max_rate:
+        return None
+    config = (max_rate, _row_value(sender_row, 'burst'))
+    key = sender_row['domain_name']
+    with _limiters_lock:
+        cached = _limiters.get(key)
+        if cached is None or cached[0] != config:
+            # New domain, or its limits were changed since: start a fresh bucket
+            cached = _limiters[key] = (config, RateLimiter(*config))
+        return cached[1]
+
+def throttle_code(exc):
+    """The SMTP code if exc is a temporary slow-down reply, else None."""
+    if isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code in THROTTLE_CODES:
+        return exc.smtp_code
+    if isinstance(exc, smtplib.SMTPRecipientsRefused) and exc.recipients:
+        codes = {code for code, _ in exc.recipients.values()}
+        if codes <= THROTTLE_CODES:
+            return min(codes)
+    return None
+
+def is_permanent_error(exc):
+    """
+    True when the relay rejected the message for good (5xx), so retrying it won't help:
+    a 5xx reply, or every recipient refused with a 5xx. Everything else may succeed later.
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return bool(exc.recipients) and all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+def deliver(sender_row, from_addr, to_addrs, data, template=None, render_ms=None, mime_ms=None):
+    """
+    Sends an already flattened message over a pooled session.
+    A session the relay already dropped is replaced once. On domains with a max_rate the
+    send waits for the rate limiter, and slow-down replies (4xx) are retried at a lower rate.
+    Senders with a relay group go through the healthiest relay and fail over to the next one
+    on relay errors (see rmail.relays).
+    Every attempt is recorded in the send log (template/render_ms/mime_ms are passed through).
+    Returns the refused recipients.
+    """
+    router = relays.get_router()
+    for relay in router.route(relays.get_relays(sender_row)):
+        try:
+            return _deliver_via(relay, from_addr, to_addrs, data, template, render_ms, mime_ms)
+        except Exception as e:
+            if not relays.is_relay_error(e):
+                raise
+            error = e
+    raise error
+
+def _deliver_via(relay, from_addr, to_addrs, data, template=None, render_ms=None, mime_ms=None):
+    """deliver() through one relay of the sender's group; the outcome also updates its health."""
+    sender_row = relay.row
+    pool = get_pool()
+    limiter = get_rate_limiter(sender_row)
+    reconnected = False
+    throttled = 0
+    started = time.perf_counter()
+    waited = connect_s = 0.0
+
+    def log(refused=None, error=None):
+        smtp_s = time.perf_counter() - started - waited - connect_s
+        relays.get_router().record(relay, connect_s * 1000, smtp_s * 1000, error)
+        sendlog.get_writer().record_delivery(
+            sender_row, from_addr, to_addrs, data, refused, error, template=template,
+            render_ms=render_ms, mime_ms=mime_ms, connect_ms=connect_s * 1000, smtp_ms=smtp_s * 1000
+        )
+
+    while True:
+        if limiter:
+            t0 = time.perf_counter()
+            with phase("rate_limit"):
+                limiter.wait(len(to_addrs))
+            waited += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        try:
+            with pool.connection(sender_row) as conn:
+                connect_s += time.perf_counter() - t0
+                with phase("smtp.send"):
+                    refused = conn.server.sendmail(from_addr, to_addrs, data)
+                conn.messages_sent += 1
+        except smtplib.SMTPServerDisconnected as e:
+            if reconnected:
+                log(error=e)
+                raise
+            reconnected = True
+            continue
+        except smtplib.SMTPException as e:
+            if limiter and throttle_code(e) and throttled < THROTTLE_RETRIES:
+                limiter.throttle()
+                throttled += 1
+                time.sleep(THROTTLE_PAUSE * throttled)
+                waited += THROTTLE_PAUSE * throttled
+                continue
+            log(error=e)
+            raise
+        except Exception as e:
+            log(error=e)
+            raise
+        if limiter:
+            limiter.success()
+        log(refused)
+        return refused
+
+def send_email(sender_row, receiver_email, subject, html_body, attachments=None, template=None, render_ms=None):
+    """
+    Orchestrates the sending process.
+    sender_row: Dictionary containing domain and sender info from DB.
+    The SMTP session is drawn from the process-wide pool and returned to it afterwards.
+    template/render_ms only annotate the send log.
+    """
+    # 1. Build the email
+    t0 = time.perf_counter()
+    msg = create_message(sender_row['email'], receiver_email, subject, html_body, attachments)
+    data = message_bytes(msg)
+    mime_ms = (time.perf_counter() - t0) * 1000
+
+    # 2. Send over a pooled session
+    try:
+        deliver(sender_row, sender_row['email'], [receiver_email], data, template=template, render_ms=render_ms, mime_ms=mime_ms)
+        return True
     except Exception as e:
         print(f"SMTP Error: {e}")
         raise e
 
-def get_template_meta(template_name):
+# Header shown to recipients of a batched message; the real addresses only go in RCPT TO
+UNDISCLOSED_RECIPIENTS = "undisclosed-recipients:;"
+
+def batch_identical(rendered, max_recipients):
     """
-    Returns: (metadata_dict, content_string, extension_found)
+    Groups consecutive (receiver_email, subject, html_body) items whose subject and body are
+    identical into (emails, subject, html_body) batches of at most max_recipients.
+    Personalized content simply comes out as batches of one. Streams; holds one batch at a time.
     """
-    template_dir = database.APP_DIR / "templates"
+    emails, current = [], None
+    for receiver_email, subject, html_body in rendered:
+        if current is not None and (len(emails) >= max_recipients or current != (subject, html_body)):
+            yield emails, current[0], current[1]
+            emails = []
+        current = (subject, html_body)
+        emails.append(receiver_email)
+    if emails:
+        yield emails, current[0], current[1]
+
+def create_batch_message(sender_email, subject, html_content, attachments=None):
+    """One MIME message for many recipients, addressed to nobody in particular (they're envelope-only)."""
+    return create_message(sender_email, UNDISCLOSED_RECIPIENTS, subject, html_content, attachments)
 
-    # Try finding the file and detecting extension
-    file_path = None
-    extension = ".html" # Default
+def send_batch(sender_row, receiver_emails, subject, html_body, attachments=None, template=None, render_ms=None):
+    """
+    Delivers identical content to many recipients in one SMTP transaction (one DATA, many RCPT TO).
+    Returns the refused recipients ({email: (code, message)}); raises if every recipient was refused.
+    """
+    t0 = time.perf_counter()
+    data = message_bytes(create_batch_message(sender_row['email'], subject, html_body, attachments))
+    mime_ms = (time.perf_counter() - t0) * 1000
+    return deliver(sender_row, sender_row['email'], list(receiver_emails), data, template=template, render_ms=render_ms, mime_ms=mime_ms)
+
+TEMPLATE_DIR = database.APP_DIR / "templates"
+CACHE_DIR = database.APP_DIR / "cache"
+
+def _strip_frontmatter(text):
+    """Same body python-frontmatter returns, without paying for the YAML parse."""
+    import frontmatter
+    text = text.strip()
+    handler = frontmatter.detect_format(text, frontmatter.handlers)
+    if handler is None:
+        return text
+    try:
+        _, content = handler.split(text)
+    except ValueError:
+        return text
+    return content.strip()
+
+def _load_template_source(name):
+    """
+    Jinja FunctionLoader callback: the template body without its YAML frontmatter,
+    plus an uptodate check on the file's mtime (what FileSystemLoader does).
+    """
+    from jinja2.loaders import split_template_path
+
+    path = TEMPLATE_DIR.joinpath(*split_template_path(name))
+    try:
+        mtime = path.stat().st_mtime_ns
+        source = path.read_text(encoding="utf-8")
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+
+    def uptodate():
+        try:
+            return path.stat().st_mtime_ns == mtime
+        except OSError:
+            return False
+
+    return _strip_frontmatter(source), str(path), uptodate
+
+_env = None
+
+def get_environment():
+    """
+    The shared Jinja Environment.
+    Compiled templates live in Jinja's in-memory LRU (keyed by name, revalidated by file
+    mtime through the loader), and bytecode is persisted under ~/.r-mail/cache so a new
+    process skips lexing/parsing/compiling too.
+    """
+    global _env
+    if _env is None:
+        from jinja2 import Environment, FunctionLoader, FileSystemBytecodeCache
+
+        CACHE_DIR.mkdir(parents=True, exist_ok=True, mode=0o700)
+        _env = Environment(
+            loader=FunctionLoader(_load_template_source),
+            bytecode_cache=FileSystemBytecodeCache(str(CACHE_DIR)),
+            auto_reload=True,
+            cache_size=int(os.getenv("RMAIL_TEMPLATE_CACHE_SIZE", 400)),
+        )
+    return _env
+
+@functools.lru_cache(maxsize=256)
+def _compile_string(source):
+    return get_environment().from_string(source)
+
+def render_string(source, context={}):
+    """Renders an ad-hoc Jinja string (e.g. a subject line); compiled once per distinct source."""
+    return _compile_string(source).render(**context)
+
+def _probe_template(template_name):
+    """Finds a template file, trying the name as given, then .md, then .html."""
+    template_dir = TEMPLATE_DIR
 
     if (template_dir / template_name).exists():
-        file_path = template_dir / template_name
-        extension = file_path.suffix
+        return template_dir / template_name
     elif (template_dir / f"{template_name}.md").exists():
-        file_path = template_dir / f"{template_name}.md"
-        extension = ".md"
+        return template_dir / f"{template_name}.md"
     elif (template_dir / f"{template_name}.html").exists():
-        file_path = template_dir / f"{template_name}.html"
-        extension = ".html"
+        return template_dir / f"{template_name}.html"
+
+    raise ValueError(f"Template '{template_name}' not found.")
+
+TEMPLATE_INDEX_PATH = CACHE_DIR / "templates.json"
+_template_index = None
+
+def _load_template_index(dir_mtime):
+    """
+    Name -> filename index, persisted in the cache dir.
+    Any create/delete/rename in the templates dir bumps its mtime, which invalidates it.
+    """
+    global _template_index
+    if _template_index is None or _template_index['dir_mtime'] != dir_mtime:
+        try:
+            with open(TEMPLATE_INDEX_PATH) as f:
+                _template_index = json.load(f)
+        except (OSError, ValueError):
+            _template_index = None
+        if not isinstance(_template_index, dict) or _template_index.get('dir_mtime') != dir_mtime:
+            _template_index = {'dir_mtime': dir_mtime, 'names': {}}
+    return _template_index
+
+def _save_template_index(index):
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True, mode=0o700)
+        tmp_path = TEMPLATE_INDEX_PATH.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, TEMPLATE_INDEX_PATH)
+    except OSError:
+        pass  # The index is only an optimisation
+
+def resolve_template(template_name):
+    """
+    Resolves a template name to its file, using the persistent index when it is still valid.
+    Returns: (file_path, extension)
+    """
+    try:
+        dir_mtime = TEMPLATE_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise ValueError(f"Template '{template_name}' not found.")
+
+    index = _load_template_index(dir_mtime)
+    filename = index['names'].get(template_name)
+    if filename is None:
+        filename = str(_probe_template(template_name).relative_to(TEMPLATE_DIR))
+        index['names'][template_name] = filename
+        _save_template_index(index)
+
+    file_path = TEMPLATE_DIR / filename
+    return file_path, file_path.suffix
 
-    if not file_path:
+# Resolved path -> ((mtime_ns, size), (metadata, content, extension))
+_meta_cache = {}
+
+def get_template_meta(template_name):
+    """
+    Returns: (metadata_dict, content_string, extension_found)
+    The frontmatter is parsed once per template edit; treat the returned dict as read-only.
+    """
+    file_path, extension = resolve_template(template_name)
+    try:
+        st = file_path.stat()
+    except FileNotFoundError:
         raise ValueError(f"Template '{template_name}' not found.")
 
-    post = frontmatter.load(str(file_path))
-    return post.metadata, post.content, extension
+    key = str(file_path)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _meta_cache.get(key)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    with phase("template.frontmatter"):
+        import frontmatter
+        post = frontmatter.load(key)
+    result = (post.metadata, post.content, extension)
+    _meta_cache[key] = (signature, result)
+    return result
+
+def render_template(template_name, context={}):
+    """
+    Renders a stored template by name through the shared Environment.
+    Unchanged templates are served from the compiled-template cache.
+    """
+    file_path, extension = resolve_template(template_name)
+    with phase("template.load"):
+        compiled = get_environment().get_template(file_path.relative_to(TEMPLATE_DIR).as_posix())
+    with phase("template.render"):
+        rendered = compiled.render(**context)
+
+    if extension == '.md':
+        with phase("markdown"):
+            import markdown
+            return markdown.markdown(rendered)
+    return rendered
 
 def render_template_content(content, extension, context={}):
     """
     Renders the raw content string (stripped of frontmatter).
     """
-    # 1. Jinja2 Render
-    env = Environment()
-    template = env.from_string(content)
-    rendered = template.render(**context)
+    # 1. Jinja2 Render (compiled once per distinct content)
+    rendered = render_string(content, context)
 
     # 2. Markdown Render (if applicable)
     if extension == '.md':
+        import markdown
         return markdown.markdown(rendered)
     return rendered
-
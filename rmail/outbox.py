@@ -0,0 +1,115 @@
+import random
+import time
+from rmail import engine
+from rmail.database import query_db, transaction
+
+# Retry schedule: base * 2^(attempt-1) seconds, capped, with jitter
+BACKOFF_BASE = 30
+BACKOFF_CAP = 3600
+MAX_ATTEMPTS = 8
+
+# Claimed rows are leased: while 'sending', next_attempt_at holds the lease expiry. The worker
+# renews the lease of its batch as it goes (renew_lease), so only a worker that died mid-batch
+# lets it run out, however long the batch takes.
+LEASE = 300
+LEASE_RENEW = 60       # Seconds between renewals in a running worker
+REQUEUE_INTERVAL = 60  # Seconds between checks for expired leases in a running worker
+
+def backoff_delay(attempts, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Exponential backoff with 'equal jitter': half the delay is fixed, half is random."""
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def enqueue(sender_id, from_addr, to_addr, subject, message, delay=0):
+    """Stores a rendered message for the worker. Returns the outbox id."""
+    with transaction() as db:
+        cur = db.execute(
+            "INSERT INTO outbox (sender_id, from_addr, to_addr, subject, message, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (sender_id, from_addr, to_addr, subject, message, time.time() + delay)
+        )
+        return cur.lastrowid
+
+def claim_batch(limit=100):
+    """
+    Atomically moves up to `limit` due messages from 'queued' to 'sending', leased for LEASE
+    seconds, and returns them with their sender/domain columns. Uses the (status, next_attempt_at) index.
+    """
+    now = time.time()
+    with transaction(immediate=True) as db:
+        rows = db.execute("""
+            SELECT o.id, o.from_addr, o.to_addr, o.subject, o.message, o.attempts,
+                   s.id as sender_id, s.email, s.fullname,
+                   d.name as domain_name, d.smtp_host, d.smtp_port, d.smtp_user, d.security, d.max_rate, d.burst
+            FROM outbox o
+            JOIN senders s ON o.sender_id = s.id
+            JOIN domains d ON s.domain_id = d.id
+            WHERE o.status = 'queued' AND o.next_attempt_at <= ?
+            ORDER BY o.next_attempt_at
+            LIMIT ?
+        """, (now, limit)).fetchall()
+        db.executemany(
+            "UPDATE outbox SET status = 'sending', next_attempt_at = ? WHERE id = ?",
+            [(now + LEASE, r['id']) for r in rows]
+        )
+        return rows
+
+def renew_lease(ids):
+    """Extends the lease of claimed rows that are still 'sending' by another LEASE seconds."""
+    with transaction() as db:
+        db.executemany(
+            "UPDATE outbox SET next_attempt_at = ? WHERE id = ? AND status = 'sending'",
+            [(time.time() + LEASE, i) for i in ids]
+        )
+
+def requeue_stale():
+    """Returns 'sending' rows whose lease ran out (crashed worker) to the queue. Returns the count."""
+    with transaction() as db:
+        cur = db.execute(
+            "UPDATE outbox SET status = 'queued' WHERE status = 'sending' AND next_attempt_at <= ?",
+            (time.time(),)
+        )
+        return cur.rowcount
+
+def release(ids):
+    """Puts claimed rows that were never attempted (worker stopped mid-batch) back in the queue, due now."""
+    with transaction() as db:
+        db.executemany(
+            "UPDATE outbox SET status = 'queued', next_attempt_at = ? WHERE id = ? AND status = 'sending'",
+            [(time.time(), i) for i in ids]
+        )
+
+def record_results(sent_ids, failures, max_attempts=MAX_ATTEMPTS):
+    """
+    Writes a batch outcome in one transaction. Sent rows keep their envelope and subject, not the message.
+    failures: list of (row, exception). Permanent rejections (engine.is_permanent_error) and
+    exhausted retries become 'failed', everything else is rescheduled with backoff.
+    """
+    now = time.time()
+    retry, dead = [], []
+    for row, error in failures:
+        attempts = row['attempts'] + 1
+        if engine.is_permanent_error(error) or attempts >= max_attempts:
+            dead.append((attempts, str(error), row['id']))
+        else:
+            retry.append((attempts, now + backoff_delay(attempts), str(error), row['id']))
+
+    with transaction() as db:
+        db.executemany(
+            # The payload has done its job: keep the row as a record, not the message (attachments included)
+            "UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, sent_at = CURRENT_TIMESTAMP, message = X'' WHERE id = ?",
+            [(i,) for i in sent_ids]
+        )
+        db.executemany(
+            "UPDATE outbox SET status = 'queued', attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            retry
+        )
+        db.executemany(
+            "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+            dead
+        )
+    return len(retry), len(dead)
+
+def stats():
+    """Row counts per status."""
+    rows = query_db("SELECT status, count(*) as c FROM outbox GROUP BY status")
+    return {r['status']: r['c'] for r in rows}
@@ -0,0 +1,253 @@
+import os
+import time
+import asyncio
+import itertools
+import smtplib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from rmail import engine, recipients
+
+# Campaign pipeline for send-bulk, one generator per stage:
+#
+#   recipient source -> merge_context -> render_messages -> build_messages -> deliver_messages
+#
+# Every stage pulls one item at a time from the previous one, and the only buffers are bounded
+# (a --batch-size batch, the asyncio engine's job queue, the send log's flush buffer), so memory
+# stays flat whatever the list length. benchmarks/bench_memory.py checks that.
+#
+# Rendering can also fan out to a process pool (RenderPipeline): Jinja, Markdown, the plaintext
+# part and MIME flattening are CPU-bound and serialised by the GIL, so workers render chunks of
+# rows into wire-ready bytes. The delivery side drains finished chunks in order while the next
+# ones render; at most `depth` chunks are in flight, so a slow relay holds back rendering
+# instead of letting it pile up in memory.
+
+CHUNK_SIZE = 50
+
+def recipient_source(spec):
+    """
+    Recipient rows (dicts with at least 'email') for a recipients file (CSV/JSONL) or '@group'.
+    Group members are read with keyset-paged queries, never fetched all at once.
+    """
+    if spec.startswith("@"):
+        group = recipients.resolve_group(spec[1:])
+        if not group:
+            raise ValueError(f"Group '{spec[1:]}' not found.")
+        return ({"alias": r['alias'], "name": r['name'], "email": r['email']} for r in recipients.iter_members(group['id']))
+
+    return recipients.iter_recipients(spec)
+
+def merge_context(rows, shared_context):
+    """(receiver_email, context) per row; row values override the shared ones."""
+    for row in rows:
+        yield row['email'], {"name": "", **shared_context, **row}
+
+def render_messages(contexts, template, subject, on_error):
+    """
+    (receiver_email, subject, html_body, render_ms) per context. Rows that fail to render are
+    passed to on_error(receiver_email, message) and dropped.
+    """
+    for receiver_email, context in contexts:
+        t0 = time.perf_counter()
+        try:
+            final_subject = engine.render_string(subject, context)
+            final_body = engine.render_template(template, context)
+        except Exception as e:
+            on_error(receiver_email, str(e))
+            continue
+        yield receiver_email, final_subject, final_body, (time.perf_counter() - t0) * 1000
+
+def build_messages(rendered, sender_email, attachments=None, batch_size=1):
+    """
+    (receiver_emails, data, timings) per message: identical consecutive renders are batched
+    (engine.batch_identical) and flattened to wire format. timings feed the send log.
+    """
+    render_times = deque()
+
+    def without_times():
+        for receiver_email, final_subject, final_body, render_ms in rendered:
+            render_times.append(render_ms)
+            yield receiver_email, final_subject, final_body
+
+    for receiver_emails, final_subject, final_body in engine.batch_identical(without_times(), batch_size):
+        render_ms = sum(render_times.popleft() for _ in receiver_emails)
+        t0 = time.perf_counter()
+        if len(receiver_emails) == 1:
+            msg = engine.create_message(sender_email, receiver_emails[0], final_subject, final_body, attachments)
+        else:
+            msg = engine.create_batch_message(sender_email, final_subject, final_body, attachments)
+        data = engine.message_bytes(msg)
+        yield receiver_emails, data, {"render_ms": render_ms, "mime_ms": (time.perf_counter() - t0) * 1000}
+
+def deliver_messages(built, sender_row, template=None):
+    """
+    Sends each built message over the engine's pool and yields (receiver_email, error) per
+    recipient (error None on success). engine.deliver records every attempt in the send log.
+    """
+    for receiver_emails, data, timings in built:
+        try:
+            refused = engine.deliver(sender_row, sender_row['email'], receiver_emails, data, template=template, **timings)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except Exception as e:
+            for receiver_email in receiver_emails:
+                yield receiver_email, e
+            continue
+        for receiver_email in receiver_emails:
+            if receiver_email in refused:
+                code, reply = refused[receiver_email]
+                yield receiver_email, smtplib.SMTPResponseException(code, reply)
+            else:
+                yield receiver_email, None
+
+def delivery_jobs(built, sender_row):
+    """Adapts built messages to async_engine.deliver_all jobs."""
+    for receiver_emails, data, timings in built:
+        yield sender_row, receiver_emails[0] if len(receiver_emails) == 1 else receiver_emails, data, timings
+
+async def async_delivery_jobs(built, sender_row):
+    async for receiver_emails, data, timings in built:
+        yield sender_row, receiver_emails[0] if len(receiver_emails) == 1 else receiver_emails, data, timings
+
+# Per-process render settings, set once by the pool initializer
+_job = None
+
+def _init_worker(job):
+    global _job
+    _job = job
+
+def render_chunk(rows):
+    """
+    Pool task: runs merge_context/render_messages/build_messages over one chunk with the
+    worker's job settings. Returns (items, errors, busy_seconds).
+    """
+    started = time.perf_counter()
+    errors = []
+    contexts = merge_context(rows, _job['shared_context'])
+    rendered = render_messages(contexts, _job['template'], _job['subject'], lambda email, error: errors.append((email, error)))
+    items = list(build_messages(rendered, _job['sender_email'], _job['attachments'], _job['batch_size']))
+    return items, errors, time.perf_counter() - started
+
+class PipelineStats:
+    """Where the time went: busy time of the render workers vs time delivery waited for them."""
+
+    def __init__(self, workers, chunk_size, depth):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.depth = depth
+        self.started = None
+        self.finished = None
+        self.chunks = 0
+        self.recipients = 0
+        self.render_busy = 0.0     # Summed over workers
+        self.delivery_wait = 0.0   # Delivery side blocked on the next chunk
+        self.ready_total = 0       # Finished chunks waiting in the queue, summed at every take
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def utilisation(self):
+        elapsed = self.elapsed or 1e-9
+        return {
+            "render": min(1.0, self.render_busy / (self.workers * elapsed)),
+            "delivery": max(0.0, 1.0 - self.delivery_wait / elapsed),
+            "queue": self.ready_total / (self.chunks * self.depth) if self.chunks else 0.0,
+        }
+
+    def to_dict(self):
+        return {
+            "workers": self.workers, "chunk_size": self.chunk_size, "depth": self.depth,
+            "chunks": self.chunks, "recipients": self.recipients, "elapsed_s": round(self.elapsed, 3),
+            "render_busy_s": round(self.render_busy, 3), "delivery_wait_s": round(self.delivery_wait, 3),
+            "utilisation": {k: round(v, 3) for k, v in self.utilisation().items()},
+        }
+
+class RenderPipeline:
+    """
+    Renders recipient rows in a process pool and yields (receiver_emails, data, timings) in input
+    order, like build_messages; rows that fail to render go to on_error. run() is a plain generator
+    for the serial sender, arun() an async one for the asyncio engine (waiting for a chunk doesn't
+    block the event loop).
+    """
+
+    def __init__(self, sender_email, template, subject, shared_context, attachments=None, batch_size=1,
+                 workers=None, chunk_size=CHUNK_SIZE, depth=None):
+        self.job = {
+            "sender_email": sender_email, "template": template, "subject": subject,
+            "shared_context": shared_context, "attachments": list(attachments or []), "batch_size": batch_size,
+        }
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.depth = depth or self.workers * 2
+        self.stats = PipelineStats(self.workers, self.chunk_size, self.depth)
+
+    def _executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.job,))
+
+    def _chunks(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _take(self, items, errors, busy, on_error):
+        for receiver_email, error in errors:
+            on_error(receiver_email, error)
+        self.stats.chunks += 1
+        self.stats.recipients += sum(len(receiver_emails) for receiver_emails, *_ in items)
+        self.stats.render_busy += busy
+
+    def _fill(self, pool, pending, chunks):
+        while len(pending) < self.depth:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            pending.append(pool.submit(render_chunk, chunk))
+
+    def _ready(self, pending):
+        return sum(1 for f in pending if f.done())
+
+    def run(self, rows, on_error):
+        chunks = self._chunks(rows)
+        pending = deque()
+        pool = self._executor()
+        self.stats.started = time.perf_counter()
+        try:
+            self._fill(pool, pending, chunks)
+            while pending:
+                self.stats.ready_total += self._ready(pending)
+                future = pending.popleft()
+                t0 = time.perf_counter()
+                items, errors, busy = future.result()
+                self.stats.delivery_wait += time.perf_counter() - t0
+                self._take(items, errors, busy, on_error)
+                self._fill(pool, pending, chunks)
+                yield from items
+        finally:
+            self.stats.finished = time.perf_counter()
+            pool.shutdown(cancel_futures=True)
+
+    async def arun(self, rows, on_error):
+        chunks = self._chunks(rows)
+        pending = deque()
+        pool = self._executor()
+        self.stats.started = time.perf_counter()
+        try:
+            self._fill(pool, pending, chunks)
+            while pending:
+                self.stats.ready_total += self._ready(pending)
+                future = pending.popleft()
+                t0 = time.perf_counter()
+                items, errors, busy = await asyncio.wrap_future(future)
+                self.stats.delivery_wait += time.perf_counter() - t0
+                self._take(items, errors, busy, on_error)
+                self._fill(pool, pending, chunks)
+                for item in items:
+                    yield item
+        finally:
+            self.stats.finished = time.perf_counter()
+            pool.shutdown(cancel_futures=True)
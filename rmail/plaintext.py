@@ -0,0 +1,165 @@
+import re
+from html.parser import HTMLParser
+
+# Elements whose contents never show up as text (BeautifulSoup's get_text skips them too)
+SKIP_TAGS = {'script', 'style', 'template', 'noscript'}
+
+# Elements that start on their own line; the value is the number of line breaks around them
+BLOCK_TAGS = {
+    'p': 2, 'h1': 2, 'h2': 2, 'h3': 2, 'h4': 2, 'h5': 2, 'h6': 2,
+    'ul': 2, 'ol': 2, 'table': 2, 'blockquote': 2, 'pre': 2, 'hr': 2, 'dl': 2,
+    'div': 1, 'section': 1, 'article': 1, 'header': 1, 'footer': 1, 'main': 1,
+    'nav': 1, 'aside': 1, 'center': 1, 'address': 1, 'figure': 1, 'figcaption': 1,
+    'title': 1, 'body': 1, 'html': 1, 'tr': 1, 'li': 1, 'dt': 1, 'dd': 1,
+    'thead': 1, 'tbody': 1, 'tfoot': 1, 'caption': 1, 'form': 1, 'fieldset': 1,
+}
+
+CELL_TAGS = {'td', 'th'}
+CELL_SEPARATOR = " | "
+
+_WHITESPACE = re.compile(r'\s+')
+
+class PlainTextConverter(HTMLParser):
+    """
+    Streaming HTML -> plaintext converter driven by HTMLParser events (no tree).
+    Blocks become paragraphs/lines, list items get bullets, table cells on one row
+    are joined with " | ", and link targets are appended as "text (url)".
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.line = []
+        self.pending_breaks = 0
+        self.pending_space = False
+        self.pending_prefix = ""
+        self.skip_depth = 0
+        self.pre_depth = 0
+        self.lists = []     # Stack of ordered-list counters (None for <ul>)
+        self.cells = []     # Stack of "cells already written on this row" per open <tr>
+        self.links = []     # Stack of (href, [text fragments])
+
+    # -- output helpers ------------------------------------------------
+
+    def _break(self, count):
+        self.pending_breaks = max(self.pending_breaks, count)
+        self.pending_space = False
+
+    def _write(self, text):
+        if self.pending_breaks and (self.line or self.lines):
+            self.lines.append("".join(self.line))
+            self.lines.extend([""] * (self.pending_breaks - 1))
+            self.line = []
+        self.pending_breaks = 0
+
+        if self.pending_prefix:
+            self.line.append(self.pending_prefix)
+            self.pending_prefix = ""
+        elif self.pending_space and self.line:
+            self.line.append(" ")
+        self.pending_space = False
+
+        self.line.append(text)
+        for _, fragments in self.links:
+            fragments.append(text)
+
+    # -- parser events -------------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if tag == 'br':
+            self._break(1)
+            return
+        if tag in BLOCK_TAGS:
+            self._break(BLOCK_TAGS[tag])
+
+        if tag == 'pre':
+            self.pre_depth += 1
+        elif tag == 'ul':
+            self.lists.append(None)
+        elif tag == 'ol':
+            self.lists.append(0)
+        elif tag == 'li':
+            if self.lists and self.lists[-1] is not None:
+                self.lists[-1] += 1
+                self.pending_prefix = f"{self.lists[-1]}. "
+            else:
+                self.pending_prefix = "- "
+        elif tag == 'tr':
+            self.cells.append(0)
+        elif tag in CELL_TAGS and self.cells:
+            if self.cells[-1] and not self.pending_breaks:
+                self.pending_prefix = CELL_SEPARATOR
+            self.cells[-1] += 1
+        elif tag == 'a':
+            self.links.append((dict(attrs).get('href') or "", []))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in ('br', 'hr'):
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+            return
+        if tag == 'pre':
+            self.pre_depth = max(self.pre_depth - 1, 0)
+        elif tag in ('ul', 'ol') and self.lists:
+            self.lists.pop()
+        elif tag == 'tr' and self.cells:
+            self.cells.pop()
+        elif tag == 'a' and self.links:
+            href, fragments = self.links.pop()
+            text = "".join(fragments).strip()
+            if href and not href.startswith(('#', 'mailto:', 'javascript:')) and href != text:
+                self._write(f" ({href})" if text else href)
+
+        if tag in BLOCK_TAGS:
+            self._break(BLOCK_TAGS[tag])
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+
+        if self.pre_depth:
+            first, *rest = data.split("\n")
+            if first:
+                self._write(first)
+            for chunk in rest:
+                self._break(1)
+                if chunk:
+                    self._write(chunk)
+            return
+
+        text = _WHITESPACE.sub(" ", data)
+        if not text.strip():
+            if text:
+                self.pending_space = True
+            return
+        if text[0] == " ":
+            self.pending_space = True
+        self._write(text.strip())
+        if text[-1] == " ":
+            self.pending_space = True
+
+    # -- result --------------------------------------------------------
+
+    def get_text(self):
+        lines = self.lines + ["".join(self.line)]
+        out = []
+        for line in lines:
+            line = line.rstrip()
+            if not line and (not out or not out[-1]):
+                continue  # Collapse runs of blank lines
+            out.append(line)
+        return "\n".join(out).strip()
+
+def html_to_text(html):
+    """Plaintext fallback for an HTML body."""
+    converter = PlainTextConverter()
+    converter.feed(html)
+    converter.close()
+    return converter.get_text()
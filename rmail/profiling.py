@@ -0,0 +1,89 @@
+import threading
+import time
+from contextlib import nullcontext
+
+# Per-phase wall-clock timers for `send --profile`.
+# While no profile is active, phase() hands back one shared no-op context manager,
+# so instrumented code pays a function call and nothing else. Only the thread that started
+# the profile is timed: phases on background threads (relay probes) would interleave with
+# its phase stack.
+
+_NOOP = nullcontext()
+_active = None
+
+class Profile:
+    """
+    Accumulates time per phase. Phases may nest; each one records its exclusive time
+    (minus nested phases), so the phases add up to the wall time they cover.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.phases = {}  # name -> [seconds, calls], in first-seen order
+        self.thread = threading.get_ident()
+        self._stack = []
+
+    def add(self, name, seconds):
+        entry = self.phases.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    @property
+    def total(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def to_dict(self):
+        total = self.total
+        accounted = sum(seconds for seconds, _ in self.phases.values())
+        return {
+            "total_ms": round(total * 1000, 3),
+            "phases": [
+                {"name": name, "calls": calls, "ms": round(seconds * 1000, 3)}
+                for name, (seconds, calls) in self.phases.items()
+            ],
+            "unaccounted_ms": round(max(0.0, total - accounted) * 1000, 3),
+        }
+
+class _Timer:
+    __slots__ = ("profile", "name", "start", "children")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.children = 0.0
+        self.profile._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profile._stack
+        stack.pop()
+        self.profile.add(self.name, elapsed - self.children)
+        if stack:
+            stack[-1].children += elapsed
+        return False
+
+def phase(name):
+    """`with phase("smtp.auth"): ...` records the block when profiling is on."""
+    profile = _active
+    if profile is None or profile.thread != threading.get_ident():
+        return _NOOP
+    return _Timer(profile, name)
+
+def start():
+    """Starts collecting into a fresh Profile (replacing any active one) and returns it."""
+    global _active
+    _active = Profile()
+    return _active
+
+def stop():
+    """Stops collecting and returns the finished Profile (None if none was active)."""
+    global _active
+    profile, _active = _active, None
+    if profile is not None:
+        profile.finished = time.perf_counter()
+    return profile
@@ -0,0 +1,64 @@
+import csv
+import json
+from pathlib import Path
+from rmail.database import query_db
+
+# Recipient sources shared by the commands and the send-bulk pipeline: recipients files
+# (CSV/JSONL) and group membership, streamed so no list is ever held in memory whole.
+
+MEMBER_CHUNK_SIZE = 500
+
+def iter_member_chunks(group_id, chunk_size=MEMBER_CHUNK_SIZE):
+    """
+    Yields a group's members (receiver rows) in lists of up to chunk_size.
+    Each chunk is one range scan on the group_members primary key joined to receivers,
+    so memory stays flat and no read transaction is held open between chunks.
+    """
+    last_id = 0
+    while True:
+        rows = query_db("""
+            SELECT r.id, r.alias, r.name, r.email
+            FROM group_members m
+            JOIN receivers r ON r.id = m.receiver_id
+            WHERE m.group_id = ? AND m.receiver_id > ?
+            ORDER BY m.receiver_id
+            LIMIT ?
+        """, (group_id, last_id, chunk_size))
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+def iter_members(group_id, chunk_size=MEMBER_CHUNK_SIZE):
+    for chunk in iter_member_chunks(group_id, chunk_size):
+        yield from chunk
+
+def resolve_group(name):
+    """Returns (id, name, members) for a group, or None."""
+    return query_db("""
+        SELECT g.id, g.name, (SELECT COUNT(*) FROM group_members m WHERE m.group_id = g.id) AS members
+        FROM groups g WHERE g.name = ?
+    """, (name,), one=True)
+
+def iter_recipients(path):
+    """
+    Streams recipient rows from a CSV (with header) or JSONL file.
+    Every row is a dict and must contain an 'email' key; all other keys are template variables.
+    """
+    path = Path(path)
+    with open(path, newline='') as f:
+        if path.suffix.lower() in ('.jsonl', '.ndjson'):
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path.name}:{line_no}: invalid JSON ({e})")
+                if not isinstance(row, dict):
+                    raise ValueError(f"{path.name}:{line_no}: expected a JSON object")
+                yield row
+        else:
+            for row in csv.DictReader(f):
+                yield row
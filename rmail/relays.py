@@ -0,0 +1,295 @@
+import random
+import smtplib
+import threading
+import time
+from rmail.database import query_db
+
+# Relay groups: a sender can send through more domains than its own. `r-mail sender relay add`
+# lists extra domains with a priority (lower is preferred) and a weight (share of traffic
+# within a priority). The sender's own domain is priority 0, weight 1, unless listed itself.
+#
+# Every process keeps a RelayHealth per domain: moving averages of connect and SMTP transaction
+# latency and of the relay error rate. Each message goes to the preferred priority among the
+# relays that are up and not much slower than the fastest one (or than their own usual latency),
+# split by weight / latency. When the relay fails with a connection error or a temporary
+# session-level reply, the message fails over to the next one. A relay that keeps failing is
+# ejected (circuit open) and probed with a plain connect in the background, after a cooldown that
+# doubles with every failed probe. Healthy relays that haven't carried a message for a while get
+# the same probe: when they answer, their old averages are dropped, so routing (by priority
+# first) measures them afresh instead of shunning a relay for how it did minutes ago.
+
+EWMA_ALPHA = 0.2
+FAILURE_THRESHOLD = 3         # Consecutive relay errors that eject a relay
+ERROR_RATE_THRESHOLD = 0.5    # ... as does an average error rate above this, after MIN_SAMPLES
+MIN_SAMPLES = 10
+PROBE_INTERVAL = 5.0          # Seconds before the first probe of an ejected relay
+PROBE_MAX_INTERVAL = 60.0
+SLOW_FACTOR = 3.0             # Relays this many times slower than the fastest one, or than their
+SLOW_MARGIN_MS = 50.0         # own baseline and by at least this much, are only a fallback
+BASELINE_ALPHA = 0.02         # Baseline: a slow moving average of latency that idle spells don't reset
+SAMPLE_MAX_AGE = 10.0         # Seconds without traffic after which a relay in use is probed
+GROUP_TTL = 30.0              # Seconds a sender's relay group is cached
+
+RELAY_COLUMNS = ('domain_name', 'smtp_host', 'smtp_port', 'smtp_user', 'security', 'max_rate', 'burst')
+SENDER_COLUMNS = ('sender_id', 'email', 'fullname')
+
+class Relay:
+    """One domain of a sender's relay group; `row` is the sender row with that domain's columns."""
+
+    def __init__(self, row, priority=0, weight=1.0):
+        self.row = row
+        self.priority = priority
+        self.weight = weight
+
+    @property
+    def name(self):
+        return self.row['domain_name']
+
+def resolve_sender(sender_alias):
+    """The sender row for an alias, with its own domain's relay columns (None if there's no such sender)."""
+    return query_db("""
+        SELECT s.id as sender_id, s.email, s.fullname, d.name as domain_name, d.smtp_host, d.smtp_port, d.smtp_user, d.security, d.max_rate, d.burst
+        FROM senders s
+        JOIN domains d ON s.domain_id = d.id
+        WHERE s.alias = ?
+    """, (sender_alias,), one=True)
+
+def is_relay_error(exc):
+    """
+    True for failures that say something about the relay rather than the message: no connection
+    or TLS, a dropped session, failed login, or a temporary (4xx) reply to the session (MAIL, DATA).
+    Refused recipients are not, greylisting included, unless the relay closed the session (421).
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return any(code == 421 for code, _ in exc.recipients.values())
+    if isinstance(exc, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPAuthenticationError)):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    return isinstance(exc, OSError)
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+def _pick_columns(row, columns):
+    """The given columns of a sqlite3.Row or dict, skipping ones it doesn't have."""
+    keys = set(row.keys())
+    return {column: row[column] for column in columns if column in keys}
+
+def get_relays(sender_row):
+    """
+    The sender's relay group in preference order. Rows without a sender_id column (or senders
+    with no extra relays) form a group of one: their own domain.
+    """
+    try:
+        sender_id = sender_row['sender_id']
+    except (KeyError, IndexError):
+        sender_id = None
+    if sender_id is None:
+        return [Relay(sender_row)]
+
+    now = time.monotonic()
+    with _groups_lock:
+        cached = _groups.get(sender_id)
+        if cached and now - cached[0] < GROUP_TTL:
+            return cached[1]
+
+    rows = query_db("""
+        SELECT r.priority, r.weight, d.name as domain_name, d.smtp_host, d.smtp_port, d.smtp_user, d.security, d.max_rate, d.burst
+        FROM sender_relays r
+        JOIN domains d ON r.domain_id = d.id
+        WHERE r.sender_id = ?
+        ORDER BY r.priority, d.name
+    """, (sender_id,))
+    # The group outlives this call: keep only what sending needs, not the caller's whole row
+    own = _pick_columns(sender_row, SENDER_COLUMNS + RELAY_COLUMNS)
+    identity = _pick_columns(sender_row, SENDER_COLUMNS)
+    group = [Relay({**identity, **{column: r[column] for column in RELAY_COLUMNS}}, r['priority'], r['weight']) for r in rows]
+    if own['domain_name'] not in {relay.name for relay in group}:
+        group.insert(0, Relay(own))
+    group.sort(key=lambda relay: relay.priority)
+
+    with _groups_lock:
+        _groups[sender_id] = (now, group)
+    return group
+
+class RelayHealth:
+    """Moving averages and circuit-breaker state for one relay."""
+
+    def __init__(self):
+        self.connect_ms = None
+        self.smtp_ms = None
+        self.baseline_ms = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.failures = 0          # Consecutive relay errors
+        self.sent = 0
+        self.errors = 0
+        self.state = 'closed'      # closed (in use) | open (ejected)
+        self.retry_at = 0.0
+        self.cooldown = PROBE_INTERVAL
+        self.probing = False
+        self.used_at = None        # Last message routed here
+        self.sampled_at = None     # Last outcome recorded
+
+    @property
+    def latency(self):
+        """Expected milliseconds per message: connect (amortized over pooled sessions) plus transaction."""
+        if self.smtp_ms is None:
+            return None
+        return (self.connect_ms or 0.0) + self.smtp_ms
+
+    def _average(self, current, sample, alpha=EWMA_ALPHA):
+        return sample if current is None else current + alpha * (sample - current)
+
+    def slow(self, fastest):
+        """True when the relay is much slower than the fastest one of its group, or than it usually is."""
+        if self.latency is None:
+            return False
+        if self.latency > SLOW_FACTOR * fastest:
+            return True
+        return self.baseline_ms is not None and self.latency > max(SLOW_FACTOR * self.baseline_ms, self.baseline_ms + SLOW_MARGIN_MS)
+
+    def record(self, connect_ms, smtp_ms, error=None):
+        now = time.monotonic()
+        # Averages from before a long idle spell say little about the relay now
+        stale = self.sampled_at is None or now - self.sampled_at > SAMPLE_MAX_AGE
+        self.samples += 1
+        self.used_at = self.sampled_at = now
+        if error is not None and is_relay_error(error):
+            self.errors += 1
+            self.failures += 1
+            self.error_rate = self._average(self.error_rate, 1.0)
+            if self.state == 'closed' and (self.failures >= FAILURE_THRESHOLD or
+                                           (self.samples >= MIN_SAMPLES and self.error_rate > ERROR_RATE_THRESHOLD)):
+                self.eject()
+            return
+        self.sent += 1
+        if self.state == 'open':
+            self.restore()  # Delivered anyway (every relay was ejected)
+        self.failures = 0
+        self.error_rate = self._average(self.error_rate, 0.0)
+        self.connect_ms = connect_ms if stale else self._average(self.connect_ms, connect_ms)
+        self.smtp_ms = smtp_ms if stale else self._average(self.smtp_ms, smtp_ms)
+        self.baseline_ms = self._average(self.baseline_ms, connect_ms + smtp_ms, BASELINE_ALPHA)
+
+    def eject(self):
+        self.state = 'open'
+        self.retry_at = time.monotonic() + self.cooldown
+
+    def restore(self):
+        self.state = 'closed'
+        self.failures = 0
+        self.error_rate /= 2
+        self.cooldown = PROBE_INTERVAL
+
+    def probed(self, error=None):
+        self.probing = False
+        if self.state == 'open':
+            if error is None:
+                self.restore()
+            else:
+                self.cooldown = min(PROBE_MAX_INTERVAL, self.cooldown * 2)
+                self.retry_at = time.monotonic() + self.cooldown
+            return
+        # An idle relay still in use was checked
+        self.used_at = time.monotonic()
+        if error is None:
+            self.connect_ms = self.smtp_ms = None  # Its next message measures it afresh
+        elif is_relay_error(error):
+            self.record(None, None, error)
+
+    def to_dict(self):
+        return {
+            "state": self.state, "sent": self.sent, "errors": self.errors,
+            "error_rate": round(self.error_rate, 3),
+            "connect_ms": None if self.connect_ms is None else round(self.connect_ms, 1),
+            "smtp_ms": None if self.smtp_ms is None else round(self.smtp_ms, 1),
+        }
+
+class RelayRouter:
+    """Process-wide relay health and routing decisions."""
+
+    def __init__(self):
+        self._health = {}   # domain_name -> RelayHealth
+        self._lock = threading.Lock()
+
+    def health(self, relay):
+        with self._lock:
+            return self._health.setdefault(relay.name, RelayHealth())
+
+    def record(self, relay, connect_ms, smtp_ms, error=None):
+        with self._lock:
+            self._health.setdefault(relay.name, RelayHealth()).record(connect_ms, smtp_ms, error)
+
+    def route(self, group):
+        """
+        Yields the relays to try for one message, best first. Ejected relays are skipped (and
+        probed once their cooldown is up); when every relay is ejected, the one due back soonest
+        is tried anyway.
+        """
+        if len(group) == 1:
+            yield group[0]
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            health = {relay.name: self._health.setdefault(relay.name, RelayHealth()) for relay in group}
+            for relay in group:
+                h = health[relay.name]
+                if h.probing:
+                    continue
+                # Ejected relays once their cooldown is up; relays in use that have been idle a while
+                due = now >= h.retry_at if h.state == 'open' else h.used_at is not None and now - h.used_at > SAMPLE_MAX_AGE
+                if due:
+                    h.probing = True
+                    threading.Thread(target=self._probe, args=(relay,), daemon=True).start()
+
+            up = [relay for relay in group if health[relay.name].state == 'closed']
+            if up:
+                order = self._order(up, health, now)
+            else:
+                order = [min(group, key=lambda relay: health[relay.name].retry_at)]
+        yield from order
+
+    def _order(self, up, health, now):
+        first = self._pick(up, health)
+        health[first.name].used_at = now
+        rest = sorted((relay for relay in up if relay is not first),
+                      key=lambda relay: (relay.priority, health[relay.name].latency or 0.0))
+        return [first, *rest]
+
+    def _pick(self, up, health):
+        known = [health[relay.name].latency for relay in up if health[relay.name].latency is not None]
+        fastest = min(known, default=None)
+        fast = [relay for relay in up if fastest is None or not health[relay.name].slow(fastest)] or up
+        preferred = min(relay.priority for relay in fast)
+        tier = [relay for relay in fast if relay.priority == preferred]
+        weights = [
+            relay.weight * (1.0 - health[relay.name].error_rate) / max(health[relay.name].latency or fastest or 1.0, 1.0)
+            for relay in tier
+        ]
+        if not any(weights):
+            return tier[0]
+        return random.choices(tier, weights)[0]
+
+    def _probe(self, relay):
+        from rmail import engine
+        try:
+            # Runs beside the sending thread: no console output, no profiling phases
+            engine.connect(relay.row, quiet=True).quit()
+            error = None
+        except Exception as e:
+            error = e
+        with self._lock:
+            self._health[relay.name].probed(error)
+
+    def snapshot(self, group):
+        """Per-relay health for reports: [(relay, RelayHealth.to_dict())]."""
+        with self._lock:
+            return [(relay, self._health.setdefault(relay.name, RelayHealth()).to_dict()) for relay in group]
+
+_router = RelayRouter()
+
+def get_router():
+    return _router
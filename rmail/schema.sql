@@ -8,6 +8,8 @@ CREATE TABLE IF NOT EXISTS domains (
     smtp_port INTEGER NOT NULL,
     smtp_user TEXT,
     security TEXT DEFAULT 'STARTTLS',
+    max_rate REAL,      -- Messages/sec allowed by the relay (NULL = unlimited)
+    burst INTEGER,      -- Messages that may go out back to back (NULL = ceil(max_rate))
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -31,6 +33,9 @@ CREATE TABLE IF NOT EXISTS receivers (
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
 
+-- `receiver import --dedupe-email` probes this once per row
+CREATE INDEX IF NOT EXISTS idx_receivers_email ON receivers(email COLLATE NOCASE);
+
 -- 4. CONTEXTS: New workflow
 CREATE TABLE IF NOT EXISTS contexts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,3 +44,107 @@ CREATE TABLE IF NOT EXISTS contexts (
     template_name TEXT, -- Optional: Link to a specific template filename
     data JSON NOT NULL  -- Store the variables as a JSON string
 );
+
+-- 5. OUTBOX: Rendered messages waiting for (re)delivery by `r-mail worker`
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    sender_id INTEGER NOT NULL,
+    from_addr TEXT NOT NULL,          -- Envelope sender
+    to_addr TEXT NOT NULL,            -- Envelope recipient
+    subject TEXT,
+    message BLOB NOT NULL,            -- Rendered MIME in wire format; emptied (X'') once sent
+    status TEXT NOT NULL DEFAULT 'queued', -- queued | sending | sent | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,    -- Unix timestamp; lease expiry while 'sending'
+    last_error TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    sent_at TEXT,
+    FOREIGN KEY(sender_id) REFERENCES senders(id) ON DELETE CASCADE
+);
+
+-- Picking the next batch is a range scan on this index
+CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON outbox(status, next_attempt_at);
+
+-- 6. GROUPS: Named recipient lists (`send -t @name`)
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Expanding a group is a range scan on the primary key
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id INTEGER NOT NULL,
+    receiver_id INTEGER NOT NULL,
+    PRIMARY KEY (group_id, receiver_id),
+    FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE CASCADE,
+    FOREIGN KEY(receiver_id) REFERENCES receivers(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Lets receiver deletes cascade without scanning every membership
+CREATE INDEX IF NOT EXISTS idx_group_members_receiver ON group_members(receiver_id);
+
+-- 7. SEND LOG: One row per recipient per delivery attempt (written in batches by rmail.sendlog)
+CREATE TABLE IF NOT EXISTS send_log (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,                 -- Unix timestamp of the attempt
+    domain TEXT NOT NULL,             -- domains.name (kept as text so history survives deletes)
+    sender TEXT NOT NULL,             -- Envelope sender
+    recipient TEXT NOT NULL,
+    template TEXT,
+    message_id TEXT,
+    status TEXT NOT NULL,             -- sent | refused | failed
+    smtp_code INTEGER,
+    size_bytes INTEGER,
+    render_ms REAL,                   -- Phase durations; NULL when the caller didn't measure them
+    mime_ms REAL,
+    connect_ms REAL,
+    smtp_ms REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_send_log_ts ON send_log(ts);
+-- `r-mail log stats` scans one domain's time window
+CREATE INDEX IF NOT EXISTS idx_send_log_domain_ts ON send_log(domain, ts);
+
+-- 8. CAMPAIGNS: One row per send-bulk run, with everything `r-mail campaign resume` needs
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY,
+    sender_alias TEXT NOT NULL,
+    template TEXT NOT NULL,
+    subject TEXT NOT NULL,            -- Raw (unrendered) subject template
+    context TEXT NOT NULL,            -- JSON: shared variables (profile, -S, prompted)
+    source TEXT NOT NULL,             -- Recipients file path or @group
+    source_hash TEXT NOT NULL,        -- Detects a recipients list that changed before a resume
+    attachments TEXT NOT NULL,        -- JSON list of paths
+    batch_size INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'running', -- running | done | partial
+    total INTEGER,                    -- Recipients in the source, known after the first complete pass
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Delivery state per recipient. Skipping completed recipients on resume is a primary key lookup
+CREATE TABLE IF NOT EXISTS campaign_recipients (
+    campaign_id INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL,    -- Derived from (campaign id, normalized email), see rmail.campaign
+    email TEXT NOT NULL,
+    status TEXT NOT NULL,             -- sent | failed (retried on resume) | bounced (5xx, final)
+    attempts INTEGER NOT NULL DEFAULT 1,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (campaign_id, idempotency_key),
+    FOREIGN KEY(campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- 9. SENDER RELAYS: Extra domains a sender may send through (see rmail.relays)
+-- The sender's own domain (senders.domain_id) is priority 0, weight 1 unless listed here
+CREATE TABLE IF NOT EXISTS sender_relays (
+    sender_id INTEGER NOT NULL,
+    domain_id INTEGER NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,  -- Lower is preferred; higher ones take over when it's down or slow
+    weight REAL NOT NULL DEFAULT 1.0,     -- Share of traffic among relays of the same priority
+    PRIMARY KEY (sender_id, domain_id),
+    FOREIGN KEY(sender_id) REFERENCES senders(id) ON DELETE CASCADE,
+    FOREIGN KEY(domain_id) REFERENCES domains(id) ON DELETE CASCADE
+) WITHOUT ROWID;
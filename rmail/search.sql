@@ -0,0 +1,63 @@
+-- Full-text search indexes for the list commands (requires SQLite's FTS5).
+-- External-content tables: the text lives in the base tables, triggers keep the index in sync.
+-- prefix='2 3' makes the "term*" queries issued by the CLI cheap.
+
+-- RECEIVERS
+CREATE VIRTUAL TABLE IF NOT EXISTS receivers_fts USING fts5(
+    alias, name, email, content='receivers', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS receivers_fts_ai AFTER INSERT ON receivers BEGIN
+    INSERT INTO receivers_fts(rowid, alias, name, email) VALUES (new.id, new.alias, new.name, new.email);
+END;
+CREATE TRIGGER IF NOT EXISTS receivers_fts_ad AFTER DELETE ON receivers BEGIN
+    INSERT INTO receivers_fts(receivers_fts, rowid, alias, name, email) VALUES ('delete', old.id, old.alias, old.name, old.email);
+END;
+CREATE TRIGGER IF NOT EXISTS receivers_fts_au AFTER UPDATE ON receivers BEGIN
+    INSERT INTO receivers_fts(receivers_fts, rowid, alias, name, email) VALUES ('delete', old.id, old.alias, old.name, old.email);
+    INSERT INTO receivers_fts(rowid, alias, name, email) VALUES (new.id, new.alias, new.name, new.email);
+END;
+
+-- SENDERS
+CREATE VIRTUAL TABLE IF NOT EXISTS senders_fts USING fts5(
+    alias, fullname, email, content='senders', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS senders_fts_ai AFTER INSERT ON senders BEGIN
+    INSERT INTO senders_fts(rowid, alias, fullname, email) VALUES (new.id, new.alias, new.fullname, new.email);
+END;
+CREATE TRIGGER IF NOT EXISTS senders_fts_ad AFTER DELETE ON senders BEGIN
+    INSERT INTO senders_fts(senders_fts, rowid, alias, fullname, email) VALUES ('delete', old.id, old.alias, old.fullname, old.email);
+END;
+CREATE TRIGGER IF NOT EXISTS senders_fts_au AFTER UPDATE ON senders BEGIN
+    INSERT INTO senders_fts(senders_fts, rowid, alias, fullname, email) VALUES ('delete', old.id, old.alias, old.fullname, old.email);
+    INSERT INTO senders_fts(rowid, alias, fullname, email) VALUES (new.id, new.alias, new.fullname, new.email);
+END;
+
+-- DOMAINS
+CREATE VIRTUAL TABLE IF NOT EXISTS domains_fts USING fts5(
+    name, smtp_host, content='domains', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS domains_fts_ai AFTER INSERT ON domains BEGIN
+    INSERT INTO domains_fts(rowid, name, smtp_host) VALUES (new.id, new.name, new.smtp_host);
+END;
+CREATE TRIGGER IF NOT EXISTS domains_fts_ad AFTER DELETE ON domains BEGIN
+    INSERT INTO domains_fts(domains_fts, rowid, name, smtp_host) VALUES ('delete', old.id, old.name, old.smtp_host);
+END;
+CREATE TRIGGER IF NOT EXISTS domains_fts_au AFTER UPDATE ON domains BEGIN
+    INSERT INTO domains_fts(domains_fts, rowid, name, smtp_host) VALUES ('delete', old.id, old.name, old.smtp_host);
+    INSERT INTO domains_fts(rowid, name, smtp_host) VALUES (new.id, new.name, new.smtp_host);
+END;
+
+-- CONTEXTS
+CREATE VIRTUAL TABLE IF NOT EXISTS contexts_fts USING fts5(
+    name, template_name, description, content='contexts', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS contexts_fts_ai AFTER INSERT ON contexts BEGIN
+    INSERT INTO contexts_fts(rowid, name, template_name, description) VALUES (new.id, new.name, new.template_name, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS contexts_fts_ad AFTER DELETE ON contexts BEGIN
+    INSERT INTO contexts_fts(contexts_fts, rowid, name, template_name, description) VALUES ('delete', old.id, old.name, old.template_name, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS contexts_fts_au AFTER UPDATE ON contexts BEGIN
+    INSERT INTO contexts_fts(contexts_fts, rowid, name, template_name, description) VALUES ('delete', old.id, old.name, old.template_name, old.description);
+    INSERT INTO contexts_fts(rowid, name, template_name, description) VALUES (new.id, new.name, new.template_name, new.description);
+END;
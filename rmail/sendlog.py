@@ -0,0 +1,129 @@
+import os
+import re
+import sys
+import time
+import atexit
+import sqlite3
+import threading
+from rmail.database import transaction
+
+# Delivery history for `r-mail log stats`. Rows are buffered and written with one
+# executemany per batch, so logging costs a list append per recipient on the send path.
+# Long-running senders (`r-mail worker`) flush() whenever they go idle, so rows don't wait
+# for the next delivery. RMAIL_SEND_LOG=0 turns it off.
+
+FLUSH_ROWS = 200
+FLUSH_INTERVAL = 2.0  # Seconds; a batch older than this is written on the next record()
+MAX_PENDING_ROWS = 10_000  # Kept for retry while the database can't be written; older rows are dropped
+
+INSERT_SQL = """
+    INSERT INTO send_log (ts, domain, sender, recipient, template, message_id, status, smtp_code,
+                          size_bytes, render_ms, mime_ms, connect_ms, smtp_ms)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_MESSAGE_ID = re.compile(rb'^Message-ID:[ \t]*(\S+)', re.MULTILINE | re.IGNORECASE)
+
+def message_id(data):
+    """Message-ID header of a flattened message (looks at the header block only)."""
+    end = data.find(b"\r\n\r\n")
+    match = _MESSAGE_ID.search(data, 0, end if end >= 0 else len(data))
+    return match.group(1).decode('ascii', 'replace') if match else None
+
+def smtp_code(error):
+    """SMTP reply code carried by an smtplib exception, if any."""
+    code = getattr(error, 'smtp_code', None)
+    if code is None and getattr(error, 'recipients', None):
+        code = min(c for c, _ in error.recipients.values())
+    return code
+
+class SendLogWriter:
+    """Thread-safe buffer of send_log rows, flushed in batches."""
+
+    def __init__(self, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.enabled = os.getenv("RMAIL_SEND_LOG", "1") != "0"
+        self._rows = []
+        self._lock = threading.Lock()
+        self._oldest = None
+        self._retry_at = 0.0   # After a failed write, don't try again before this (monotonic)
+        self._failing = False
+        self.dropped = 0
+
+    def record_delivery(self, sender_row, from_addr, to_addrs, data, refused=None, error=None,
+                        template=None, render_ms=None, mime_ms=None, connect_ms=None, smtp_ms=None):
+        """
+        Logs one row per envelope recipient: 'sent', 'refused' (listed in refused) or 'failed'
+        (error set, every recipient).
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        mid = message_id(data)
+        size = len(data)
+        error_code = smtp_code(error) if error is not None else None
+        rows = []
+        for rcpt in to_addrs:
+            if error is not None:
+                status, code = 'failed', error_code
+                if getattr(error, 'recipients', None) and rcpt in error.recipients:
+                    code = error.recipients[rcpt][0]
+            elif refused and rcpt in refused:
+                status, code = 'refused', refused[rcpt][0]
+            else:
+                status, code = 'sent', 250
+            rows.append((now, sender_row['domain_name'], from_addr, rcpt, template, mid, status, code,
+                         size, render_ms, mime_ms, connect_ms, smtp_ms))
+
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            now = time.monotonic()
+            due = now >= self._retry_at and (len(self._rows) >= self.flush_rows or now - self._oldest >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows or not self.enabled:
+            return
+        try:
+            with transaction() as conn:
+                conn.executemany(INSERT_SQL, rows)
+        except sqlite3.Error as e:
+            # History is best effort; never let it break delivery. Keep the rows (bounded) and
+            # retry after a flush interval, so a locked or briefly unwritable database loses nothing
+            with self._lock:
+                self._rows[:0] = rows
+                overflow = len(self._rows) - MAX_PENDING_ROWS
+                if overflow > 0:
+                    del self._rows[:overflow]
+                    self.dropped += overflow
+                self._retry_at = time.monotonic() + self.flush_interval
+            if not self._failing:
+                print(f"Send log: write failed ({e}); retrying", file=sys.stderr)
+            self._failing = True
+        else:
+            if self._failing:
+                lost = f", {self.dropped} rows dropped meanwhile" if self.dropped else ""
+                print(f"Send log: writing again{lost}", file=sys.stderr)
+            self._failing = False
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Process-wide SendLogWriter (flushed at exit)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SendLogWriter()
+        return _writer
+
+@atexit.register
+def _flush_at_exit():
+    if _writer is not None:
+        _writer.flush()
@@ -1,10 +1,24 @@
 import os
 import json
-from cryptography.fernet import Fernet
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows: atomic rename still prevents torn files
+    fcntl = None
+
 VAULT_FILE = Path.home() / ".r-mail" / "secrets.enc"
 
+# On-disk format: each secret is its own Fernet token, so a lookup decrypts one small record.
+# The index of service/user names around those tokens is encrypted too, once per file change:
+# {"version": 3, "index": "<fernet token of {"<service>": {"<username>": "<fernet token>"}}>"}
+# Older files are read and rewritten in this format once, on first access:
+#   version 1: a single Fernet token over {"<service>": {"<username>": "<password>"}}
+#   version 2: {"version": 2, "entries": {...}}, i.e. the index above in plaintext
+FORMAT_VERSION = 3
+
 class Vault:
     def __init__(self):
         # Try to get the master key from ENV, or fail effectively
@@ -14,40 +28,195 @@ class Vault:
             # But for cron/servers, ENV vars are safer.
             raise ValueError("Missing RMAIL_MASTER_KEY environment variable.")
 
+        from cryptography.fernet import Fernet
         self.fernet = Fernet(self.key.encode())
+        self._lock = threading.RLock()
+        self._signature = None  # (mtime_ns, size) of the file the caches below came from
+        self._entries = {}      # service -> username -> token (bytes)
+        self._plain = {}        # (service, username) -> decrypted password
 
-    def _load_db(self):
+    @staticmethod
+    def _file_signature():
+        try:
+            st = VAULT_FILE.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_entries(self):
+        """
+        Parses the vault file into ({service: {username: token}}, state) without decrypting secrets.
+        state is "current", "legacy" (readable, but in an older format) or "unreadable" (corrupt or another key).
+        """
+        from cryptography.fernet import InvalidToken
         if not VAULT_FILE.exists():
-            return {}
+            return {}, "current"
         try:
             with open(VAULT_FILE, "rb") as f:
-                encrypted_data = f.read()
-            decrypted_data = self.fernet.decrypt(encrypted_data)
-            return json.loads(decrypted_data)
-        except Exception:
-            return {} # Return empty if corrupt or wrong key
+                raw = f.read()
+        except OSError:
+            return {}, "unreadable"
+
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and data.get("version") in (2, FORMAT_VERSION):
+            try:
+                if data["version"] == FORMAT_VERSION:
+                    index, state = json.loads(self.fernet.decrypt(data["index"].encode())), "current"
+                else:
+                    index, state = data.get("entries", {}), "legacy"
+                entries = {
+                    service: {user: token.encode() for user, token in users.items()}
+                    for service, users in index.items()
+                }
+                if state == "legacy":
+                    # Plaintext index: only take it over if its tokens are ours, or we'd lock the right key out
+                    token = next((t for users in entries.values() for t in users.values()), None)
+                    if token is not None:
+                        self.fernet.decrypt(token)
+                return entries, state
+            except (InvalidToken, KeyError, ValueError, AttributeError):
+                return {}, "unreadable"
+
+        # Version 1 single-blob format: decrypt once and re-wrap each entry
+        try:
+            legacy = json.loads(self.fernet.decrypt(raw))
+        except (InvalidToken, ValueError):
+            return {}, "unreadable" # Corrupt or wrong key
+        entries = {}
+        for service, users in legacy.items():
+            for user, password in (users or {}).items():
+                if password is not None:
+                    entries.setdefault(service, {})[user] = self.fernet.encrypt(password.encode())
+        return entries, "legacy"
+
+    def _refresh(self):
+        """
+        Reloads the file only when its mtime/size changed since the last read.
+        Returns the state of a freshly read file (see _read_entries), or None if the cache was still valid.
+        """
+        signature = self._file_signature()
+        if signature != self._signature or signature is None:
+            self._entries, state = self._read_entries()
+            self._plain = {}
+            self._signature = signature
+            return state
+        return None
 
-    def _save_db(self, data):
-        json_bytes = json.dumps(data).encode('utf-8')
-        encrypted_data = self.fernet.encrypt(json_bytes)
+    def _reload_for_write(self):
+        """Re-reads the file under the write lock; refuses to overwrite a vault this key can't read."""
+        self._signature = None
+        if self._refresh() == "unreadable":
+            raise ValueError(f"Cannot read {VAULT_FILE} with this RMAIL_MASTER_KEY; refusing to overwrite it.")
 
-        # Ensure directory exists and permissions are strict (0o600)
+    def _upgrade(self):
+        """Rewrites a legacy vault in the current format, once, so later refreshes take the fast path."""
+        try:
+            with self._write_lock():
+                self._signature = None
+                if self._refresh() == "legacy":  # Another process may have upgraded it meanwhile
+                    self._write_entries(self._entries)
+                self._signature = self._file_signature()
+        except OSError:
+            pass # Read-only vault: keep serving the entries parsed in memory
+
+    def _write_entries(self, entries):
+        """Atomic write: temp file (0o600) in the same directory, fsync, then rename over the vault."""
         VAULT_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(VAULT_FILE, "wb") as f:
-            f.write(encrypted_data)
+        index = json.dumps({
+            service: {user: token.decode() for user, token in users.items()}
+            for service, users in entries.items() if users
+        }).encode('utf-8')
+        payload = json.dumps({
+            "version": FORMAT_VERSION,
+            "index": self.fernet.encrypt(index).decode(),
+        }).encode('utf-8')
+
+        tmp_path = VAULT_FILE.with_name(f".{VAULT_FILE.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, VAULT_FILE)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
         os.chmod(VAULT_FILE, 0o600)
 
+    @contextmanager
+    def _write_lock(self):
+        """Serializes read-modify-write cycles across processes (where flock exists)."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            VAULT_FILE.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(VAULT_FILE.with_name(f".{VAULT_FILE.name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
     def set_password(self, service_name, username, password):
-        db = self._load_db()
-        if service_name not in db:
-            db[service_name] = {}
-        db[service_name][username] = password
-        self._save_db(db)
+        if password is None:
+            return self.delete_password(service_name, username)
+        with self._write_lock():
+            self._reload_for_write()  # Always re-read under the lock
+            self._entries.setdefault(service_name, {})[username] = self.fernet.encrypt(password.encode())
+            self._write_entries(self._entries)
+            self._signature = self._file_signature()
+            self._plain[(service_name, username)] = password
+
+    def delete_password(self, service_name, username):
+        with self._write_lock():
+            self._reload_for_write()
+            if self._entries.get(service_name, {}).pop(username, None) is not None:
+                self._write_entries(self._entries)
+            self._signature = self._file_signature()
+            self._plain.pop((service_name, username), None)
 
     def get_password(self, service_name, username):
-        db = self._load_db()
-        return db.get(service_name, {}).get(username)
+        from cryptography.fernet import InvalidToken
+        with self._lock:
+            if self._refresh() == "legacy":
+                self._upgrade()
+            key = (service_name, username)
+            if key not in self._plain:
+                token = self._entries.get(service_name, {}).get(username)
+                if token is None:
+                    return None
+                try:
+                    self._plain[key] = self.fernet.decrypt(token).decode()
+                except InvalidToken:
+                    return None # Wrong key for this entry
+            return self._plain[key]
+
+_vaults = {}
+_vaults_lock = threading.Lock()
+
+def get_vault():
+    """
+    Process-wide Vault for the current RMAIL_MASTER_KEY.
+    Secrets are decrypted at most once and revalidated against the file's mtime.
+    """
+    key = os.getenv("RMAIL_MASTER_KEY")
+    with _vaults_lock:
+        vault = _vaults.get(key)
+        if vault is None:
+            vault = Vault()
+            _vaults[key] = vault
+        return vault
 
 # Helper to generate a key for you to put in your .bashrc
 def generate_new_key():
+    from cryptography.fernet import Fernet
     return Fernet.generate_key().decode()
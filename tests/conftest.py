@@ -0,0 +1,148 @@
+import datetime
+import ipaddress
+import itertools
+import os
+import socket
+import ssl
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# rmail.database resolves ~/.r-mail at import time: point HOME somewhere disposable first
+_home = tempfile.mkdtemp(prefix="rmail-tests-")
+os.environ["HOME"] = _home
+os.environ.setdefault("RMAIL_SEND_LOG", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_senders = itertools.count(1)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class Sink:
+    """aiosmtpd handler that keeps every envelope, counts QUITs and can refuse chosen senders or recipients."""
+
+    def __init__(self):
+        self.envelopes = []
+        self.refuse = {}   # address -> reply
+        self.quits = 0
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        if address in self.refuse:
+            return self.refuse[address]
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return self.refuse[address]
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        return "250 OK"
+
+    async def handle_QUIT(self, server, session, envelope):
+        self.quits += 1
+        return "221 Bye"
+
+@pytest.fixture(scope="session")
+def db():
+    """The schema, created once in the throwaway HOME."""
+    import contextlib
+    import io
+    from rmail import database
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_app()
+    return database
+
+@pytest.fixture
+def make_sender(db):
+    """make_sender(port, security='NONE') adds a domain and a sender on it; returns the sender alias."""
+    def make(port, security="NONE"):
+        alias = f"sender-{next(_senders)}"
+        with db.transaction() as conn:
+            domain_id = conn.execute(
+                "INSERT INTO domains (name, smtp_host, smtp_port, smtp_user, security) VALUES (?, '127.0.0.1', ?, 'user', ?)",
+                (f"d-{alias}", port, security)
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO senders (alias, fullname, email, domain_id) VALUES (?, 'Test', 'me@example.test', ?)",
+                (alias, domain_id)
+            )
+        return alias
+    return make
+
+@pytest.fixture(scope="session")
+def tls_files(tmp_path_factory):
+    """Self-signed certificate for 127.0.0.1, trusted by ssl.create_default_context() in this process."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    directory = tmp_path_factory.mktemp("tls")
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = directory / "cert.pem", directory / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    os.environ["SSL_CERT_FILE"] = str(cert_path)
+    return cert_path, key_path
+
+@pytest.fixture
+def smtp_server(request):
+    """
+    Factory for aiosmtpd relays on 127.0.0.1: smtp_server(security='NONE'|'STARTTLS'|'SSL',
+    auth=False) returns (port, Sink). AUTH accepts user "user" with password "pw".
+    """
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+
+    controllers = []
+
+    def authenticator(server, session, envelope, mechanism, auth_data):
+        return AuthResult(success=(auth_data.login, auth_data.password) == (b"user", b"pw"), handled=False)
+
+    def start(security="NONE", auth=False):
+        sink = Sink()
+        port = free_port()
+        options = {}
+        if security != "NONE":
+            cert_path, key_path = request.getfixturevalue("tls_files")
+            server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            server_context.load_cert_chain(cert_path, key_path)
+            options["ssl_context" if security == "SSL" else "tls_context"] = server_context
+        if auth:
+            options.update(authenticator=authenticator, auth_require_tls=False)
+        controller = Controller(sink, hostname="127.0.0.1", port=port, **options)
+        controller.start()
+        controllers.append(controller)
+        return port, sink
+
+    yield start
+    for controller in controllers:
+        controller.stop()
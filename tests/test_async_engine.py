@@ -0,0 +1,215 @@
+import asyncio
+import smtplib
+import ssl
+
+import pytest
+
+from rmail import async_engine
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def session(port, security="NONE", auth=None, pipelining=None):
+    """A connected AsyncSMTPClient; auth forces the AUTH mechanism, pipelining the PIPELINING extension."""
+    client = async_engine.AsyncSMTPClient("127.0.0.1", port, security, timeout=5)
+    await client.connect(ssl.create_default_context() if security != "NONE" else None)
+    if auth:
+        client.esmtp_features["AUTH"] = auth
+    if pipelining is not None:
+        client.pipelining = pipelining
+        client.esmtp_features.pop("PIPELINING", None)
+        if pipelining:
+            client.esmtp_features["PIPELINING"] = ""
+    return client
+
+@pytest.mark.parametrize("security", ["NONE", "STARTTLS"])
+def test_sendmail(smtp_server, security):
+    port, sink = smtp_server(security)
+
+    async def send():
+        client = await session(port, security)
+        refused = await client.sendmail("me@example.test", ["you@example.test"], b"Subject: hi\r\n\r\nhello\r\n")
+        await client.quit()
+        return refused
+
+    assert run(send()) == {}
+    assert [(e.mail_from, e.rcpt_tos) for e in sink.envelopes] == [("me@example.test", ["you@example.test"])]
+    assert sink.quits == 1
+
+@pytest.mark.parametrize("mechanism", ["PLAIN", "LOGIN"])
+def test_login(smtp_server, mechanism):
+    port, _ = smtp_server("STARTTLS", auth=True)
+
+    async def login(password):
+        client = await session(port, "STARTTLS", auth=mechanism)
+        try:
+            await client.login("user", password)
+        finally:
+            await client.quit()
+
+    run(login("pw"))
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        run(login("wrong"))
+
+@pytest.mark.parametrize("pipelining", [False, True])
+def test_refused_recipients(smtp_server, pipelining):
+    port, sink = smtp_server()
+    sink.refuse = {"gone@example.test": "550 No such user", "busy@example.test": "451 Try later"}
+
+    async def send():
+        client = await session(port, pipelining=pipelining)
+        refused = await client.sendmail("me@example.test", ["gone@example.test", "you@example.test", "busy@example.test"], b"\r\nhi\r\n")
+        with pytest.raises(smtplib.SMTPRecipientsRefused) as excinfo:
+            await client.sendmail("me@example.test", ["gone@example.test", "busy@example.test"], b"\r\nhi\r\n")
+        # The session survives a transaction where every recipient was refused
+        await client.sendmail("me@example.test", ["you@example.test"], b"\r\nagain\r\n")
+        await client.quit()
+        return refused, excinfo.value.recipients
+
+    partial, refused_all = run(send())
+    assert partial == {"gone@example.test": (550, b"No such user"), "busy@example.test": (451, b"Try later")}
+    assert refused_all == partial
+    assert [e.rcpt_tos for e in sink.envelopes] == [["you@example.test"], ["you@example.test"]]
+
+def test_dot_stuffing(smtp_server):
+    port, sink = smtp_server()
+    data = b"Subject: dots\r\n\r\n.\r\n..two\r\n.hidden\r\nlast line without CRLF"
+
+    async def send():
+        client = await session(port)
+        await client.sendmail("me@example.test", ["you@example.test"], data)
+        await client.quit()
+
+    run(send())
+    assert sink.envelopes[0].original_content == data + b"\r\n"
+
+async def fake_server(replies):
+    """A raw server that greets with 220 and answers each command from replies (verb -> reply), or never."""
+    async def handle(reader, writer):
+        writer.write(b"220 fake\r\n")
+        while line := await reader.readline():
+            reply = replies.get(line.split()[0].decode().upper())
+            if reply is not None:
+                writer.write(reply.encode() + b"\r\n")
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+def test_connect_closes_connection_when_ehlo_fails():
+    async def connect():
+        server, port = await fake_server({"EHLO": "500 No", "HELO": "500 Still no"})
+        client = async_engine.AsyncSMTPClient("127.0.0.1", port, "NONE", timeout=5)
+        async with server:
+            with pytest.raises(smtplib.SMTPHeloError):
+                await client.connect()
+        return client
+
+    assert run(connect()).writer is None
+
+def test_close_waits_for_recycled_sessions(smtp_server):
+    port, sink = smtp_server()
+    row = {
+        "email": "me@example.test", "domain_name": "async-recycle", "smtp_host": "127.0.0.1", "smtp_port": port,
+        "smtp_user": "", "security": "NONE", "max_rate": None, "burst": None,
+    }
+
+    async def send():
+        delivery = async_engine.AsyncDeliveryEngine(concurrency=1, max_messages=1)
+        for rcpt in ("a@example.test", "b@example.test"):
+            await delivery.send_data(row, row["email"], [rcpt], b"\r\nhi\r\n")
+        await delivery.close()
+        return delivery
+
+    delivery = run(send())
+    assert sink.quits == 2
+    assert not delivery._quitting
+
+def test_close_gives_up_on_unanswered_quit(monkeypatch):
+    monkeypatch.setattr(async_engine, "QUIT_TIMEOUT", 0.1)
+
+    async def close():
+        server, port = await fake_server({"EHLO": "250 fake"})  # QUIT gets no reply
+        async with server:
+            client = async_engine.AsyncSMTPClient("127.0.0.1", port, "NONE", timeout=30)
+            await client.connect()
+            delivery = async_engine.AsyncDeliveryEngine()
+            delivery._idle["key"] = [client]
+            await asyncio.wait_for(delivery.close(), 5)
+        return client
+
+    assert run(close()).writer is None
+
+def test_deliver_all_fails_when_the_result_callback_fails(smtp_server):
+    port, _ = smtp_server()
+    row = {
+        "email": "me@example.test", "domain_name": "async-callback", "smtp_host": "127.0.0.1", "smtp_port": port,
+        "smtp_user": "", "security": "NONE", "max_rate": None, "burst": None,
+    }
+    jobs = [(row, f"user{i}@example.test", b"\r\nhi\r\n") for i in range(20)]
+
+    def on_result(receiver_email, error):
+        raise RuntimeError("database is locked")
+
+    async def deliver():
+        await asyncio.wait_for(async_engine.deliver_all(jobs, concurrency=2, on_result=on_result), 10)
+
+    with pytest.raises(RuntimeError, match="database is locked"):
+        run(deliver())
+
+def test_client_timeout_follows_the_engine_setting(monkeypatch):
+    monkeypatch.setattr(async_engine.engine, "SMTP_TIMEOUT", 7.0)
+    assert async_engine.AsyncSMTPClient("127.0.0.1", 25).timeout == 7.0
+    assert async_engine.AsyncSMTPClient("127.0.0.1", 25, timeout=2).timeout == 2
+
+@pytest.mark.parametrize("reply, kept", [("550 No such user", True), ("421 Closing connection", False)])
+def test_refused_recipients_keep_the_session_unless_421(smtp_server, reply, kept):
+    port, sink = smtp_server()
+    sink.refuse["nobody@example.test"] = reply
+    row = {
+        "email": "me@example.test", "domain_name": f"async-refused-{reply[:3]}", "smtp_host": "127.0.0.1",
+        "smtp_port": port, "smtp_user": "", "security": "NONE", "max_rate": None, "burst": None,
+    }
+
+    async def send():
+        delivery = async_engine.AsyncDeliveryEngine(concurrency=1)
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            await delivery.send_data(row, row["email"], ["nobody@example.test"], b"\r\nhi\r\n")
+        idle = [c for clients in delivery._idle.values() for c in clients]
+        await delivery.close()
+        return idle
+
+    assert bool(run(send())) is kept
+
+def test_deliver_all_advances_a_sync_iterator_off_the_event_loop(smtp_server):
+    import time
+
+    port, sink = smtp_server()
+    row = {
+        "email": "me@example.test", "domain_name": "async-slow-render", "smtp_host": "127.0.0.1", "smtp_port": port,
+        "smtp_user": "", "security": "NONE", "max_rate": None, "burst": None,
+    }
+
+    def jobs():
+        for i in range(3):
+            time.sleep(0.1)  # Rendering this message
+            yield row, f"user{i}@example.test", b"\r\nhi\r\n"
+
+    async def deliver():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        counts = await async_engine.deliver_all(jobs(), concurrency=2)
+        beat.cancel()
+        return counts, ticks
+
+    counts, ticks = run(deliver())
+    assert counts == (3, 0)
+    assert len(sink.envelopes) == 3
+    assert ticks >= 10  # The loop kept running while the messages rendered
@@ -0,0 +1,19 @@
+from rmail import campaign, pipeline
+from rmail.commands import bulk
+
+def test_failed_campaign_reports_the_error_and_can_be_resumed(db, tmp_path, monkeypatch, capsys):
+    recipients = tmp_path / "recipients.csv"
+    recipients.write_text("email\na@example.test\n")
+    campaign_id = campaign.create("nobody", "note.md", "Hi", {}, str(recipients))
+
+    def deliver_messages(built, sender_row, template):
+        raise RuntimeError("relay exploded")
+        yield
+    monkeypatch.setattr(pipeline, "deliver_messages", deliver_messages)
+    bulk.run_campaign(campaign.get(campaign_id), {"email": "me@example.test", "domain_name": "acct-bulk"})
+
+    out = capsys.readouterr().out
+    assert "RuntimeError: relay exploded" in out
+    assert "Recipients Error" not in out
+    assert f"r-mail campaign resume {campaign_id}" in out
+    assert campaign.get(campaign_id)['status'] == 'partial'
@@ -0,0 +1,66 @@
+import smtplib
+
+from rmail import campaign, pipeline
+from rmail.commands import bulk
+
+def new_campaign(tmp_path, emails):
+    recipients = tmp_path / "recipients.csv"
+    recipients.write_text("email\n" + "".join(f"{email}\n" for email in emails))
+    return campaign.create("nobody", "note.md", "Hi", {}, str(recipients))
+
+def test_bounces_are_final_and_skipped_on_resume(db, tmp_path):
+    campaign_id = new_campaign(tmp_path, [])
+    checkpoint = campaign.Checkpoint(campaign_id)
+    checkpoint.record("sent@example.test")
+    checkpoint.record("gone@example.test", smtplib.SMTPResponseException(550, b"No such user"))
+    checkpoint.record("later@example.test", smtplib.SMTPResponseException(451, b"Try later"))
+    checkpoint.record("broken@example.test", "template error")
+    checkpoint.flush()
+
+    rows = [{"email": e} for e in ("sent@example.test", "gone@example.test", "later@example.test", "broken@example.test", "new@example.test")]
+    skipped = []
+    left = [row["email"] for row in campaign.skip_completed(campaign_id, rows, on_skip=skipped.append)]
+
+    assert campaign.progress(campaign_id) == (1, 2, 1)
+    assert left == ["later@example.test", "broken@example.test", "new@example.test"]
+    assert [row["email"] for row in skipped] == ["sent@example.test", "gone@example.test"]
+
+def test_campaign_with_only_bounces_left_is_done(db, tmp_path, monkeypatch):
+    campaign_id = new_campaign(tmp_path, ["a@example.test", "gone@example.test"])
+
+    def deliver_messages(built, sender_row, template):
+        for receiver_emails, _, _ in built:
+            for email in receiver_emails:
+                yield email, smtplib.SMTPResponseException(550, b"No such user") if email.startswith("gone") else None
+    monkeypatch.setattr(pipeline, "deliver_messages", deliver_messages)
+    monkeypatch.setattr(pipeline, "render_messages", lambda contexts, *args, **kwargs: (
+        (email, "Hi", "<p>hi</p>", 0.0) for email, _ in contexts
+    ))
+    bulk.run_campaign(campaign.get(campaign_id), {"email": "me@example.test", "domain_name": "acct-bounce"})
+
+    assert campaign.progress(campaign_id) == (1, 0, 1)
+    assert campaign.get(campaign_id)['status'] == 'done'
+
+def test_group_fingerprint_follows_membership_and_addresses(db):
+    with db.transaction() as conn:
+        group_id = conn.execute("INSERT INTO groups (name) VALUES ('fingerprinted')").lastrowid
+        ids = [
+            conn.execute("INSERT INTO receivers (alias, name, email) VALUES (?, ?, ?)", (f"fp{i}", f"FP {i}", f"fp{i}@example.test")).lastrowid
+            for i in range(5)
+        ]
+        conn.executemany("INSERT INTO group_members (group_id, receiver_id) VALUES (?, ?)", [(group_id, ids[0]), (group_id, ids[3]), (group_id, ids[4])])
+
+    def fingerprint():
+        return campaign.source_hash("@fingerprinted")
+
+    before = fingerprint()
+    assert fingerprint() == before
+    # Same count, sum and max of receiver ids, different people
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM group_members WHERE group_id = ?", (group_id,))
+        conn.executemany("INSERT INTO group_members (group_id, receiver_id) VALUES (?, ?)", [(group_id, ids[1]), (group_id, ids[2]), (group_id, ids[4])])
+    swapped = fingerprint()
+    assert swapped != before
+    with db.transaction() as conn:
+        conn.execute("UPDATE receivers SET email = 'moved@example.test' WHERE id = ?", (ids[1],))
+    assert fingerprint() != swapped
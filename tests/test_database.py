@@ -0,0 +1,102 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+def context_names(db, conn=None):
+    conn = conn or db.get_db()
+    return {r['name'] for r in conn.execute("SELECT name FROM contexts WHERE name LIKE 'tx-%'")}
+
+@pytest.fixture
+def other(db):
+    """A second connection, to see what has actually been committed."""
+    conn = db.connect()
+    yield conn
+    conn.close()
+    with db.transaction() as tx:
+        tx.execute("DELETE FROM contexts WHERE name LIKE 'tx-%'")
+
+def add_context(conn, name):
+    conn.execute("INSERT INTO contexts (name, data) VALUES (?, '{}')", (name,))
+
+def test_nested_transaction_commits_with_the_outermost(db, other):
+    with db.transaction() as outer:
+        add_context(outer, "tx-outer")
+        with db.transaction() as inner:
+            assert inner is outer
+            add_context(inner, "tx-inner")
+        assert context_names(db, other) == set()  # Leaving the inner block didn't commit
+    assert context_names(db, other) == {"tx-outer", "tx-inner"}
+
+def test_failure_in_a_nested_block_rolls_back_the_whole_transaction(db, other):
+    with pytest.raises(RuntimeError):
+        with db.transaction() as outer:
+            add_context(outer, "tx-outer")
+            with db.transaction() as inner:
+                add_context(inner, "tx-inner")
+                raise RuntimeError("boom")
+    assert context_names(db) == context_names(db, other) == set()
+
+    # The depth was reset: the next block is a transaction of its own again
+    with db.transaction() as conn:
+        add_context(conn, "tx-after")
+    assert context_names(db, other) == {"tx-after"}
+
+def test_pending_implicit_transaction_is_committed_first(db, other):
+    conn = db.get_db()
+    add_context(conn, "tx-implicit")  # sqlite3 opened a transaction behind our back
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            add_context(conn, "tx-block")
+            raise RuntimeError("boom")
+    assert context_names(db, other) == {"tx-implicit"}
+
+def test_deletes_follow_the_foreign_keys(db, make_sender, monkeypatch):
+    from click.testing import CliRunner
+    from rmail import outbox
+    from rmail.commands.domain import domain_bp
+    from rmail.commands.sender import sender_bp
+
+    alias = make_sender(1)
+    sender = db.query_db("SELECT id, domain_id FROM senders WHERE alias = ?", (alias,), one=True)
+    domain = db.query_db("SELECT name FROM domains WHERE id = ?", (sender['domain_id'],), one=True)['name']
+    outbox.enqueue(sender['id'], "me@example.test", "you@example.test", "s", b"data")
+    runner = CliRunner()
+
+    # The domain check races with `sender add`: the RESTRICT constraint still holds
+    with monkeypatch.context() as m:
+        m.setattr("rmail.commands.domain.query_db", lambda *args, **kwargs: {'c': 0})
+        result = runner.invoke(domain_bp, ["delete", domain, "--yes"])
+    assert "Cannot delete" in result.output
+    assert db.query_db("SELECT 1 FROM domains WHERE name = ?", (domain,))
+
+    result = runner.invoke(sender_bp, ["delete", alias, "--yes"])
+    assert "1 unsent outbox message(s)" in result.output
+    assert not db.query_db("SELECT 1 FROM outbox WHERE sender_id = ?", (sender['id'],))
+    result = runner.invoke(domain_bp, ["delete", domain, "--yes"])
+    assert f"Domain '{domain}' deleted" in result.output
+
+def test_migration_adds_the_search_index(db, tmp_path, monkeypatch):
+    # A database migrated before the search indexes existed: the current tables, an address book, no *_fts
+    path = tmp_path / "old.db"
+    old = sqlite3.connect(path)
+    old.executescript((Path(db.__file__).parent / "schema.sql").read_text())
+    old.execute("INSERT INTO receivers (alias, name, email) VALUES ('mig-1', 'Ottoline Marsh', 'om@mig.test')")
+    old.execute("PRAGMA user_version = 5")
+    old.commit()
+    old.close()
+
+    monkeypatch.setattr(db, "DB_PATH", path)
+    monkeypatch.setattr(db._local, "conn", None)
+    monkeypatch.setattr(db, "_search_index", {})
+    conn = db.get_db()
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+        assert all(db.has_search_index(table) for table in db.SEARCH_TABLES)
+        sql, params = db.keyset_query(
+            "r.alias", "receivers r", "r.alias", table="receivers", query="ottol", like_columns=["r.name"], row_ref="r"
+        )
+        assert "receivers_fts MATCH" in sql
+        assert [r['alias'] for r in conn.execute(sql, params)] == ["mig-1"]  # Back-filled
+    finally:
+        conn.close()
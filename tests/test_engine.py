@@ -0,0 +1,214 @@
+import smtplib
+
+import pytest
+
+from rmail import engine
+
+def sender(domain_name, port, security):
+    return {
+        "email": "me@example.test", "domain_name": domain_name, "smtp_host": "127.0.0.1",
+        "smtp_port": port, "smtp_user": "user", "security": security,
+    }
+
+@pytest.fixture(autouse=True)
+def vault(monkeypatch):
+    monkeypatch.setattr(engine, "get_password", lambda domain, user: "pw")
+
+@pytest.fixture
+def pipelined(smtp_server, monkeypatch):
+    """A PipeliningSMTP session told the server offers PIPELINING, and the sink behind it."""
+    def unpipelined(*args, **kwargs):
+        raise AssertionError("fell back to one command per round trip")
+    monkeypatch.setattr(smtplib.SMTP, "sendmail", unpipelined)
+    monkeypatch.setattr(engine, "PIPELINING", True)
+    port, sink = smtp_server()
+    server = engine.PipeliningSMTP("127.0.0.1", port, timeout=5)
+    server.ehlo()
+    server.esmtp_features["pipelining"] = ""
+    yield server, sink
+    server.quit()
+
+def test_pipelining_partial_refusal(pipelined):
+    server, sink = pipelined
+    sink.refuse = {"gone@example.test": "550 No such user", "busy@example.test": "451 Try later"}
+
+    refused = server.sendmail("me@example.test", ["gone@example.test", "you@example.test", "busy@example.test"], b"\r\nhi\r\n")
+
+    assert refused == {"gone@example.test": (550, b"No such user"), "busy@example.test": (451, b"Try later")}
+    assert [(e.mail_from, e.rcpt_tos) for e in sink.envelopes] == [("me@example.test", ["you@example.test"])]
+
+def test_pipelining_all_recipients_refused(pipelined):
+    server, sink = pipelined
+    sink.refuse = {"gone@example.test": "550 No such user", "busy@example.test": "451 Try later"}
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused) as excinfo:
+        server.sendmail("me@example.test", ["gone@example.test", "busy@example.test"], b"\r\nhi\r\n")
+    # The replies were all read: the session carries on in step
+    server.sendmail("me@example.test", ["you@example.test"], b"\r\nagain\r\n")
+
+    assert excinfo.value.recipients == {"gone@example.test": (550, b"No such user"), "busy@example.test": (451, b"Try later")}
+    assert [e.rcpt_tos for e in sink.envelopes] == [["you@example.test"]]
+
+def test_pipelining_sender_refused(pipelined):
+    server, sink = pipelined
+    sink.refuse = {"blocked@example.test": "553 Sender not allowed"}
+
+    with pytest.raises(smtplib.SMTPSenderRefused) as excinfo:
+        server.sendmail("blocked@example.test", ["you@example.test"], b"\r\nhi\r\n")
+    server.sendmail("me@example.test", ["you@example.test"], b"\r\nagain\r\n")
+
+    assert (excinfo.value.smtp_code, excinfo.value.sender) == (553, "blocked@example.test")
+    assert [(e.mail_from, e.rcpt_tos) for e in sink.envelopes] == [("me@example.test", ["you@example.test"])]
+
+def test_pipelining_dot_stuffing(pipelined):
+    server, sink = pipelined
+    data = b"Subject: dots\r\n\r\n.\r\n..two\r\n.hidden\r\nlast line without CRLF"
+
+    assert server.sendmail("me@example.test", ["you@example.test"], data) == {}
+    assert sink.envelopes[0].original_content == data + b"\r\n"
+
+@pytest.mark.parametrize("security", ["STARTTLS", "SSL"])
+def test_tls_sessions_of_two_domains_on_one_relay(smtp_server, security):
+    port, _ = smtp_server(security, auth=True)
+    first, second = sender(f"acct-a-{security}", port, security), sender(f"acct-b-{security}", port, security)
+
+    resumed = []
+    for row in (first, first, second, second, first):
+        server = engine.connect(row)
+        resumed.append(server.sock.session_reused)
+        server.quit()
+
+    assert engine.get_ssl_context(first) is not engine.get_ssl_context(second)
+    # Each domain resumes its own session and never gets offered the other one's
+    assert resumed == [False, True, False, True, True]
+
+def test_pool_keeps_session_after_refused_recipients(smtp_server):
+    port, sink = smtp_server()
+    sink.refuse["nobody@example.test"] = "550 No such user"
+    row = sender("acct-refused", port, "NONE")
+    pool = engine.SMTPPool(size=1)
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        with pool.connection(row) as conn:
+            conn.server.sendmail(row["email"], ["nobody@example.test"], b"Subject: x\r\n\r\nhi\r\n")
+    with pool.connection(row) as again:
+        again.server.sendmail(row["email"], ["someone@example.test"], b"Subject: x\r\n\r\nhi\r\n")
+    pool.close_all()
+
+    assert again is conn
+    assert [e.rcpt_tos for e in sink.envelopes] == [["someone@example.test"]]
+
+def test_pool_probes_idle_sessions_outside_the_lock(smtp_server, monkeypatch):
+    port, _ = smtp_server()
+    row = sender("acct-probe", port, "NONE")
+    pool = engine.SMTPPool(size=2, probe_after=0)
+    with pool.connection(row):
+        pass
+
+    held = []
+    def noop(self):
+        held.append(pool._cond._is_owned())
+        return 250, b"OK"
+    monkeypatch.setattr(smtplib.SMTP, "noop", noop)
+    with pool.connection(row):
+        pass
+    pool.close_all()
+
+    assert held == [False]
+
+def test_rate_limiter_is_shared_until_the_domain_limits_change(monkeypatch):
+    created, limiter_class = [], engine.RateLimiter
+    monkeypatch.setattr(engine, "RateLimiter", lambda *args: created.append(args) or limiter_class(*args))
+    row = {"domain_name": "acct-limited", "max_rate": 5, "burst": None}
+
+    first = engine.get_rate_limiter(row)
+    assert all(engine.get_rate_limiter(row) is first for _ in range(3))
+    changed = engine.get_rate_limiter({**row, "burst": 2})
+
+    assert changed is not first and changed.burst == 2
+    assert created == [(5, None), (5, 2)]
+
+def test_batch_identical_caps_batches_and_splits_on_different_content():
+    rendered = [(f"r{i}@example.test", "Hi", "<p>same</p>") for i in range(5)]
+    rendered += [("own@example.test", "Hi", "<p>personal</p>"), ("r5@example.test", "Hi", "<p>same</p>")]
+    rendered += [("subject@example.test", "Other", "<p>same</p>")]
+
+    batches = list(engine.batch_identical(iter(rendered), max_recipients=2))
+
+    assert [(emails, subject, body) for emails, subject, body in batches] == [
+        (["r0@example.test", "r1@example.test"], "Hi", "<p>same</p>"),
+        (["r2@example.test", "r3@example.test"], "Hi", "<p>same</p>"),
+        (["r4@example.test"], "Hi", "<p>same</p>"),
+        (["own@example.test"], "Hi", "<p>personal</p>"),
+        (["r5@example.test"], "Hi", "<p>same</p>"),
+        (["subject@example.test"], "Other", "<p>same</p>"),
+    ]
+    assert list(engine.batch_identical([], max_recipients=2)) == []
+
+def test_send_batch_is_one_transaction_logged_per_recipient(db, smtp_server, monkeypatch):
+    from rmail import sendlog
+
+    port, sink = smtp_server()
+    sink.refuse["gone@example.test"] = "550 No such user"
+    writer = sendlog.SendLogWriter()
+    writer.enabled = True
+    monkeypatch.setattr(sendlog, "_writer", writer)
+    row = sender("acct-batch", port, "NONE")
+    emails = ["a@example.test", "gone@example.test", "b@example.test"]
+
+    try:
+        refused = engine.send_batch(row, emails, "Hi", "<p>Hello all</p>", template="news")
+    finally:
+        engine.get_pool().close_all()
+    writer.flush()
+
+    assert refused == {"gone@example.test": (550, b"No such user")}
+    assert len(sink.envelopes) == 1
+    assert sink.envelopes[0].rcpt_tos == ["a@example.test", "b@example.test"]
+    assert b"To: " + engine.UNDISCLOSED_RECIPIENTS.encode() in sink.envelopes[0].original_content
+    logged = db.query_db(
+        "SELECT recipient, status, template, message_id FROM send_log WHERE domain = 'acct-batch' ORDER BY id"
+    )
+    assert [(r['recipient'], r['status'], r['template']) for r in logged] == [
+        ("a@example.test", "sent", "news"), ("gone@example.test", "refused", "news"), ("b@example.test", "sent", "news"),
+    ]
+    assert len({r['message_id'] for r in logged}) == 1
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake time.monotonic(); clock(seconds) moves it forward."""
+    now = [1000.0]
+    monkeypatch.setattr(engine.time, "monotonic", lambda: now[0])
+    return lambda seconds: now.__setitem__(0, now[0] + seconds)
+
+def test_rate_limiter_paces_after_the_burst(clock):
+    limiter = engine.RateLimiter(10, burst=2)
+
+    assert [limiter.reserve() for _ in range(3)] == [0.0, 0.0, pytest.approx(0.1)]
+    clock(0.1)
+    assert limiter.reserve() == pytest.approx(0.1)  # The refill paid for the wait, not for this one
+    clock(5)
+    assert limiter.reserve(3) == pytest.approx(0.1)  # Refills cap at the burst; a batch costs one per RCPT
+    assert engine.RateLimiter(2.5).burst == 3
+
+def test_rate_limiter_throttle_slows_down_at_once(clock):
+    limiter = engine.RateLimiter(10, burst=5)
+    limiter.throttle()
+
+    assert limiter.rate == pytest.approx(9)
+    assert limiter.reserve() == pytest.approx(1 / 9)  # The unused burst is gone too
+    for _ in range(30):
+        limiter.throttle()
+    assert limiter.rate == pytest.approx(0.5)  # Floor: a twentieth of max_rate
+
+def test_rate_limiter_recovers_after_successes(clock):
+    limiter = engine.RateLimiter(10)
+    limiter.throttle()
+    limiter.throttle()
+
+    for _ in range(10):
+        limiter.success()
+    assert limiter.rate == pytest.approx(9)  # Ten successes win back one step
+    for _ in range(100):
+        limiter.success()
+    assert limiter.rate == pytest.approx(10)
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from rmail.commands.group import group_bp
+
+def run(*args, **kwargs):
+    result = CliRunner(env={"COLUMNS": "200"}).invoke(group_bp, list(args), **kwargs)
+    assert result.exit_code == 0, result.output
+    return result.output
+
+@pytest.fixture
+def receivers(db):
+    """Receivers gc-0..gc-4; removes them and the 'gc-' groups afterwards."""
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO receivers (alias, name, email) VALUES (?, ?, ?)",
+            [(f"gc-{i}", f"Member {i}", f"gc{i}@example.test") for i in range(5)]
+        )
+    yield
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM groups WHERE name LIKE 'gc-%'")
+        conn.execute("DELETE FROM receivers WHERE alias LIKE 'gc-%'")
+
+def members(name):
+    return [json.loads(line)["alias"] for line in run("members", name, "--format", "jsonl").splitlines()]
+
+def test_group_membership(receivers):
+    assert "created" in run("add", "gc-team", "--description", "The team")
+
+    output = run("add-member", "gc-team", "gc-3", "gc-0", "gc-nobody", "gc-3")
+    assert "Added 2 members" in output and "Unknown aliases: gc-nobody" in output
+    output = run("add-member", "gc-team", "gc-0", "gc-1")
+    assert "Added 1 members" in output and "1 already in the group" in output
+    assert members("gc-team") == ["gc-0", "gc-1", "gc-3"]
+
+    assert "Removed 1 members" in run("remove-member", "gc-team", "gc-1", "gc-4")
+    assert members("gc-team") == ["gc-0", "gc-3"]
+    listed = [json.loads(line) for line in run("list", "gc-", "--format", "jsonl").splitlines()]
+    assert [(g["name"], g["members"], g["description"]) for g in listed] == [("gc-team", 2, "The team")]
+    assert "@gc-team (2 members)" in run("members", "gc-team")
+    run("add", "gc-other")
+    assert len(run("list", "gc-", "--format", "jsonl", "--limit", "1").splitlines()) == 1
+
+def test_deleting_a_group_keeps_its_receivers(db, receivers):
+    run("add", "gc-gone")
+    run("add-member", "gc-gone", "gc-0", "gc-1")
+
+    assert "Deleted group 'gc-gone'" in run("delete", "gc-gone", "--yes")
+    assert "not found" in run("members", "gc-gone")
+    assert db.query_db("SELECT COUNT(*) AS n FROM receivers WHERE alias IN ('gc-0', 'gc-1')", one=True)['n'] == 2
+    assert db.query_db("SELECT COUNT(*) AS n FROM group_members m LEFT JOIN groups g ON g.id = m.group_id WHERE g.id IS NULL", one=True)['n'] == 0
@@ -0,0 +1,40 @@
+import json
+import time
+
+from click.testing import CliRunner
+
+from rmail.commands.log import log_bp
+
+def stats(*args):
+    result = CliRunner().invoke(log_bp, ["stats", "--format", "jsonl", *args])
+    assert result.exit_code == 0, result.output
+    return {s["domain"]: s for s in map(json.loads, result.output.splitlines()) if s["domain"].startswith("stats-")}
+
+def test_stats_percentiles_and_counts_per_domain(db):
+    now = time.time()
+    row = "(ts, domain, sender, recipient, status, smtp_code, size_bytes, connect_ms, smtp_ms) VALUES (?, ?, 'me@x.test', 'r@x.test', ?, ?, 100, ?, ?)"
+    # stats-a: 20 deliveries taking 1..20 ms (the first ten needed a 1 ms connect), plus refusals and failures,
+    # which count but don't enter the percentiles. stats-b: two deliveries. And one stats-a row from last week.
+    rows = [(now - 30 + i, "stats-a", "sent", 250, 1.0 if i <= 10 else None, i - (1.0 if i <= 10 else 0)) for i in range(1, 21)]
+    rows += [(now - 5, "stats-a", "refused", 550, None, 500.0)] * 2 + [(now - 5, "stats-a", "failed", None, None, 900.0)]
+    rows += [(now - 10, "stats-b", "sent", 250, 2.0, 3.0), (now - 9, "stats-b", "sent", 250, None, 40.0)]
+    rows += [(now - 7 * 86400, "stats-a", "sent", 250, None, 5000.0)]
+    with db.transaction() as conn:
+        conn.executemany(f"INSERT INTO send_log {row}", rows)
+
+    try:
+        a, b = stats()["stats-a"], stats()["stats-b"]
+        only_b = stats("--domain", "stats-b")
+        week = stats("--since", "8d")["stats-a"]
+    finally:
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM send_log WHERE domain LIKE 'stats-%'")
+
+    assert (a["sent"], a["refused"], a["failed"]) == (20, 2, 1)
+    assert a["error_rate"] == 3 / 23
+    # Nearest rank: p50 is the 10th of 20 latencies, p95 the 19th, p99 the 20th
+    assert (a["p50_ms"], a["p95_ms"], a["p99_ms"], a["max_ms"]) == (10.0, 19.0, 20.0, 20.0)
+    assert (b["sent"], b["refused"], b["failed"]) == (2, 0, 0)
+    assert (b["p50_ms"], b["p95_ms"], b["max_ms"]) == (5.0, 40.0, 40.0)
+    assert list(only_b) == ["stats-b"]
+    assert (week["sent"], week["max_ms"]) == (21, 5000.0)
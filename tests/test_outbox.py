@@ -0,0 +1,124 @@
+import smtplib
+
+from rmail import engine, outbox
+
+def test_permanent_errors():
+    assert engine.is_permanent_error(smtplib.SMTPDataError(554, b"rejected"))
+    assert engine.is_permanent_error(smtplib.SMTPRecipientsRefused({"a@x.test": (550, b"no such user")}))
+    assert not engine.is_permanent_error(smtplib.SMTPRecipientsRefused({"a@x.test": (550, b"no"), "b@x.test": (450, b"later")}))
+    assert not engine.is_permanent_error(smtplib.SMTPRecipientsRefused({"a@x.test": (451, b"later")}))
+    assert not engine.is_permanent_error(smtplib.SMTPResponseException(421, b"closing"))
+    assert not engine.is_permanent_error(smtplib.SMTPServerDisconnected("gone"))
+    assert not engine.is_permanent_error(ConnectionRefusedError())
+
+def test_record_results_fails_refused_recipient_for_good(db, make_sender):
+    alias = make_sender(1)
+    sender_id = db.query_db("SELECT id FROM senders WHERE alias = ?", (alias,), one=True)['id']
+    refused_id = outbox.enqueue(sender_id, "me@example.test", "gone@x.test", "s", b"data")
+    busy_id = outbox.enqueue(sender_id, "me@example.test", "busy@x.test", "s", b"data")
+    rows = {r['id']: r for r in outbox.claim_batch(100)}
+
+    retried, dead = outbox.record_results([], [
+        (rows[refused_id], smtplib.SMTPRecipientsRefused({"gone@x.test": (550, b"no such user")})),
+        (rows[busy_id], smtplib.SMTPRecipientsRefused({"busy@x.test": (451, b"try later")})),
+    ])
+
+    assert (retried, dead) == (1, 1)
+    status = {r['id']: r['status'] for r in db.query_db("SELECT id, status FROM outbox WHERE id IN (?, ?)", (refused_id, busy_id))}
+    assert status == {refused_id: 'failed', busy_id: 'queued'}
+
+def test_worker_interrupted_mid_batch_records_what_was_sent(db, make_sender, monkeypatch):
+    from click.testing import CliRunner
+    from rmail.commands.worker import worker_cmd
+
+    alias = make_sender(1)
+    sender_id = db.query_db("SELECT id FROM senders WHERE alias = ?", (alias,), one=True)['id']
+    db.query_db("DELETE FROM outbox")
+    ids = [outbox.enqueue(sender_id, "me@example.test", f"r{i}@x.test", "s", b"data") for i in range(3)]
+
+    delivered = []
+    def deliver(row, from_addr, to_addrs, data, **kwargs):
+        if delivered:
+            raise KeyboardInterrupt
+        delivered.append(row['id'])
+    monkeypatch.setattr(engine, "deliver", deliver)
+
+    result = CliRunner().invoke(worker_cmd, ["--once"])
+
+    assert "Worker stopped" in result.output
+    status = {r['id']: r['status'] for r in db.query_db("SELECT id, status FROM outbox")}
+    assert status == {ids[0]: 'sent', ids[1]: 'queued', ids[2]: 'queued'}
+
+def test_idle_worker_flushes_the_send_log(db, make_sender, monkeypatch):
+    from click.testing import CliRunner
+    from rmail import sendlog
+    from rmail.commands.worker import worker_cmd
+
+    alias = make_sender(1)
+    sender_id = db.query_db("SELECT id FROM senders WHERE alias = ?", (alias,), one=True)['id']
+    db.query_db("DELETE FROM outbox")
+    outbox.enqueue(sender_id, "me@example.test", "idle@x.test", "s", b"data")
+    # Big enough that only an explicit flush() writes the row
+    writer = sendlog.SendLogWriter(flush_rows=1000, flush_interval=3600)
+    writer.enabled = True
+    monkeypatch.setattr(sendlog, "_writer", writer)
+    monkeypatch.setattr(engine, "deliver", lambda row, from_addr, to_addrs, data, **kwargs: writer.record_delivery(
+        row, from_addr, to_addrs, data
+    ))
+
+    result = CliRunner().invoke(worker_cmd, ["--once"])
+
+    assert result.exit_code == 0, result.output
+    logged = db.query_db("SELECT status FROM send_log WHERE recipient = 'idle@x.test'")
+    assert [r['status'] for r in logged] == ['sent']
+
+def test_claimed_rows_are_requeued_only_when_their_lease_runs_out(db, make_sender, monkeypatch):
+    alias = make_sender(1)
+    sender_id = db.query_db("SELECT id FROM senders WHERE alias = ?", (alias,), one=True)['id']
+    db.query_db("DELETE FROM outbox")
+    renewed, abandoned = (outbox.enqueue(sender_id, "me@example.test", f"{name}@x.test", "s", b"data") for name in ("renewed", "abandoned"))
+    now = [outbox.time.time()]
+    monkeypatch.setattr(outbox.time, "time", lambda: now[0])
+
+    assert {r['id'] for r in outbox.claim_batch(100)} == {renewed, abandoned}
+    now[0] += outbox.LEASE - 1
+    assert outbox.requeue_stale() == 0  # A long batch that is still being worked on
+    outbox.renew_lease([renewed])
+    now[0] += 2
+    assert outbox.requeue_stale() == 1
+    status = {r['id']: r['status'] for r in db.query_db("SELECT id, status FROM outbox")}
+    assert status == {renewed: 'sending', abandoned: 'queued'}
+
+    outbox.release([renewed])
+    assert {r['id'] for r in outbox.claim_batch(100)} == {renewed, abandoned}  # Both due at once
+
+def test_worker_renews_the_lease_of_its_batch(db, make_sender, monkeypatch):
+    from click.testing import CliRunner
+    from rmail.commands.worker import worker_cmd
+
+    alias = make_sender(1)
+    sender_id = db.query_db("SELECT id FROM senders WHERE alias = ?", (alias,), one=True)['id']
+    db.query_db("DELETE FROM outbox")
+    ids = [outbox.enqueue(sender_id, "me@example.test", f"r{i}@x.test", "s", b"data") for i in range(3)]
+    monkeypatch.setattr(outbox, "LEASE_RENEW", 0)
+    renewals = []
+    monkeypatch.setattr(outbox, "renew_lease", renewals.append)
+    monkeypatch.setattr(engine, "deliver", lambda *args, **kwargs: {})
+
+    result = CliRunner().invoke(worker_cmd, ["--once"])
+
+    assert result.exit_code == 0, result.output
+    assert renewals == [ids] * 3
+
+def test_sent_rows_drop_their_payload(db, make_sender):
+    alias = make_sender(1)
+    sender_id = db.query_db("SELECT id FROM senders WHERE alias = ?", (alias,), one=True)['id']
+    db.query_db("DELETE FROM outbox")
+    sent_id = outbox.enqueue(sender_id, "me@example.test", "sent@x.test", "s", b"x" * 10_000)
+    retry_id = outbox.enqueue(sender_id, "me@example.test", "retry@x.test", "s", b"y" * 10_000)
+    rows = {r['id']: r for r in outbox.claim_batch(100)}
+
+    outbox.record_results([sent_id], [(rows[retry_id], smtplib.SMTPDataError(451, b"try later"))])
+
+    stored = {r['id']: (r['status'], r['message'], r['to_addr']) for r in db.query_db("SELECT * FROM outbox")}
+    assert stored == {sent_id: ('sent', b"", "sent@x.test"), retry_id: ('queued', b"y" * 10_000, "retry@x.test")}
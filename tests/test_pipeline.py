@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from rmail import engine, pipeline
+
+@pytest.fixture
+def template():
+    """A template in the real templates dir, so pool workers find it however they are started."""
+    engine.TEMPLATE_DIR.mkdir(parents=True, exist_ok=True)
+    path = engine.TEMPLATE_DIR / "pipeline-test.html"
+    path.write_text("<p>Hi {{ name }}, your share is {{ 100 // parts }}</p>")
+    yield "pipeline-test"
+    path.unlink()
+
+def collect(render, rows, on_error, use_async):
+    if not use_async:
+        return list(render.run(rows, on_error))
+
+    async def drain():
+        return [item async for item in render.arun(rows, on_error)]
+    return asyncio.run(drain())
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_render_pipeline_keeps_input_order_and_reports_failed_rows(template, use_async):
+    rows = [{"email": f"r{i}@example.test", "name": f"R{i}", "parts": i % 4} for i in range(1, 12)]
+    render = pipeline.RenderPipeline(
+        "me@example.test", template, "For {{ name }}", {}, workers=2, chunk_size=2, depth=2
+    )
+    errors = []
+
+    items = collect(render, rows, lambda email, error: errors.append((email, error)), use_async)
+
+    # parts == 0 fails to render in the worker: those rows reach on_error and drop out, in order
+    failed = [row['email'] for row in rows if row['parts'] == 0]
+    assert [email for email, _ in errors] == failed
+    assert all("division" in error for _, error in errors)
+    assert [emails for emails, _, _ in items] == [[row['email']] for row in rows if row['parts']]
+    data = items[0][1]
+    assert b"Subject: For R1" in data and b"your share is 100" in data
+    assert render.stats.chunks == 6 and render.stats.recipients == len(rows) - len(failed)
+
+def test_render_pipeline_raises_when_a_chunk_fails(template):
+    render = pipeline.RenderPipeline(
+        "me@example.test", template, "Hi", {}, attachments=["/nonexistent/attachment.pdf"], workers=2, chunk_size=1
+    )
+
+    with pytest.raises(FileNotFoundError):
+        list(render.run([{"email": "a@example.test", "parts": 1}], lambda email, error: None))
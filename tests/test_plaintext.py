@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import frontmatter
+import pytest
+
+from rmail.engine import render_template_content
+from rmail.plaintext import html_to_text
+
+SAMPLES_DIR = Path(__file__).resolve().parent.parent / "sample-templates"
+
+# The plaintext part of each bundled sample, rendered with its variable descriptions as values
+EXPECTED = {
+    "player.html": (
+        "💿\n\nUpdate Title\n\nYour Name\n\n1:24 3:45\n\nThe main text body\n\n"
+        "▶ Play Update"  # href="#" is not worth printing
+    ),
+    "receipt.html": (
+        "R-MAIL INC.\n\nAUTOMATED MESSAGING SYSTEM\n\n"
+        "ORDER: Project Name\nDATE: 2025-12-31\n\n"
+        "Task A Completed | Done\nBug B Fixed | Done\nTOTAL: | 100% Complete\n\n"
+        "THANK YOU FOR YOUR BUSINESS\n\n||| || ||| | |||| |||"
+    ),
+    "terminal.html": (
+        "user@ringlochid:~$ The command you ran\n\n> Process Name\n\n"
+        "Main log message output\n\nSTATUS: SUCCESS\n\n_"
+    ),
+}
+
+def test_every_sample_has_an_expectation():
+    assert sorted(p.name for p in SAMPLES_DIR.glob("*.html")) == sorted(EXPECTED)
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_sample_template_plaintext(name):
+    post = frontmatter.load(str(SAMPLES_DIR / name))
+    context = {var: str(desc) for var, desc in post.metadata.get("variables", {}).items()}
+    html = render_template_content(post.content, ".html", context)
+
+    assert html_to_text(html) == EXPECTED[name]
+
+def test_structure_without_a_template():
+    html = """
+        <style>p { color: red }</style>
+        <h1>Title</h1><p>One <b>bold</b>
+        word.</p>
+        <ol><li>first</li><li>second</li></ol>
+        <ul><li>item</li></ul>
+        <table><tr><td>a</td><td>b</td></tr></table>
+        <p><a href="https://example.test/x">link</a><br>next&amp;last</p>
+        <pre>  kept
+  as is</pre>
+    """
+    assert html_to_text(html) == (
+        "Title\n\nOne bold word.\n\n1. first\n2. second\n\n- item\n\na | b\n\n"
+        "link (https://example.test/x)\nnext&last\n\n  kept\n  as is"
+    )
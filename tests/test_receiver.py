@@ -0,0 +1,88 @@
+import re
+
+import pytest
+from click.testing import CliRunner
+
+from rmail.commands.receiver import receiver_bp
+
+def run(*args):
+    result = CliRunner(env={"COLUMNS": "200"}).invoke(receiver_bp, list(args))
+    assert result.exit_code == 0, result.output
+    return result.output
+
+@pytest.fixture
+def receivers(db):
+    """Receivers under the 'kp-' prefix; remove them afterwards."""
+    def add(rows):
+        with db.transaction() as conn:
+            conn.executemany("INSERT INTO receivers (alias, name, email) VALUES (?, ?, ?)", rows)
+    yield add
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM receivers WHERE alias LIKE 'kp-%'")
+
+def test_search_pages_continue_without_duplicates_or_gaps(receivers):
+    # Names of different lengths give different bm25 scores; equal ones tie and fall back to the alias
+    receivers([
+        (f"kp-{i:02d}", "Wombat " + "x" * (i % 4), f"kp{i}@example.test") for i in range(23)
+    ] + [(f"kp-other-{i}", "Someone Else", f"other{i}@example.test") for i in range(5)])
+
+    seen, after = [], None
+    for _ in range(10):
+        output = run("list", "wombat", "--limit", "5", *(["--after", after] if after else []))
+        seen += re.findall(r"\b(kp-[\w-]+)\b", output)
+        more = re.search(r"--after (\S+)", output)
+        if not more:
+            break
+        after = more.group(1)
+
+    assert len(seen) == len(set(seen)) == 23
+    assert set(seen) == {f"kp-{i:02d}" for i in range(23)}
+
+@pytest.mark.parametrize("query", [[], ["wombat"]])
+def test_jsonl_prints_exactly_limit_rows(receivers, query):
+    receivers([(f"kp-{i}", "Wombat", f"kp{i}@example.test") for i in range(5)])
+
+    assert len(run("list", *query, "--format", "jsonl", "--limit", "3").splitlines()) == 3
+    assert len(run("list", *query, "--format", "jsonl").splitlines()) >= 5
+
+def stored(db):
+    rows = db.query_db("SELECT alias, name, email, notes FROM receivers WHERE alias LIKE 'kp-%' ORDER BY alias")
+    return [tuple(r) for r in rows]
+
+def test_import_updates_existing_aliases(db, receivers, tmp_path):
+    first = tmp_path / "first.csv"
+    first.write_text("alias,name,email,notes\nkp-a,Ann,ann@example.test,vip\nkp-b,Bob,bob@example.test,\n,,,\n")
+    output = run("import", str(first), "--batch-size", "1")
+    assert "Imported 2 contacts" in output and "Skipped 1 rows without an email" in output
+
+    second = tmp_path / "second.jsonl"
+    second.write_text(
+        '{"alias": "kp-a", "name": "Ann B.", "email": "ann.b@example.test"}\n'
+        '{"alias": "kp-c", "name": "Cy", "email": "cy@example.test"}\n'
+    )
+    run("import", str(second))
+
+    assert stored(db) == [
+        ("kp-a", "Ann B.", "ann.b@example.test", "vip"),  # Updated in place; notes kept when not given
+        ("kp-b", "Bob", "bob@example.test", None),
+        ("kp-c", "Cy", "cy@example.test", None),
+    ]
+
+def test_import_dedupe_email_skips_addresses_owned_by_another_alias(db, receivers, tmp_path):
+    receivers([("kp-a", "Ann", "ann@example.test")])
+    source = tmp_path / "contacts.csv"
+    source.write_text(
+        "alias,name,email\n"
+        "kp-a,Ann Again,ann@example.test\n"    # Same alias: still an update
+        "kp-a2,Ann Twin,ANN@example.test\n"    # Someone else's address (case-insensitive): skipped
+        "kp-d,Dee,dee@example.test\n"
+        "kp-d2,Dee Twin,dee@example.test\n"    # Owned by a row of this very import
+    )
+
+    output = run("import", str(source), "--dedupe-email")
+
+    assert "Imported 2 contacts" in output and "Skipped 2 duplicate emails" in output
+    assert stored(db) == [
+        ("kp-a", "Ann Again", "ann@example.test", None),
+        ("kp-d", "Dee", "dee@example.test", None),
+    ]
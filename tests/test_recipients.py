@@ -0,0 +1,52 @@
+import pytest
+
+from rmail import recipients
+
+@pytest.fixture
+def groups(db):
+    """Two groups, 'gm-a' and 'gm-b', with interleaved members; returns {name: [receiver ids]}."""
+    members = {"gm-a": [], "gm-b": []}
+    with db.transaction() as conn:
+        group_ids = {
+            name: conn.execute("INSERT INTO groups (name) VALUES (?)", (name,)).lastrowid for name in members
+        }
+        for i in range(12):
+            name = "gm-a" if i % 3 else "gm-b"
+            receiver_id = conn.execute(
+                "INSERT INTO receivers (alias, name, email) VALUES (?, ?, ?)", (f"gm-{i}", f"Member {i}", f"gm{i}@example.test")
+            ).lastrowid
+            conn.execute("INSERT INTO group_members (group_id, receiver_id) VALUES (?, ?)", (group_ids[name], receiver_id))
+            members[name].append(receiver_id)
+        # Not a member of anything
+        conn.execute("INSERT INTO receivers (alias, name, email) VALUES ('gm-none', 'Nobody', 'none@example.test')")
+    yield group_ids, members
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM groups WHERE name LIKE 'gm-%'")
+        conn.execute("DELETE FROM receivers WHERE alias LIKE 'gm-%'")
+
+def test_member_chunks_cover_the_group_once(groups):
+    group_ids, members = groups
+    chunks = list(recipients.iter_member_chunks(group_ids["gm-a"], chunk_size=3))
+
+    assert [len(c) for c in chunks] == [3, 3, 2]
+    assert [r['id'] for c in chunks for r in c] == members["gm-a"]
+    assert chunks[0][0]['email'] == "gm1@example.test"
+    assert [r['id'] for r in recipients.iter_members(group_ids["gm-b"], chunk_size=2)] == members["gm-b"]
+    assert recipients.resolve_group("gm-a")['members'] == 8
+
+def test_member_changes_between_chunks(db, groups):
+    group_ids, members = groups
+    chunks = recipients.iter_member_chunks(group_ids["gm-a"], chunk_size=3)
+    first = next(chunks)
+
+    # No read transaction is held between chunks: later changes show up in the remaining ones
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM receivers WHERE id = ?", (members["gm-a"][4],))
+        conn.execute("DELETE FROM group_members WHERE receiver_id = ?", (members["gm-a"][0],))  # Already read
+        late = conn.execute(
+            "INSERT INTO receivers (alias, name, email) VALUES ('gm-late', 'Late', 'late@example.test')"
+        ).lastrowid
+        conn.execute("INSERT INTO group_members (group_id, receiver_id) VALUES (?, ?)", (group_ids["gm-a"], late))
+
+    rest = [r['id'] for c in chunks for r in c]
+    assert [r['id'] for r in first] + rest == [i for i in members["gm-a"] if i != members["gm-a"][4]] + [late]
@@ -0,0 +1,95 @@
+import smtplib
+import ssl
+import threading
+import time
+
+from rmail import profiling, relays
+
+def test_probe_is_silent_and_leaves_the_profile_alone(smtp_server, capsys):
+    port, sink = smtp_server()
+    relay = relays.Relay({
+        "email": "me@example.test", "domain_name": "acct-probed", "smtp_host": "127.0.0.1",
+        "smtp_port": port, "smtp_user": "", "security": "NONE",
+    })
+    router = relays.RelayRouter()
+    router.health(relay).eject()
+
+    profile = profiling.start()
+    try:
+        probe = threading.Thread(target=router._probe, args=(relay,))
+        probe.start()
+        probe.join()
+    finally:
+        profiling.stop()
+
+    assert capsys.readouterr().out == ""
+    assert profile.phases == {}
+    assert router.health(relay).state == 'closed'
+    assert sink.quits == 1
+
+def relay(name, priority=0, **columns):
+    return relays.Relay({"domain_name": name, **columns}, priority)
+
+def test_only_session_level_failures_count_against_a_relay():
+    greylisted = smtplib.SMTPRecipientsRefused({"a@example.test": (450, b"Greylisted"), "b@example.test": (451, b"Later")})
+    assert not relays.is_relay_error(greylisted)
+    assert not relays.is_relay_error(smtplib.SMTPRecipientsRefused({"a@example.test": (550, b"No such user")}))
+    assert relays.is_relay_error(smtplib.SMTPRecipientsRefused({"a@example.test": (421, b"Closing")}))
+    assert relays.is_relay_error(smtplib.SMTPSenderRefused(451, b"Local problem", "me@example.test"))
+    assert relays.is_relay_error(smtplib.SMTPDataError(452, b"Out of space"))
+    assert not relays.is_relay_error(smtplib.SMTPDataError(554, b"Spam"))
+    assert relays.is_relay_error(ConnectionRefusedError())
+    assert relays.is_relay_error(ssl.SSLError())
+
+def test_idle_backup_is_probed_instead_of_getting_mail(monkeypatch):
+    primary, backup = relay("acct-primary"), relay("acct-backup", priority=1)
+    router = relays.RelayRouter()
+    probed = []
+    monkeypatch.setattr(router, "_probe", probed.append)
+    for r in (primary, backup):
+        router.record(r, 1.0, 5.0)
+    router.health(backup).used_at -= relays.SAMPLE_MAX_AGE + 1
+
+    order = list(router.route([primary, backup]))
+    time.sleep(0.05)  # Probes run on their own thread
+
+    assert order == [primary, backup]
+    assert probed == [backup]
+    # An answered probe forgets the old averages, so the next message measures the relay afresh
+    router.health(backup).probed()
+    assert router.health(backup).latency is None and router.health(backup).state == 'closed'
+
+def test_relay_slower_than_its_baseline_is_a_fallback():
+    primary, backup = relay("acct-degraded"), relay("acct-spare", priority=1)
+    router = relays.RelayRouter()
+    for _ in range(20):
+        router.record(primary, 1.0, 5.0)
+    assert next(router.route([primary, backup])) is primary
+
+    for _ in range(3):
+        router.record(primary, 1.0, 200.0)
+    # The backup's latency is unknown, the primary is far off its own baseline
+    assert next(router.route([primary, backup])) is backup
+
+def test_cached_relay_group_keeps_only_relay_and_sender_columns(db):
+    with db.transaction() as conn:
+        domain_ids = [
+            conn.execute("INSERT INTO domains (name, smtp_host, smtp_port, smtp_user, security) VALUES (?, '127.0.0.1', 25, '', 'NONE')", (name,)).lastrowid
+            for name in ("acct-own", "acct-extra")
+        ]
+        sender_id = conn.execute(
+            "INSERT INTO senders (alias, fullname, email, domain_id) VALUES ('grouped-cache', 'Test', 'me@example.test', ?)", (domain_ids[0],)
+        ).lastrowid
+        conn.execute("INSERT INTO sender_relays (sender_id, domain_id, priority) VALUES (?, ?, 1)", (sender_id, domain_ids[1]))
+
+    row = {
+        "sender_id": sender_id, "email": "me@example.test", "fullname": "Test", "domain_name": "acct-own",
+        "smtp_host": "127.0.0.1", "smtp_port": 25, "smtp_user": "", "security": "NONE", "max_rate": None, "burst": None,
+        "message": b"an outbox message that must not stay cached", "to_addr": "you@example.test",
+    }
+    group = relays.get_relays(row)
+
+    assert [r.name for r in group] == ["acct-own", "acct-extra"]
+    for r in group:
+        assert set(r.row) <= set(relays.SENDER_COLUMNS + relays.RELAY_COLUMNS)
+        assert r.row["email"] == "me@example.test"
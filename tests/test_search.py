@@ -0,0 +1,37 @@
+import pytest
+
+def search(db, query):
+    sql, params = db.keyset_query(
+        "r.alias", "receivers r", "r.alias",
+        table="receivers", query=query, like_columns=["r.alias", "r.name", "r.email"], row_ref="r",
+    )
+    assert "receivers_fts MATCH" in sql  # The index, not the LIKE fallback
+    return [r['alias'] for r in db.query_db(sql, params)]
+
+@pytest.fixture
+def receiver(db):
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO receivers (alias, name, email) VALUES ('fts-1', 'Bartholomew Quill', 'bq@fts.test')")
+    yield "fts-1"
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM receivers WHERE alias LIKE 'fts-%'")
+
+def test_index_follows_updates(db, receiver):
+    assert search(db, "bartho") == [receiver]
+
+    with db.transaction() as conn:
+        conn.execute("UPDATE receivers SET name = 'Cornelius Quill', email = 'cq@fts.test' WHERE alias = ?", (receiver,))
+    assert search(db, "bartho") == []
+    assert search(db, "bq") == []
+    assert search(db, "cornel") == search(db, "cq") == search(db, "quill") == [receiver]
+
+    with db.transaction() as conn:
+        conn.execute("UPDATE receivers SET alias = 'fts-2' WHERE alias = ?", (receiver,))
+    assert search(db, "fts 2") == ["fts-2"]
+
+def test_index_follows_deletes(db, receiver):
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM receivers WHERE alias = ?", (receiver,))
+    assert search(db, "quill") == []
+    # A deleted row must not linger in the index (the external-content 'delete' needs the old values)
+    assert db.query_db("SELECT COUNT(*) AS n FROM receivers_fts WHERE receivers_fts MATCH 'quill'", one=True)['n'] == 0
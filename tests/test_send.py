@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from rmail.commands.send import send_cmd
+
+def test_profile_json_on_stdout_is_parseable(smtp_server, make_sender):
+    port, sink = smtp_server()
+    alias = make_sender(port)
+
+    result = CliRunner().invoke(send_cmd, [
+        "-f", alias, "-t", "you@example.test", "-s", "Hi", "-b", "<p>Hello</p>", "--profile-json", "-",
+    ])
+
+    assert result.exit_code == 0, result.output
+    profile = json.loads(result.stdout)
+    assert {p["name"] for p in profile["phases"]} >= {"db.sender", "smtp.connect", "smtp.send"}
+    assert "Email sent" in result.stderr
+    assert len(sink.envelopes) == 1
+
+@pytest.fixture
+def group(db):
+    """Group 'gs-team' with members gs-0..gs-2; removed afterwards."""
+    with db.transaction() as conn:
+        group_id = conn.execute("INSERT INTO groups (name) VALUES ('gs-team')").lastrowid
+        for i in range(3):
+            receiver_id = conn.execute(
+                "INSERT INTO receivers (alias, name, email) VALUES (?, ?, ?)", (f"gs-{i}", f"Member {i}", f"gs{i}@example.test")
+            ).lastrowid
+            conn.execute("INSERT INTO group_members (group_id, receiver_id) VALUES (?, ?)", (group_id, receiver_id))
+    yield "gs-team"
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM groups WHERE name = 'gs-team'")
+        conn.execute("DELETE FROM receivers WHERE alias LIKE 'gs-%'")
+
+def send(*args):
+    result = CliRunner().invoke(send_cmd, list(args))
+    assert result.exit_code == 0, result.output
+    return result.output
+
+@pytest.mark.parametrize("batch_size, transactions", [(1, 3), (3, 1)])
+def test_send_to_group(smtp_server, make_sender, group, batch_size, transactions):
+    port, sink = smtp_server()
+    alias = make_sender(port)
+
+    output = send("-f", alias, "-t", "@gs-team", "-s", "Hi", "-b", "<p>Same for everyone</p>", "--batch-size", str(batch_size))
+
+    assert "@gs-team: sent 3, queued 0, failed 0" in output
+    assert len(sink.envelopes) == transactions
+    assert sorted(r for e in sink.envelopes for r in e.rcpt_tos) == [f"gs{i}@example.test" for i in range(3)]
+
+def test_send_to_group_emptied_after_the_count(smtp_server, make_sender, group, monkeypatch, db):
+    from rmail import recipients
+
+    port, sink = smtp_server()
+    alias = make_sender(port)
+    counted = recipients.resolve_group(group)
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM group_members WHERE group_id = ?", (counted['id'],))
+    monkeypatch.setattr(recipients, "resolve_group", lambda name: counted)  # Still says 3 members
+
+    assert "Group 'gs-team' has no members." in send("-f", alias, "-t", "@gs-team", "-s", "Hi", "-b", "<p>Hi</p>")
+    assert sink.envelopes == []
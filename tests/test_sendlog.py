@@ -0,0 +1,29 @@
+import contextlib
+import sqlite3
+
+from rmail import sendlog
+
+SENDER = {"domain_name": "sendlog-test"}
+
+def test_failed_write_is_retried_not_disabled(db, monkeypatch):
+    writer = sendlog.SendLogWriter(flush_rows=2, flush_interval=0.0)
+    writer.enabled = True
+    real_transaction = sendlog.transaction
+    calls = []
+
+    @contextlib.contextmanager
+    def flaky_transaction():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        with real_transaction() as conn:
+            yield conn
+    monkeypatch.setattr(sendlog, "transaction", flaky_transaction)
+
+    for i in range(4):
+        writer.record_delivery(SENDER, "me@example.test", [f"r{i}@x.test"], b"data")
+    writer.flush()
+
+    assert writer.enabled and writer.dropped == 0
+    logged = db.query_db("SELECT COUNT(*) AS n FROM send_log WHERE domain = 'sendlog-test'", one=True)['n']
+    assert logged == 4
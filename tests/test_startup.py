@@ -0,0 +1,29 @@
+import importlib
+
+import pytest
+
+from benchmarks.bench_startup import BUDGET_MS, HEAVY_MODULES, SCENARIOS, baseline_modules, import_profile
+from rmail.cli import LAZY_COMMANDS
+
+@pytest.fixture(scope="module")
+def baseline():
+    return baseline_modules()
+
+@pytest.mark.parametrize("argv", SCENARIOS.values(), ids=SCENARIOS.keys())
+def test_no_heavy_imports_for_help(baseline, argv):
+    modules, _ = import_profile(argv, baseline)  # Raises if the command fails
+    assert sorted({m.split(".")[0] for m in modules} & HEAVY_MODULES) == []
+
+def test_help_starts_within_budget(baseline):
+    # Only the top-level help: subcommands pay for rich, which puts them too close to the
+    # budget for a timing check on a busy CI box (bench_startup.py still reports them)
+    best_us = min(import_profile(["--help"], baseline)[1] for _ in range(3))
+    assert best_us / 1000 <= BUDGET_MS
+
+@pytest.mark.parametrize("name", LAZY_COMMANDS)
+def test_lazy_help_matches_the_command(name):
+    import_path, short_help = LAZY_COMMANDS[name]
+    module_name, attr = import_path.split(":")
+    command = getattr(importlib.import_module(module_name), attr)
+    # `r-mail --help` shows the registered text without importing the command: keep them in sync
+    assert command.get_short_help_str(limit=len(short_help) + 100) == short_help
@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+from rmail import engine
+
+class TemplateDir:
+    """Writes and removes templates, moving file and directory mtimes forward on every change."""
+
+    def __init__(self, path):
+        self.path = path
+        self.clock = path.stat().st_mtime_ns
+
+    def _touch(self, *paths):
+        # Filesystem timestamps are coarse: make each change look like it happened later
+        self.clock += 10**9
+        for path in paths:
+            os.utime(path, ns=(self.clock, self.clock))
+
+    def write(self, name, text):
+        path = self.path / name
+        path.write_text(text)
+        self._touch(path, self.path)
+        return path
+
+    def remove(self, name):
+        (self.path / name).unlink()
+        self._touch(self.path)
+
+@pytest.fixture
+def templates(tmp_path, monkeypatch):
+    """An empty templates dir with fresh caches."""
+    template_dir, cache_dir = tmp_path / "templates", tmp_path / "cache"
+    template_dir.mkdir()
+    monkeypatch.setattr(engine, "TEMPLATE_DIR", template_dir)
+    monkeypatch.setattr(engine, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(engine, "TEMPLATE_INDEX_PATH", cache_dir / "templates.json")
+    monkeypatch.setattr(engine, "_env", None)
+    monkeypatch.setattr(engine, "_template_index", None)
+    monkeypatch.setattr(engine, "_meta_cache", {})
+    return TemplateDir(template_dir)
+
+def test_compiled_template_is_reused_until_the_file_changes(templates):
+    templates.write("hello.html", "Hello {{ name }}")
+    env = engine.get_environment()
+    compiled = env.get_template("hello.html")
+
+    assert engine.render_template("hello", {"name": "Ann"}) == "Hello Ann"
+    assert env.get_template("hello.html") is compiled
+
+    templates.write("hello.html", "---\nsubject: Hi\n---\nBye {{ name }}")
+    assert engine.render_template("hello", {"name": "Ann"}) == "Bye Ann"
+    assert env.get_template("hello.html") is not compiled
+
+def test_template_index_follows_added_and_removed_files(templates):
+    templates.write("welcome.html", "html")
+    assert engine.resolve_template("welcome") == (templates.path / "welcome.html", ".html")
+    assert json.loads(engine.TEMPLATE_INDEX_PATH.read_text())["names"] == {"welcome": "welcome.html"}
+
+    templates.write("welcome.md", "md")  # .md wins over .html
+    assert engine.resolve_template("welcome") == (templates.path / "welcome.md", ".md")
+
+    templates.remove("welcome.md")
+    engine._template_index = None  # As a new process would: read the index from disk
+    assert engine.resolve_template("welcome") == (templates.path / "welcome.html", ".html")
+
+    templates.remove("welcome.html")
+    with pytest.raises(ValueError):
+        engine.resolve_template("welcome")
+
+def test_frontmatter_is_reparsed_after_an_edit(templates):
+    templates.write("note.md", "---\nsubject: First\n---\nBody")
+    meta = engine.get_template_meta("note")
+    assert engine.get_template_meta("note") is meta
+    assert meta == ({"subject": "First"}, "Body", ".md")
+
+    templates.write("note.md", "---\nsubject: Second\n---\nBody")
+    assert engine.get_template_meta("note")[0] == {"subject": "Second"}
@@ -0,0 +1,86 @@
+import json
+import multiprocessing
+
+import pytest
+from cryptography.fernet import Fernet
+
+from rmail import vault
+
+@pytest.fixture
+def key(tmp_path, monkeypatch):
+    monkeypatch.setattr(vault, "VAULT_FILE", tmp_path / "secrets.enc")
+    key = Fernet.generate_key().decode()
+    monkeypatch.setenv("RMAIL_MASTER_KEY", key)
+    return key
+
+def count_decrypts(v, monkeypatch):
+    calls = []
+    decrypt = v.fernet.decrypt
+    monkeypatch.setattr(v.fernet, "decrypt", lambda token: calls.append(token) or decrypt(token))
+    return calls
+
+@pytest.mark.parametrize("legacy_version", [1, 2])
+def test_legacy_vault_is_upgraded_once(key, legacy_version):
+    fernet = Fernet(key.encode())
+    if legacy_version == 1:
+        raw = fernet.encrypt(json.dumps({"rmail": {"example.test": "s3cret"}}).encode())
+    else:
+        raw = json.dumps({"version": 2, "entries": {
+            "rmail": {"example.test": fernet.encrypt(b"s3cret").decode()},
+        }}).encode()
+    vault.VAULT_FILE.write_bytes(raw)
+
+    assert vault.Vault().get_password("rmail", "example.test") == "s3cret"
+    upgraded = vault.VAULT_FILE.read_bytes()
+    assert json.loads(upgraded)["version"] == vault.FORMAT_VERSION
+    assert b"example.test" not in upgraded  # The index is encrypted too
+
+    # Reading the upgraded file doesn't rewrite it (every write re-encrypts, so the bytes would change)
+    assert vault.Vault().get_password("rmail", "example.test") == "s3cret"
+    assert vault.VAULT_FILE.read_bytes() == upgraded
+
+def test_vault_of_another_key_is_not_overwritten(key, monkeypatch):
+    vault.Vault().set_password("rmail", "example.test", "s3cret")
+    before = vault.VAULT_FILE.read_bytes()
+
+    monkeypatch.setenv("RMAIL_MASTER_KEY", Fernet.generate_key().decode())
+    other = vault.Vault()
+    assert other.get_password("rmail", "example.test") is None
+    with pytest.raises(ValueError):
+        other.set_password("rmail", "other.test", "pw")
+    assert vault.VAULT_FILE.read_bytes() == before
+
+def test_cache_follows_file_changes(key, monkeypatch):
+    reader, writer = vault.Vault(), vault.Vault()  # As if in two processes
+    writer.set_password("rmail", "example.test", "old")
+    decrypts = count_decrypts(reader, monkeypatch)
+
+    assert reader.get_password("rmail", "example.test") == "old"
+    assert reader.get_password("rmail", "example.test") == "old"
+    assert len(decrypts) == 2  # Index and entry, once: the second lookup is served from memory
+
+    writer.set_password("rmail", "example.test", "new-password")
+    assert reader.get_password("rmail", "example.test") == "new-password"
+    writer.delete_password("rmail", "example.test")
+    assert reader.get_password("rmail", "example.test") is None
+
+def set_passwords(worker, count):
+    v = vault.Vault()
+    for i in range(count):
+        v.set_password("rmail", f"w{worker}-{i}.test", f"pw-{worker}-{i}")
+
+def test_concurrent_writers_keep_each_others_entries(key):
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=set_passwords, args=(w, 20)) for w in range(2)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(30)
+    assert [p.exitcode for p in workers] == [0, 0]
+
+    v = vault.Vault()
+    assert all(
+        v.get_password("rmail", f"w{w}-{i}.test") == f"pw-{w}-{i}"
+        for w in range(2) for i in range(20)
+    )
+    assert not list(vault.VAULT_FILE.parent.glob("*.tmp"))